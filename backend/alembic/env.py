@@ -10,6 +10,7 @@ from alembic import context
 from app.models.user import User
 from app.models.session import LearningSession
 from app.models.interaction import InteractionLog, EmotionLog
+from app.models.analytics import UserStats, UserTopicStats, UserEmotionDaily, LevelChangeEvent
 from sqlmodel import SQLModel
 
 # this is the Alembic Config object, which provides
@@ -2,47 +2,47 @@
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select
+from jose import JWTError
+from uuid import UUID
 
 from app.core import security
-from app.core.config import settings
-from app.db.session import get_session
 from app.models.user import User
+from app.services.user_cache import user_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
 async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    session: Annotated[AsyncSession, Depends(get_session)]
+    token: Annotated[str, Depends(oauth2_scheme)]
 ) -> User:
+    """
+    Resolve the user from the signed access token alone, without a DB lookup.
+    The token carries id, email, role and active flag (see security.create_access_token);
+    `hashed_password` is left empty, load the row when the full record is needed.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user = user_cache.get(token)
+    if user is not None:
+        return user
+
     try:
-        # In this prototype, we used email as the token directly in auth.py (see line 59)
-        # But normally we decode a JWT. 
-        # Let's check auth.py implementation. 
-        # Ah, in auth.py we returned "access_token": user.email.
-        # So we just read the email string. 
-        # Wait, that's not standard JWT. 
-        # Let's assume standard behavior for scalability, but for NOW strictly follow existing auth.py.
-        
-        # If token IS the email (simple demo mode):
-        email = token
-        
-    except Exception:
-        raise credentials_exception
-        
-    query = select(User).where(User.email == email)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    
-    if user is None:
+        claims = security.decode_access_token(token)
+        if user_cache.is_revoked(claims):
+            raise credentials_exception
+        user = User(
+            id=UUID(claims["sub"]),
+            email=claims["email"],
+            role=claims["role"],
+            is_active=claims["active"],
+            hashed_password="",
+        )
+    except (JWTError, KeyError, ValueError):
         raise credentials_exception
+
+    user_cache.put(token, user, token_expires_at=claims["exp"])
     return user
 
 async def get_current_active_user(
@@ -1,15 +1,18 @@
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, func
 from uuid import UUID
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from pydantic import BaseModel
+import json
+from contextlib import aclosing
 
-from app.db.session import get_session
-from app.models.interaction import EmotionLog, InteractionLog
-from app.models.session import LearningSession
+from app.db.session import get_session, read_session
+from app.models.analytics import LevelChangeEvent, UserEmotionDaily, UserStats, UserTopicStats
 
 router = APIRouter()
 
@@ -45,7 +48,6 @@ class AnalyticsSummary(BaseModel):
 
 from app.api.deps import get_current_active_user
 from app.models.user import User
-from app.services.content_service import content_service
 
 # ...
 
@@ -54,75 +56,48 @@ async def get_analytics_summary(
     current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_session)
 ) -> AnalyticsSummary:
-    """Get comprehensive analytics summary for user"""
+    """Get comprehensive analytics summary for user (read from the rollup tables)"""
     user_uuid = current_user.id
     
-    # Get session stats (Ordered by start_time to get true latest)
-    session_stmt = select(LearningSession).where(
-        LearningSession.user_id == user_uuid
-    ).order_by(LearningSession.start_time.asc())
-    
-    session_result = await db.execute(session_stmt)
-    sessions = session_result.scalars().all()
-    
-    total_sessions = len(sessions)
-    total_questions = sum(s.total_questions for s in sessions)
-    total_correct = sum(s.total_correct for s in sessions)
-    current_level = sessions[-1].current_level if sessions else 1
+    # Session totals
+    stats = await db.get(UserStats, user_uuid)
+    total_sessions = stats.total_sessions if stats else 0
+    total_questions = stats.total_questions if stats else 0
+    total_correct = stats.total_correct if stats else 0
+    current_level = stats.current_level if stats else 1
     overall_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
     
     # Get emotion distribution (last 7 days)
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    emotion_stmt = select(EmotionLog).where(
-        EmotionLog.timestamp >= week_ago
-    )
-    emotion_result = await db.execute(emotion_stmt)
-    emotion_logs = emotion_result.scalars().all()
-    
-    emotion_counts: Dict[str, int] = {}
-    for log in emotion_logs:
-        emotion_counts[log.detected_emotion] = emotion_counts.get(log.detected_emotion, 0) + 1
+    week_ago = (datetime.utcnow() - timedelta(days=7)).date()
+    emotion_count = func.sum(UserEmotionDaily.count)
+    emotion_stmt = select(UserEmotionDaily.emotion, emotion_count).where(
+        UserEmotionDaily.user_id == user_uuid,
+        UserEmotionDaily.day >= week_ago
+    ).group_by(UserEmotionDaily.emotion).order_by(emotion_count.desc(), UserEmotionDaily.emotion)
+    emotion_counts = (await db.execute(emotion_stmt)).all()
     
-    total_emotions = sum(emotion_counts.values()) or 1
+    total_emotions = sum(c for _, c in emotion_counts) or 1
     emotions = [
         EmotionStats(
             emotion=e, 
             count=c, 
             percentage=round(c / total_emotions * 100, 1)
         ) 
-        for e, c in sorted(emotion_counts.items(), key=lambda x: -x[1])
+        for e, c in emotion_counts
     ]
     
-    # Build question->topic lookup from content bank (avoids relying on encoded IDs)
-    question_topic_map: Dict[str, str] = {
-        str(q.get("id")): q.get("topic", "general")
-        for q in content_service.questions
-    }
-
     # Get topic accuracy
-    interaction_stmt = select(InteractionLog).join(LearningSession).where(
-        LearningSession.user_id == user_uuid
-    )
-    interaction_result = await db.execute(interaction_stmt)
-    interactions = interaction_result.scalars().all()
-    
-    topic_stats: Dict[str, Dict] = {}
-    for log in interactions:
-        topic = question_topic_map.get(str(log.question_id), 'general')
-        if topic not in topic_stats:
-            topic_stats[topic] = {'total': 0, 'correct': 0}
-        topic_stats[topic]['total'] += 1
-        if log.is_correct:
-            topic_stats[topic]['correct'] += 1
-    
+    topic_stmt = select(UserTopicStats).where(
+        UserTopicStats.user_id == user_uuid
+    ).order_by(UserTopicStats.topic)
     topic_accuracy = [
         TopicAccuracy(
-            topic=t,
-            total=s['total'],
-            correct=s['correct'],
-            accuracy=round(s['correct'] / s['total'] * 100, 1) if s['total'] > 0 else 0
+            topic=t.topic,
+            total=t.total,
+            correct=t.correct,
+            accuracy=round(t.correct / t.total * 100, 1) if t.total > 0 else 0
         )
-        for t, s in topic_stats.items()
+        for t in (await db.execute(topic_stmt)).scalars().all()
     ]
     
     return AnalyticsSummary(
@@ -136,52 +111,147 @@ async def get_analytics_summary(
     )
 
 
+# --- History pagination / streaming ---
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+STREAM_CHUNK_SIZE = 500  # Rows fetched per round-trip while streaming
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    if format:
+        return format == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _daily_emotions(db: AsyncSession, stmt) -> AsyncIterator[Tuple[date, Dict[str, int]]]:
+    """Stream rollup rows ordered by day and fold them into one entry per day"""
+    result = await db.stream_scalars(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    try:
+        day, counts = None, {}
+        async for row in result:
+            if row.day != day:
+                if day is not None:
+                    yield day, counts
+                day, counts = row.day, {}
+            counts[row.emotion] = row.count
+        if day is not None:
+            yield day, counts
+    finally:
+        await result.close()
+
+
 @router.get("/emotion-history")
 async def get_emotion_history(
+    request: Request,
+    response: Response,
     days: int = 7,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Days per page"),
+    cursor: Optional[date] = Query(None, description="Last date of the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_session)
 ) -> List[Dict]:
-    """Get emotion distribution over time"""
-    start_date = datetime.utcnow() - timedelta(days=days)
+    """
+    Get emotion distribution over time, one entry per day.
+    JSON pages are `limit` days long; the next page's cursor is in the X-Next-Cursor header.
+    With `format=ndjson` (or `Accept: application/x-ndjson`) every day from the cursor on is streamed.
+    """
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     
-    stmt = select(EmotionLog).where(EmotionLog.timestamp >= start_date)
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
+    stmt = select(UserEmotionDaily).where(
+        UserEmotionDaily.user_id == current_user.id,
+        UserEmotionDaily.day >= start_date
+    ).order_by(UserEmotionDaily.day, UserEmotionDaily.emotion)
+    if cursor:
+        stmt = stmt.where(UserEmotionDaily.day > cursor)
     
-    # Group by day and emotion
-    daily_emotions: Dict[str, Dict[str, int]] = {}
-    for log in logs:
-        day = log.timestamp.strftime("%Y-%m-%d")
-        if day not in daily_emotions:
-            daily_emotions[day] = {}
-        emotion = log.detected_emotion
-        daily_emotions[day][emotion] = daily_emotions[day].get(emotion, 0) + 1
-    
-    return [
-        {"date": day, **emotions}
-        for day, emotions in sorted(daily_emotions.items())
-    ]
+    if _wants_ndjson(request, format):
+        async def stream():
+            # Own session: the request-scoped one is closed once the endpoint returns
+            async with read_session() as stream_db, aclosing(_daily_emotions(stream_db, stmt)) as days:
+                sent = 0
+                async for day, counts in days:
+                    yield json.dumps({"date": day.isoformat(), **counts}) + "\n"
+                    sent += 1
+                    if limit and sent >= limit:
+                        break
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+    page_size = limit or DEFAULT_PAGE_SIZE
+    history = []
+    async with aclosing(_daily_emotions(db, stmt)) as days:
+        async for day, counts in days:
+            if len(history) == page_size:
+                response.headers["X-Next-Cursor"] = history[-1]["date"]
+                break
+            history.append({"date": day.isoformat(), **counts})
+    return history
+
+
+def _level_cursor(event: LevelChangeEvent) -> str:
+    return f"{event.timestamp.isoformat()}_{event.id}"
+
+
+def _parse_level_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, event_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/level-progression")
 async def get_level_progression(
+    request: Request,
+    response: Response,
+    session_id: Optional[UUID] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: User = Depends(get_current_active_user),
     db: AsyncSession = Depends(get_session)
 ) -> List[LevelProgression]:
-    """Get level changes over time from interaction logs"""
-    stmt = select(InteractionLog).order_by(InteractionLog.timestamp.asc())
-    result = await db.execute(stmt)
-    logs = result.scalars().all()
+    """
+    Get level changes over time, for the user or one of their sessions.
+    Keyset-paginated on (timestamp, id): pass the X-Next-Cursor header back as `cursor`.
+    With `format=ndjson` (or `Accept: application/x-ndjson`) every change from the cursor on is streamed.
+    """
+    stmt = select(LevelChangeEvent).where(
+        LevelChangeEvent.user_id == current_user.id
+    ).order_by(LevelChangeEvent.timestamp.asc(), LevelChangeEvent.id.asc())
+    if session_id:
+        stmt = stmt.where(LevelChangeEvent.session_id == session_id)
+    if cursor:
+        after_timestamp, after_id = _parse_level_cursor(cursor)
+        stmt = stmt.where(or_(
+            LevelChangeEvent.timestamp > after_timestamp,
+            and_(LevelChangeEvent.timestamp == after_timestamp, LevelChangeEvent.id > after_id)
+        ))
     
-    progression = []
-    current_level = 1
+    if _wants_ndjson(request, format):
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        async def stream():
+            # Own session: the request-scoped one is closed once the endpoint returns
+            async with read_session() as stream_db:
+                result = await stream_db.stream_scalars(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+                async for events in result.partitions():
+                    yield "".join(
+                        json.dumps({"timestamp": e.timestamp.isoformat(), "level": e.level}) + "\n"
+                        for e in events
+                    )
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
     
-    for log in logs:
-        new_level = max(1, min(5, int(current_level + log.ai_difficulty_adj)))
-        if new_level != current_level:
-            progression.append(LevelProgression(
-                timestamp=log.timestamp.isoformat(),
-                level=new_level
-            ))
-            current_level = new_level
+    page_size = limit or DEFAULT_PAGE_SIZE
+    result = await db.execute(stmt.limit(page_size + 1))
+    events = result.scalars().all()
+    if len(events) > page_size:
+        events = events[:page_size]
+        response.headers["X-Next-Cursor"] = _level_cursor(events[-1])
     
-    return progression
+    return [
+        LevelProgression(timestamp=event.timestamp.isoformat(), level=event.level)
+        for event in events
+    ]
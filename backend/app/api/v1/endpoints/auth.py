@@ -5,10 +5,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from datetime import timedelta
 from typing import Any
+from jose import JWTError
 
 from app.db.session import get_session
-from app.models.user import User, UserCreate, UserRead
+from app.models.user import User, UserCreate, UserRead, UserRole
 from app.core import security
+from app.services.user_cache import user_cache
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
@@ -27,7 +29,7 @@ async def register(user_in: UserCreate, session: AsyncSession = Depends(get_sess
     # Create user
     user = User(
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password),
+        hashed_password=await security.get_password_hash_async(user_in.password),
         full_name=user_in.full_name,
         role=user_in.role
     )
@@ -46,17 +48,15 @@ async def login(
     result = await session.execute(query)
     user = result.scalar_one_or_none()
     
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    if not user or not await security.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Create token (simplified for prototype)
-    # In production, implement proper JWT expiration
     return {
-        "access_token": user.email, 
+        "access_token": security.create_access_token(user),
         "token_type": "bearer",
         "user_role": user.role
     }
@@ -64,8 +64,35 @@ async def login(
 from app.api.deps import get_current_active_user
 
 @router.get("/me", response_model=UserRead)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(
+    current_user: User = Depends(get_current_active_user),
+    session: AsyncSession = Depends(get_session)
+):
     """
     Get current user.
     """
-    return current_user
+    # The token only carries id/email/role; the profile fields come from the row
+    user = await session.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    """
+    Revoke this token: it stays signed until it expires, so it is rejected by jti.
+    """
+    try:
+        claims = security.decode_access_token(token)
+    except JWTError:
+        # Expired or invalid already
+        return {"status": "success"}
+    user_cache.revoke_token(token, claims["jti"], claims["exp"])
+    return {"status": "success"}
+
+@router.get("/cache-metrics")
+async def get_user_cache_metrics(current_user: User = Depends(get_current_active_user)):
+    """Authenticated-user cache size, revocations and hit/miss counters (admins only)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return user_cache.metrics()
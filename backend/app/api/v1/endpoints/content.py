@@ -1,8 +1,14 @@
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from uuid import UUID
+from app.api.deps import get_current_active_user
+from app.db.session import get_session
+from app.models.user import User, UserRole
 from app.services.content_service import content_service
+from app.services.question_scheduler import load_schedule, question_scheduler
 
 router = APIRouter()
 
@@ -10,6 +16,7 @@ class QuestionRequest(BaseModel):
     difficulty: int
     emotion: str
     topic: str = "geometry"
+    session_id: Optional[str] = None  # Enables the per-session scheduler: no repeats, spaced review of misses
 
 class QuestionResponse(BaseModel):
     id: int
@@ -21,17 +28,57 @@ class QuestionResponse(BaseModel):
     topic: str = "cube"
 
 @router.post("/next", response_model=QuestionResponse)
-async def get_next_question(data: QuestionRequest):
+async def get_next_question(
+    data: QuestionRequest,
+    db: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
     """
     Get the next question from EduMorph Question Bank.
+    With a session_id, the session must belong to the current user.
     """
+    schedule = None
+    if data.session_id:
+        try:
+            session_uuid = UUID(data.session_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session_id")
+        schedule = await load_schedule(db, session_uuid, current_user.id)
+        if schedule is None:
+            raise HTTPException(status_code=404, detail="Session not found")
     try:
         # Use ContentService (Local Bank) instead of LLM
         question_data = await content_service.get_question(
             difficulty=data.difficulty,
             emotion=data.emotion,
-            topic=data.topic
+            topic=data.topic,
+            schedule=schedule
         )
         return question_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/reload")
+async def reload_question_bank(
+    force: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Swap in a new question bank without a restart (admins only).
+    Picks up a changed questions.json or a recompiled store; `force` recompiles regardless.
+    Each worker process reloads on its own: the others follow within QUESTION_STORE_RELOAD_INTERVAL_SECONDS.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    try:
+        reloaded = await content_service.reload(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Question bank reload failed: {e}")
+    return {"reloaded": reloaded, "questions": content_service.count, "topics": len(content_service.topics)}
+
+@router.get("/scheduler-metrics")
+async def get_scheduler_metrics(current_user: User = Depends(get_current_active_user)):
+    """Cached per-session question schedules and hit/restore counters (admins only)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return question_scheduler.metrics()
@@ -1,18 +1,33 @@
 
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from typing import Dict, Any, List
 from pydantic import BaseModel
+from typing import Optional
 
-from app.db.session import get_session
+from app.api.deps import get_current_active_user
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.db.session import get_session, get_write_session
 from app.models.session import LearningSession, LearningSessionCreate, LearningSessionRead
 from app.models.interaction import InteractionLog, EmotionLog
-from app.services.fuzzy_logic import FuzzyAdaptiveSystem
-from app.services.emotion_service import emotion_service
+from app.models.user import User, UserRole
+from app.services.fuzzy_logic import accumulate_proficiency
+from app.services.fuzzy_service import fuzzy_service
+from app.services.intervention_rules import intervention_engine
+from app.services.emotion_service import emotion_service, EmotionServiceOverloaded
+from app.services.log_buffer import emotion_log_buffer
+from app.services.intervention_hub import intervention_hub
+from app.services import analytics_rollup
+from app.services.content_service import content_service
+from app.services.question_scheduler import question_scheduler
 
 router = APIRouter()
-fuzzy_system = FuzzyAdaptiveSystem()
+logger = get_logger(__name__)
 
 class AnswerSubmit(BaseModel):
     session_id: str
@@ -31,6 +46,7 @@ class EmotionInput(BaseModel):
 class MonitorInput(BaseModel):
     emotion: str
     screen_time: float
+    session_id: Optional[str] = None  # When set, the server-side smoothed emotion takes precedence
 
 @router.post("/session/start", response_model=LearningSessionRead)
 async def start_session(
@@ -46,7 +62,7 @@ async def start_session(
 @router.post("/submit-answer")
 async def submit_answer(
     data: AnswerSubmit,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     # 1. Get latest emotion for this session from database
     from sqlmodel import select
@@ -59,25 +75,31 @@ async def submit_answer(
     except ValueError:
         # Fallback to demo UUID if invalid format
         session_uuid = UUID("00000000-0000-0000-0000-000000000001")
-        print(f"Warning: Invalid UUID '{data.session_id}', using demo UUID")
+        logger.warning("Invalid UUID '%s', using demo UUID", data.session_id)
     
-    # Query latest emotion log
+    # Prefer the in-memory smoothed emotion; fall back to the latest emotion log
     emotion = "neutral"  # Default fallback
-    try:
-        stmt = select(EmotionLog).where(
-            EmotionLog.session_id == session_uuid
-        ).order_by(EmotionLog.timestamp.desc()).limit(1)
+    emotion_state = emotion_service.state.get(data.session_id)
+    if emotion_state:
+        emotion = emotion_state["emotion"]
+        logger.debug("Using smoothed emotion: %s (confidence: %.2f, frames: %d)",
+                     emotion, emotion_state["confidence"], emotion_state["frames"])
+    else:
+        try:
+            stmt = select(EmotionLog).where(
+                EmotionLog.session_id == session_uuid
+            ).order_by(EmotionLog.timestamp.desc()).limit(1)
         
-        result = await db.execute(stmt)
-        latest_emotion_log = result.scalar_one_or_none()
+            result = await db.execute(stmt)
+            latest_emotion_log = result.scalar_one_or_none()
         
-        if latest_emotion_log:
-            emotion = latest_emotion_log.detected_emotion
-            print(f">> Using emotion from DB: {emotion} (confidence: {latest_emotion_log.confidence:.2f})")
-        else:
-            print(f"-- No emotion log found for session, using default: neutral")
-    except Exception as e:
-        print(f"!! Error fetching emotion: {e}, using default: neutral")
+            if latest_emotion_log:
+                emotion = latest_emotion_log.detected_emotion
+                logger.debug("Using emotion from DB: %s (confidence: %.2f)", emotion, latest_emotion_log.confidence)
+            else:
+                logger.debug("No emotion log found for session, using default: neutral")
+        except Exception as e:
+            logger.warning("Error fetching emotion: %s, using default: neutral", e)
     
     
     # 2. Process Fuzzy Logic
@@ -85,16 +107,16 @@ async def submit_answer(
     is_correct = data.answer.lower().strip() == data.correct_answer.lower().strip()
     accuracy = 1.0 if is_correct else 0.0
     
-    print(f"\n=== FUZZY LOGIC INPUT ===")
-    print(f"Emotion: {emotion}")
-    print(f"Screen Time: {data.screen_time}s")
-    print(f"Response Time: {data.time_taken}s")
-    print(f"Accuracy: {accuracy} (Correct: {is_correct})")
-    print(f"Hints Used: {data.hints_used}")
-    print(f"Current Level: {data.current_level}")
-    print(f"========================\n")
+    logger.debug("fuzzy logic input", extra={
+        "emotion": emotion,
+        "screen_time": data.screen_time,
+        "response_time": data.time_taken,
+        "accuracy": accuracy,
+        "hints_used": data.hints_used,
+        "current_level": data.current_level
+    })
     
-    fuzzy_result = fuzzy_system.process_feedback(
+    fuzzy_result = await fuzzy_service.process_feedback(
         screen_time=data.screen_time,
         accuracy=accuracy,
         response_time=data.time_taken,
@@ -123,15 +145,14 @@ async def submit_answer(
     new_level_val = 1
     
     if session:
+        old_level = session.current_level
+        
         # Initialize proficiency if None (for legacy reasons)
         if session.proficiency is None:
             session.proficiency = float(session.current_level)
             
-        # Accumulate adjustment
-        session.proficiency += fuzzy_result['adjustment']
-        
-        # Clamp proficiency 1.0 - 5.9
-        session.proficiency = max(1.0, min(5.9, session.proficiency))
+        # Accumulate adjustment, clamped to PROFICIENCY_MIN - PROFICIENCY_MAX (1.0 - 5.9)
+        session.proficiency = accumulate_proficiency(session.proficiency, fuzzy_result['adjustment'])
         
         # Determine discrete level from proficiency
         new_level_val = int(session.proficiency)
@@ -141,9 +162,18 @@ async def submit_answer(
         if is_correct:
             session.total_correct += 1
             
+        # Missed questions come back later; topic mastery steers the next picks
+        schedule = question_scheduler.get(session.id) or question_scheduler.restore(
+            session.id, session.scheduler_state, owner=session.user_id
+        )
+        content_service.record_answer(schedule, data.question_id, is_correct)
+        if settings.QUESTION_SCHEDULER_PERSIST:
+            session.scheduler_state = schedule.snapshot()
+            
         db.add(session) # Mark as modified
+        await analytics_rollup.record_answer(db, session, data.question_id, is_correct, old_level, log.timestamp)
     else:
-        print(f"!! Critical: Session {session_uuid} not found for update")
+        logger.error("Session %s not found for update", session_uuid)
 
     # Override fuzzy_result 'new_level' with the ACTUAL persisted level based on proficiency
     # This ensures the frontend sees the result of the accumulation (e.g. 1.8 -> 2.2)
@@ -158,54 +188,218 @@ async def submit_answer(
         "fuzzy_feedback": fuzzy_result
     }
 
-@router.post("/predict-emotion")
-async def predict_emotion(
-    data: EmotionInput,
-    db: AsyncSession = Depends(get_session)
-):
-    # 1. Predict
-    result = await emotion_service.predict(data.image_base64)
-    
-    # 2. Log to DB
+def _emotion_session_uuid(session_id: str):
     # Ensure session_id is UUID
     from uuid import UUID
     try:
-        session_uuid = UUID(data.session_id) if isinstance(data.session_id, str) else data.session_id
+        return UUID(session_id) if isinstance(session_id, str) else session_id
     except ValueError:
         # If invalid UUID key (e.g. from testing), generate a tempoary one or handle error
         # For now, let's create a dummy UUID if valid one isn't provided, to keep logic flowing
         import uuid
-        session_uuid = uuid.uuid4() 
-        print(f"Warning: Invalid UUID '{data.session_id}' received. Using random UUID for logging.")
+        logger.warning("Invalid UUID '%s' received. Using random UUID for logging.", session_id)
+        return uuid.uuid4()
+
+
+async def _predict_and_log(image, session_id: str) -> Dict[str, Any]:
+    """Shared by the JSON, binary and WebSocket ingestion paths."""
+    # 1. Predict
+    try:
+        result = await emotion_service.predict(image, session_id=session_id)
+    except EmotionServiceOverloaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Emotion inference is busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
     
-    log = EmotionLog(
-        session_id=session_uuid,
+    # Stale results are a repeat of an earlier frame, don't log them twice
+    if result.get("stale"):
+        return result
+    
+    if intervention_hub.watching(session_id):
+        intervention_hub.on_emotion(session_id, _smoothed_emotion(session_id, result["emotion"]))
+    
+    # 2. Log to DB (write-behind, the learner doesn't wait on the commit)
+    emotion_log_buffer.add(
+        session_id=_emotion_session_uuid(session_id),
         detected_emotion=result['emotion'],
         confidence=result['confidence']
     )
-    db.add(log)
-    await db.commit()
 
     return result
 
 
+@router.post("/predict-emotion")
+async def predict_emotion(data: EmotionInput):
+    return await _predict_and_log(data.image_base64, data.session_id)
+
+
+@router.post("/predict-emotion/binary")
+async def predict_emotion_binary(
+    session_id: str,
+    request: Request
+):
+    """
+    Same as /predict-emotion, but the frame is sent as raw JPEG/PNG bytes instead of base64 JSON.
+    Accepts either an `application/octet-stream` body or `multipart/form-data` with a `frame` file.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        frame = form.get("frame")
+        if frame is None or isinstance(frame, str):
+            raise HTTPException(status_code=422, detail="Multipart body needs a 'frame' file field")
+        image = await frame.read()
+    else:
+        image = await request.body()
+    
+    if not image:
+        raise HTTPException(status_code=422, detail="Empty frame")
+    return await _predict_and_log(image, session_id)
+
+
+@router.websocket("/ws/emotion/{session_id}")
+async def emotion_stream(websocket: WebSocket, session_id: str):
+    """
+    Persistent frame stream for one learner.
+    Each message is a frame (binary JPEG/PNG bytes, or a base64 / data-URL text message);
+    the server replies with one JSON emotion result per frame.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            image = message.get("bytes") or message.get("text")
+            if not image:
+                continue
+            
+            try:
+                result = await _predict_and_log(image, session_id)
+            except HTTPException as e:
+                result = {"error": e.detail, "status_code": e.status_code}
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/emotion-metrics")
+async def get_emotion_metrics(current_user: User = Depends(get_current_active_user)):
+    """Inference pool queue depth, wait time, backpressure, log-buffer and intervention push counters (admins only)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return {
+        **emotion_service.metrics(),
+        "log_buffer": emotion_log_buffer.metrics(),
+        "interventions": intervention_hub.metrics(),
+    }
+
+
+@router.get("/fuzzy-rules")
+async def get_fuzzy_rules(current_user: User = Depends(get_current_active_user)):
+    """Rule spec revision being served, engine and reload counters (admins only)."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return fuzzy_service.metrics()
+
+
+@router.post("/fuzzy-rules/reload")
+async def reload_fuzzy_rules(
+    force: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Swap in the current rule spec without a restart (admins only).
+    Each worker process reloads on its own: the others follow within FUZZY_RULES_RELOAD_INTERVAL_SECONDS.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    try:
+        reloaded = await fuzzy_service.reload(force=force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fuzzy rules reload failed: {e}")
+    return {"reloaded": reloaded, **fuzzy_service.metrics()}
+
+
+def _smoothed_emotion(session_id: Optional[str], fallback: str) -> str:
+    """Smoothed server-side state is steadier than the client's last frame"""
+    if session_id:
+        emotion_state = emotion_service.state.get(session_id)
+        if emotion_state:
+            return emotion_state["emotion"]
+    return fallback
+
+
 @router.post("/monitor")
 async def monitor_intervention(data: MonitorInput):
     """
     Real-time check for interventions (Hint, Visual Change).
     Does NOT affect level, only returns 'intervention' action.
+    Prefer the /ws/interventions push channel over polling this; polling clients can
+    wait `recheck_after` seconds (null: the decision won't change on its own).
     """
-    # Use dummy values for non-monitoring inputs
-    # We only care about Emotion + Time rules here
-    fuzzy_result = fuzzy_system.process_feedback(
-        screen_time=data.screen_time,
-        accuracy=0.0,
-        response_time=0.0,
-        emotion=data.emotion,
-        hints_used=0,
-        current_level=1
-    )
-    
+    # Only the Emotion + Time rules matter here, no fuzzy pass needed
+    emotion = _smoothed_emotion(data.session_id, data.emotion)
+    intervention, next_threshold = intervention_engine.evaluate(emotion, data.screen_time)
     return {
-        "intervention": fuzzy_result.get("intervention", "none")
+        "intervention": intervention,
+        "recheck_after": round(next_threshold - data.screen_time, 3) if next_threshold is not None else None
     }
+
+
+async def _send_events(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        await websocket.send_json(await queue.get())
+
+
+async def _receive_events(websocket: WebSocket, session_id: str):
+    while True:
+        try:
+            message = json.loads(await websocket.receive_text())
+            kind = message.get("type")
+        except (ValueError, AttributeError, KeyError):
+            # Not JSON, not an object, or a binary frame (receive_text raises KeyError)
+            continue
+        if kind == "question":
+            intervention_hub.start_question(session_id)
+        elif kind in ("pause", "resume"):
+            intervention_hub.set_paused(session_id, kind == "pause")
+        elif kind == "emotion" and isinstance(message.get("emotion"), str):
+            intervention_hub.on_emotion(session_id, _smoothed_emotion(session_id, message["emotion"]))
+
+
+@router.websocket("/ws/interventions/{session_id}")
+async def intervention_stream(websocket: WebSocket, session_id: str):
+    """
+    Push channel for interventions, replacing /monitor polling.
+    The server sends {"type": "intervention", "intervention": "show_hint" | "change_visual", ...}
+    whenever the rules' outcome changes. The client sends JSON messages:
+      {"type": "question"}                 a new question is on screen (screen time restarts)
+      {"type": "pause"} / {"type": "resume"}  answer submitted / question active again
+      {"type": "emotion", "emotion": "..."}   client-side emotion, used when the server has no
+                                              smoothed state for the session
+    The connection ends when either direction fails; the client reconnects with backoff.
+    """
+    await websocket.accept()
+    queue = intervention_hub.connect(session_id, _smoothed_emotion(session_id, "neutral"))
+    if queue is None:
+        await websocket.close(code=1013, reason="Too many connections")
+        return
+    sender = asyncio.create_task(_send_events(websocket, queue))
+    receiver = asyncio.create_task(_receive_events(websocket, session_id))
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.warning("Intervention stream for session %s failed: %r", session_id, error)
+                try:
+                    await websocket.close(code=1011)
+                except Exception:
+                    pass  # Already closed
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        intervention_hub.disconnect(session_id, queue)
@@ -7,11 +7,14 @@ from datetime import datetime, timedelta
 from typing import Optional
 from pydantic import BaseModel
 
-from app.db.session import get_session
+from app.core.logger import get_logger
+from app.db.session import get_write_session
 from app.models.session import LearningSession, LearningSessionRead
 from app.models.interaction import EmotionLog, InteractionLog
+from app.services import analytics_rollup
 
 router = APIRouter()
+logger = get_logger(__name__)
 
 
 # --- Request/Response Models ---
@@ -36,7 +39,7 @@ from app.models.user import User
 @router.get("/current")
 async def get_or_create_session(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ) -> SessionResponse:
     """Get current active session or create new one"""
     user_uuid = current_user.id
@@ -61,11 +64,12 @@ async def get_or_create_session(
             total_questions=0
         )
         db.add(session)
+        await analytics_rollup.record_session_started(db, user_uuid)
         await db.commit()
         await db.refresh(session)
-        print(f"Created new session: {session.id}")
+        logger.info("Created new session: %s", session.id)
     else:
-        print(f"Using existing session: {session.id}")
+        logger.debug("Using existing session: %s", session.id)
     
     accuracy = (session.total_correct / session.total_questions * 100) if session.total_questions > 0 else 0
     
@@ -82,7 +86,7 @@ async def get_or_create_session(
 async def update_session_level(
     session_id: str,
     request: UpdateLevelRequest,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Update session level"""
     stmt = select(LearningSession).where(LearningSession.id == UUID(session_id))
@@ -92,7 +96,9 @@ async def update_session_level(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    old_level = session.current_level
     session.current_level = max(1, min(5, request.new_level))  # Clamp 1-5
+    await analytics_rollup.record_progress(db, session.user_id, session.id, old_level, session.current_level)
     await db.commit()
     
     return {"status": "success", "new_level": session.current_level}
@@ -103,7 +109,7 @@ async def update_session_progress(
     session_id: str,
     is_correct: bool,
     new_level: int,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Update session progress after answering"""
     stmt = select(LearningSession).where(LearningSession.id == UUID(session_id))
@@ -113,10 +119,15 @@ async def update_session_progress(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    old_level = session.current_level
     session.total_questions += 1
     if is_correct:
         session.total_correct += 1
     session.current_level = max(1, min(5, new_level))
+    await analytics_rollup.record_progress(
+        db, session.user_id, session.id, old_level, session.current_level,
+        answered=1, correct=int(is_correct)
+    )
     
     await db.commit()
     
@@ -131,7 +142,7 @@ async def update_session_progress(
 @router.post("/{session_id}/complete")
 async def complete_session(
     session_id: str,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Mark session as completed"""
     stmt = select(LearningSession).where(LearningSession.id == UUID(session_id))
@@ -156,7 +167,7 @@ async def complete_session(
 @router.post("/reset")
 async def reset_progress(
     current_user: User = Depends(get_current_active_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """
     DANGER: Reset all learning progress for the current user.
@@ -164,7 +175,8 @@ async def reset_progress(
     """
     from sqlmodel import delete
     
-    # Delete all sessions for this user
+    # Delete all sessions for this user (and the analytics rolled up from them)
+    await analytics_rollup.clear_user(db, current_user.id)
     stmt = delete(LearningSession).where(LearningSession.user_id == current_user.id)
     result = await db.execute(stmt)
     
@@ -0,0 +1,14 @@
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+
+def data_path(path: str) -> str:
+    """Relative paths resolve in app/data"""
+    return path if os.path.isabs(path) else os.path.join(DATA_DIR, path)
+
+
+def source_signature(source_path: str) -> str:
+    """Cheap change marker for a source file: mtime and size, no hashing"""
+    st = os.stat(source_path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
@@ -0,0 +1,86 @@
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import Optional
+
+from app.core.config import settings
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is
+# rendered as a structured field.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Renders records as `key=value` pairs (text) or one JSON object per line."""
+
+    def __init__(self, fmt: str = "text"):
+        super().__init__(datefmt="%Y-%m-%dT%H:%M:%S")
+        self.json = fmt == "json"
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "ts": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields.update({k: v for k, v in record.__dict__.items() if k not in _RESERVED})
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+
+        if self.json:
+            return json.dumps(fields, default=str)
+        return " ".join(f"{k}={_quote(v)}" for k, v in fields.items())
+
+
+def _quote(value) -> str:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return json.dumps(text) if (" " in text or '"' in text) else text
+
+
+def setup_logging():
+    """
+    Configure the `app` logger tree from Settings.
+    LOG_LEVEL sets the default, LOG_LEVELS overrides per module, and LOG_QUEUE moves
+    the actual stdout writes to a background thread so request handlers never block on I/O.
+    """
+    global _listener
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(settings.LOG_FORMAT))
+
+    root = logging.getLogger("app")
+    root.handlers.clear()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.propagate = False
+
+    if settings.LOG_QUEUE:
+        log_queue: queue.Queue = queue.Queue(-1)
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+    else:
+        root.addHandler(handler)
+
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def should_trace(logger: logging.Logger) -> bool:
+    """True for a LOG_TRACE_SAMPLE_RATE fraction of calls when DEBUG is enabled"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    rate = settings.LOG_TRACE_SAMPLE_RATE
+    return rate >= 1.0 or random.random() < rate
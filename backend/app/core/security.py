@@ -1,7 +1,77 @@
+import asyncio
+import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
 import bcrypt
+from jose import jwt
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Keys that are public (old default, README example): tokens signed with them can be forged
+PLACEHOLDER_SECRET_KEYS = {"", "change-me-in-production", "your-secret-key"}
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+# bcrypt takes ~100-300 ms of CPU per call: run it off the event loop, at most
+# PASSWORD_HASH_WORKERS at a time, so a burst of logins can't stall other requests
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_executor
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), get_password_hash, password)
+
+
+def check_secret_key():
+    """
+    Refuse to run with a missing or placeholder SECRET_KEY: get_current_user trusts the
+    token claims (role included), so a known key lets anyone forge admin tokens.
+    With DEV_MODE a random per-process key is used instead.
+    """
+    if settings.SECRET_KEY not in PLACEHOLDER_SECRET_KEYS:
+        return
+    if not settings.DEV_MODE:
+        raise RuntimeError("SECRET_KEY is unset or a placeholder: set it in the environment (or DEV_MODE=true for development)")
+    settings.SECRET_KEY = secrets.token_urlsafe(32)
+    logger.warning("SECRET_KEY not set, signing tokens with a random per-process key (DEV_MODE)")
+
+
+def create_access_token(user, expires_minutes: Optional[int] = None) -> str:
+    """Signed JWT carrying everything get_current_user needs, so requests skip the user lookup"""
+    now = time.time()
+    claims = {
+        "sub": str(user.id),
+        "email": user.email,
+        "role": user.role.value if hasattr(user.role, "value") else user.role,
+        "active": user.is_active,
+        "iat": int(now),
+        "exp": int(now + 60 * (expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "jti": uuid.uuid4().hex,
+    }
+    check_secret_key()
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Verified claims; raises jose.JWTError on a bad signature or an expired token"""
+    check_secret_key()
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
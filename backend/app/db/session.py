@@ -1,14 +1,92 @@
-
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True, future=True)
+
+def _resolve_profile(url: str) -> str:
+    if settings.DB_PROFILE != "auto":
+        return settings.DB_PROFILE
+    if url.startswith("sqlite"):
+        return "sqlite"
+    if url.startswith("postgresql"):
+        return "postgres"
+    return "none"
+
+
+def _sqlite_pragmas(url: str):
+    pragmas = [
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}",  # Negative = KiB instead of pages
+    ]
+    # WAL needs a real file
+    if ":memory:" not in url and "mode=memory" not in url:
+        pragmas.insert(0, f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+
+def create_engine_from_settings(url: Optional[str] = None) -> AsyncEngine:
+    """Build the async engine for DATABASE_URL with the DB_PROFILE tuning applied."""
+    url = url or settings.DATABASE_URL
+    profile = _resolve_profile(url)
+    kwargs = {"echo": settings.DB_ECHO, "future": True}
+
+    if profile == "postgres":
+        kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+        )
+
+    new_engine = create_async_engine(url, **kwargs)
+
+    if profile == "sqlite":
+        pragmas = _sqlite_pragmas(url)
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+            # Let the "begin" hook below emit BEGIN instead of the driver
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(new_engine.sync_engine, "begin")
+        def _begin(conn):
+            mode = conn.get_execution_options().get("sqlite_begin", settings.SQLITE_BEGIN_MODE)
+            conn.exec_driver_sql(f"BEGIN {mode}")
+
+    return new_engine
+
+
+engine = create_engine_from_settings()
 
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Read-only work (e.g. long NDJSON streams): never takes the SQLite write lock
+read_session = sessionmaker(
+    engine.execution_options(sqlite_begin="DEFERRED"), class_=AsyncSession, expire_on_commit=False
+)
+
+# Read-then-write work (answers, session/proficiency updates, log flushes and their rollups):
+# takes the SQLite write lock at BEGIN. Only for short transactions, it serializes them
+write_session = sessionmaker(
+    engine.execution_options(sqlite_begin="IMMEDIATE"), class_=AsyncSession, expire_on_commit=False
+)
+
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+async def get_write_session() -> AsyncSession:
+    async with write_session() as session:
+        yield session
@@ -0,0 +1,45 @@
+
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
+from uuid import UUID
+from datetime import datetime, date
+
+# Rollup tables, kept up to date incrementally by the write paths
+# (see services/analytics_rollup.py) so analytics don't scan the raw logs.
+
+class UserStats(SQLModel, table=True):
+    __tablename__ = "user_stats"
+
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True)
+    total_sessions: int = 0
+    total_questions: int = 0
+    total_correct: int = 0
+    current_level: int = 1  # Level of the latest session
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UserTopicStats(SQLModel, table=True):
+    __tablename__ = "user_topic_stats"
+
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True)
+    topic: str = Field(primary_key=True)
+    total: int = 0
+    correct: int = 0
+
+class UserEmotionDaily(SQLModel, table=True):
+    __tablename__ = "user_emotion_daily"
+
+    user_id: UUID = Field(foreign_key="user.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    emotion: str = Field(primary_key=True)
+    count: int = 0
+
+class LevelChangeEvent(SQLModel, table=True):
+    __tablename__ = "level_change_events"
+    __table_args__ = (Index("ix_level_change_events_user_id_timestamp", "user_id", "timestamp"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: UUID = Field(foreign_key="user.id")
+    session_id: UUID = Field(foreign_key="learning_sessions.id")
+    level: int
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -1,11 +1,15 @@
 
 from typing import Optional
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from uuid import UUID, uuid4
 from datetime import datetime
 
 class EmotionLog(SQLModel, table=True):
     __tablename__ = "emotion_logs"
+    __table_args__ = (
+        Index("ix_emotion_logs_session_id_timestamp", "session_id", "timestamp"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: UUID = Field(foreign_key="learning_sessions.id")
@@ -16,6 +20,9 @@ class EmotionLog(SQLModel, table=True):
 
 class InteractionLog(SQLModel, table=True):
     __tablename__ = "interaction_logs"
+    __table_args__ = (
+        Index("ix_interaction_logs_session_id_timestamp", "session_id", "timestamp"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     session_id: UUID = Field(foreign_key="learning_sessions.id")
@@ -1,6 +1,7 @@
 
 from typing import Optional
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from uuid import UUID, uuid4
 from datetime import datetime
 
@@ -11,6 +12,10 @@ class LearningSessionBase(SQLModel):
 
 class LearningSession(LearningSessionBase, table=True):
     __tablename__ = "learning_sessions"
+    __table_args__ = (
+        # Active-session lookup: user_id + is_completed filter, newest start_time first
+        Index("ix_learning_sessions_user_id_is_completed_start_time", "user_id", "is_completed", "start_time"),
+    )
     
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True, index=True)
     current_level: int = Field(default=1)  # Track current difficulty level
@@ -20,6 +25,7 @@ class LearningSession(LearningSessionBase, table=True):
     final_score: Optional[float] = None
     is_completed: bool = False
     proficiency: float = Field(default=1.0) # Track granular progress (decimal level)
+    scheduler_state: Optional[str] = None  # Question scheduler snapshot (services/question_scheduler.py)
 
 class LearningSessionCreate(LearningSessionBase):
     pass
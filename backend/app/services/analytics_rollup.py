@@ -0,0 +1,217 @@
+"""
+Incremental analytics rollups.
+
+The write paths call the record_* helpers inside their own transaction, so the
+rollup tables move together with the raw logs; `rebuild()` recomputes them from
+the full history (see backfill_rollups.py).
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Column, MetaData, String, Table, case, delete, func, insert, literal, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logger import get_logger
+from app.models.analytics import LevelChangeEvent, UserEmotionDaily, UserStats, UserTopicStats
+from app.models.interaction import EmotionLog, InteractionLog
+from app.models.session import LearningSession
+from app.services.content_service import content_service
+
+logger = get_logger(__name__)
+
+ROLLUP_MODELS = (LevelChangeEvent, UserEmotionDaily, UserTopicStats, UserStats)
+
+
+def _upsert(db: AsyncSession, model, values, increments: Iterable[str] = (), replace: Iterable[str] = ()):
+    """INSERT ... ON CONFLICT (primary key) DO UPDATE, adding `increments` and overwriting `replace`"""
+    table = model.__table__
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(table).values(values)
+    set_ = {c: table.c[c] + stmt.excluded[c] for c in increments}
+    set_.update({c: stmt.excluded[c] for c in replace})
+    return stmt.on_conflict_do_update(index_elements=[c.name for c in table.primary_key], set_=set_)
+
+
+async def record_session_started(db: AsyncSession, user_id: UUID):
+    await db.execute(_upsert(
+        db, UserStats,
+        {"user_id": user_id, "total_sessions": 1, "current_level": 1, "updated_at": datetime.utcnow()},
+        increments=["total_sessions"], replace=["current_level", "updated_at"],
+    ))
+
+
+async def record_progress(
+    db: AsyncSession,
+    user_id: UUID,
+    session_id: UUID,
+    old_level: int,
+    new_level: int,
+    answered: int = 0,
+    correct: int = 0,
+    timestamp: Optional[datetime] = None,
+):
+    """Totals and current level for the user, plus a level-change event when the level moved"""
+    timestamp = timestamp or datetime.utcnow()
+    await db.execute(_upsert(
+        db, UserStats,
+        {
+            "user_id": user_id,
+            "total_sessions": 0,
+            "total_questions": answered,
+            "total_correct": correct,
+            "current_level": new_level,
+            "updated_at": timestamp,
+        },
+        increments=["total_questions", "total_correct"], replace=["current_level", "updated_at"],
+    ))
+    if new_level != old_level:
+        db.add(LevelChangeEvent(user_id=user_id, session_id=session_id, level=new_level, timestamp=timestamp))
+
+
+async def record_answer(
+    db: AsyncSession,
+    session: LearningSession,
+    question_id: str,
+    is_correct: bool,
+    old_level: int,
+    timestamp: Optional[datetime] = None,
+):
+    await record_progress(
+        db, session.user_id, session.id, old_level, session.current_level,
+        answered=1, correct=int(is_correct), timestamp=timestamp,
+    )
+    await db.execute(_upsert(
+        db, UserTopicStats,
+        {"user_id": session.user_id, "topic": content_service.get_topic(question_id), "total": 1, "correct": int(is_correct)},
+        increments=["total", "correct"],
+    ))
+
+
+async def session_owners(db: AsyncSession, session_ids: Iterable[UUID]) -> Dict[UUID, UUID]:
+    """session id -> user id for the sessions that exist"""
+    return dict((await db.execute(
+        select(LearningSession.id, LearningSession.user_id).where(LearningSession.id.in_(set(session_ids)))
+    )).all())
+
+
+async def record_emotions(db: AsyncSession, rows: List[Dict[str, Any]], owners: Dict[UUID, UUID]):
+    """Per-day emotion counts for a batch of EmotionLog rows (called by the log buffer flush)"""
+    counts = Counter(
+        (owners[row["session_id"]], row["timestamp"].date(), row["detected_emotion"])
+        for row in rows if row["session_id"] in owners
+    )
+    if counts:
+        await db.execute(_upsert(
+            db, UserEmotionDaily,
+            [{"user_id": u, "day": d, "emotion": e, "count": c} for (u, d, e), c in counts.items()],
+            increments=["count"],
+        ))
+
+
+async def clear_user(db: AsyncSession, user_id: UUID):
+    for model in ROLLUP_MODELS:
+        await db.execute(delete(model).where(model.user_id == user_id))
+
+
+# question_id -> topic of the question bank, for rebuild() to group topic totals by a join.
+# A temporary table filled with one executemany: a literal UNION ALL per question would hit
+# SQLite's 500-term compound SELECT limit on larger banks
+question_topics = Table(
+    "rollup_question_topics", MetaData(),
+    Column("question_id", String, nullable=False),
+    Column("topic", String, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+async def load_question_topics(db: AsyncSession):
+    """Create and fill `question_topics` on this session's connection"""
+    connection = await db.connection()
+    await connection.run_sync(question_topics.drop, checkfirst=True)
+    await connection.run_sync(question_topics.create)
+    rows = [{"question_id": str(question_id), "topic": topic} for question_id, topic in content_service.question_topics()]
+    if rows:
+        await db.execute(insert(question_topics), rows)
+
+
+async def rebuild(db: AsyncSession, chunk_size: int = 1000) -> Dict[str, int]:
+    """Recompute every rollup table from learning_sessions, interaction_logs and emotion_logs"""
+    for model in ROLLUP_MODELS:
+        await db.execute(delete(model))
+
+    # Per-user totals; current level is the one of the latest session
+    outer = LearningSession.__table__.alias("user_sessions")
+    latest = select(LearningSession.current_level).where(
+        LearningSession.user_id == outer.c.user_id
+    ).order_by(LearningSession.start_time.desc()).limit(1).scalar_subquery()
+    await db.execute(insert(UserStats.__table__).from_select(
+        ["user_id", "total_sessions", "total_questions", "total_correct", "current_level", "updated_at"],
+        select(
+            outer.c.user_id,
+            func.count(outer.c.id),
+            func.coalesce(func.sum(outer.c.total_questions), 0),
+            func.coalesce(func.sum(outer.c.total_correct), 0),
+            func.coalesce(latest, 1),
+            literal(datetime.utcnow()),
+        ).group_by(outer.c.user_id),
+    ))
+
+    # Per-user, per-topic accuracy
+    await load_question_topics(db)
+    # Inline literal (not a bind param) so the GROUP BY expression matches the SELECT one
+    topic = func.coalesce(question_topics.c.topic, literal_column("'general'")).label("topic")
+    await db.execute(insert(UserTopicStats.__table__).from_select(
+        ["user_id", "topic", "total", "correct"],
+        select(
+            LearningSession.user_id,
+            topic,
+            func.count(InteractionLog.id),
+            func.sum(case((InteractionLog.is_correct, 1), else_=0)),
+        ).select_from(InteractionLog)
+        .join(LearningSession, InteractionLog.session_id == LearningSession.id)
+        .outerjoin(question_topics, question_topics.c.question_id == InteractionLog.question_id)
+        .group_by(LearningSession.user_id, topic),
+    ))
+    connection = await db.connection()
+    await connection.run_sync(question_topics.drop)
+
+    # Per-user, per-day emotion counts
+    day = func.date(EmotionLog.timestamp)
+    await db.execute(insert(UserEmotionDaily.__table__).from_select(
+        ["user_id", "day", "emotion", "count"],
+        select(LearningSession.user_id, day, EmotionLog.detected_emotion, func.count(EmotionLog.id))
+        .join(LearningSession, EmotionLog.session_id == LearningSession.id)
+        .group_by(LearningSession.user_id, day, EmotionLog.detected_emotion),
+    ))
+
+    # Level changes: replay each session's proficiency the way submit_answer accumulates it
+    events: List[Dict[str, Any]] = []
+    current_session, proficiency, level = None, 1.0, 1
+    stream = await db.stream(
+        select(LearningSession.user_id, InteractionLog.session_id, InteractionLog.ai_difficulty_adj, InteractionLog.timestamp)
+        .join(LearningSession, InteractionLog.session_id == LearningSession.id)
+        .order_by(InteractionLog.session_id, InteractionLog.timestamp, InteractionLog.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for user_id, session_id, adjustment, timestamp in stream:
+        if session_id != current_session:
+            current_session, proficiency, level = session_id, 1.0, 1
+        proficiency = max(1.0, min(5.9, proficiency + adjustment))
+        if int(proficiency) != level:
+            level = int(proficiency)
+            events.append({"user_id": user_id, "session_id": session_id, "level": level, "timestamp": timestamp})
+        if len(events) >= chunk_size:
+            await db.execute(insert(LevelChangeEvent.__table__), events)
+            events = []
+    if events:
+        await db.execute(insert(LevelChangeEvent.__table__), events)
+
+    counts = {}
+    for model in ROLLUP_MODELS:
+        counts[model.__tablename__] = (await db.execute(select(func.count()).select_from(model))).scalar_one()
+    logger.info("Analytics rollups rebuilt", extra=counts)
+    return counts
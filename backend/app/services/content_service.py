@@ -1,65 +1,139 @@
 
-import json
+import asyncio
 import random
-import os
-from typing import List, Dict, Optional
+import time
+from typing import List, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.data_files import data_path
+from app.core.logger import get_logger
+from app.services.question_store import MAX_DIFFICULTY, MIN_DIFFICULTY, QuestionStore, open_store
+from app.services.question_scheduler import SessionSchedule
+
+logger = get_logger(__name__)
+
+NO_QUESTION = {
+    "question": "No questions available in the bank.",
+    "options": ["Error"],
+    "correct_answer": "Error",
+    "hint": "Please check backend configuration."
+}
+
 
 class ContentService:
+    """
+    Question bank served from the compiled question store (see services/question_store.py).
+
+    Requests check at most every QUESTION_STORE_RELOAD_INTERVAL_SECONDS whether the JSON
+    source or the compiled file changed, and swap in the new store in the background;
+    requests already running keep the store they started with.
+    """
+
     def __init__(self):
-        self.questions = []
+        self.source_path = data_path(settings.QUESTION_BANK_PATH)
+        self.store_path = data_path(settings.QUESTION_STORE_PATH)
+        self._store: Optional[QuestionStore] = None
+        self._reload_lock = asyncio.Lock()
+        self._next_check = 0.0
         self._load_questions()
 
     def _load_questions(self):
-        """Loads questions from the local JSON file."""
+        """Opens the question store, compiling it from the JSON file when needed."""
         try:
-            file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "questions.json")
-            with open(file_path, "r") as f:
-                self.questions = json.load(f)
-            print(f"EduMorph Content Bank Loaded: {len(self.questions)} questions.")
+            self._store = open_store(self.source_path, self.store_path)
+            logger.info("EduMorph Content Bank Loaded: %d questions.", self._store.count)
         except Exception as e:
-            print(f"Error loading questions: {e}")
-            self.questions = []
+            logger.warning("Error loading questions: %s", e)
+            self._store = None
+        self._next_check = time.monotonic() + settings.QUESTION_STORE_RELOAD_INTERVAL_SECONDS
 
-    async def get_question(self, difficulty: int, emotion: str, topic: str = "geometry") -> Dict:
+    async def reload(self, force: bool = False) -> bool:
         """
-        Selects a question based on difficulty.
-        Caps difficulty at 5 (max difficulty available).
-        Topic and Emotion can be used for future filtering.
+        Swap in the current store if the source or the compiled file changed (recompiling
+        with `force`). Compilation runs in a thread; returns whether the store was swapped.
         """
-        # Cap difficulty at 5 (max difficulty in question bank)
-        capped_difficulty = min(5, max(1, difficulty))
-        
-        # Filter by difficulty (exact match)
-        candidates = [q for q in self.questions if q["difficulty"] == capped_difficulty]
-        
-        # Fallback: If no questions for this exact difficulty, find nearest
-        if not candidates:
-            # Try +/- 1 level
-            candidates = [q for q in self.questions if abs(q["difficulty"] - capped_difficulty) <= 1]
-        
-        # Fallback: Any question
-        if not candidates:
-            candidates = self.questions
-            
+        async with self._reload_lock:
+            self._next_check = time.monotonic() + settings.QUESTION_STORE_RELOAD_INTERVAL_SECONDS
+            store = await asyncio.to_thread(open_store, self.source_path, self.store_path, self._store, force)
+            if store is None:
+                return False
+            self._store = store
+            logger.info("Question bank reloaded", extra={"questions": store.count, "path": self.store_path})
+            return True
+
+    async def _maybe_reload(self):
+        if settings.QUESTION_STORE_RELOAD_INTERVAL_SECONDS <= 0 or self._reload_lock.locked():
+            return
+        if time.monotonic() < self._next_check:
+            return
+        try:
+            await self.reload()
+        except Exception as e:
+            # Keep serving the store we have
+            logger.warning("Question bank reload failed: %s", e)
+
+    @property
+    def count(self) -> int:
+        return self._store.count if self._store else 0
+
+    @property
+    def topics(self) -> List[str]:
+        return sorted(self._store.by_topic) if self._store else []
+
+    def question_topics(self) -> List[Tuple[int, str]]:
+        """(question id, topic) of every question in the bank."""
+        return list(self._store.topics_by_id()) if self._store else []
+
+    def get_by_id(self, question_id) -> Optional[Dict]:
+        """Question payload by id, or None if it is not in the bank."""
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return None
+        return self._store.get(question_id) if self._store else None
+
+    def get_topic(self, question_id: str) -> str:
+        """Topic of a question in the bank ('general' for unknown ids)."""
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return "general"
+        topic = self._store.get_topic(question_id) if self._store else None
+        return topic or "general"
+
+    def record_answer(self, schedule: SessionSchedule, question_id, is_correct: bool):
+        """Feed an answer to the session's schedule (mastery and spaced review of misses)."""
+        try:
+            question_id = int(question_id)
+        except (TypeError, ValueError):
+            return
+        described = self._store.describe(question_id) if self._store else None
+        topic, difficulty = described if described else ("general", None)
+        schedule.record_answer(question_id, is_correct, topic, difficulty)
+
+    async def get_question(self, difficulty: int, emotion: str, topic: str = "geometry",
+                           schedule: Optional[SessionSchedule] = None) -> Dict:
+        """
+        Selects a question of the given difficulty (capped to 1-5), falling back
+        to +/-1 level and then to any question.
+        `topic` restricts the choice to one topic of the bank; a topic the bank does not
+        have (e.g. the default "geometry", the subject as a whole) selects from every topic.
+        With a session `schedule` the choice avoids repeats and uses emotion, missed
+        questions and topic mastery (see services/question_scheduler.py); without one it is random.
+        """
+        await self._maybe_reload()
+        store = self._store
+        if store is None:
+            return dict(NO_QUESTION)
+        capped_difficulty = min(MAX_DIFFICULTY, max(MIN_DIFFICULTY, difficulty))
+        if schedule is not None:
+            question_id = schedule.pick(store, capped_difficulty, topic, emotion)
+            question = store.get(question_id) if question_id is not None else None
+            return question or dict(NO_QUESTION)
+        table = store.by_topic.get(topic, store.by_difficulty)
+        candidates = table.get(capped_difficulty)
         if not candidates:
-             return {
-                "question": "No questions available in the bank.",
-                "options": ["Error"],
-                "correct_answer": "Error",
-                "hint": "Please check backend configuration."
-            }
-
-        # Select random question from candidates
-        selected = random.choice(candidates)
-        
-        return {
-            "question": selected["question"],
-            "options": selected["options"],
-            "correct_answer": selected["correct_answer"],
-            "hint": selected["hint"],
-            "id": selected["id"],
-            "difficulty": selected["difficulty"],
-            "topic": selected["topic"]
-        }
+            return dict(NO_QUESTION)
+        return store.get(random.choice(candidates))
 
 content_service = ContentService()
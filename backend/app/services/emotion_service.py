@@ -1,101 +1,421 @@
 import os
+import time
 import base64
-from typing import Dict, List
-# from app.core.config import settings # Unused if API key is removed
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.services.emotion_state import EmotionStateStore
+from app.services.face_detectors import FaceDetector, create_detector
+from app.services.face_tracker import Box, FaceTracker
+
+logger = get_logger(__name__)
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ml_models", "emotion-ferplus-12.onnx")
+EMOTIONS = ['neutral', 'happy', 'surprise', 'sadness', 'anger', 'disgust', 'fear', 'contempt']
+NEUTRAL_RESULT = {"emotion": "neutral", "confidence": 0.0}
+
+
+class EmotionServiceOverloaded(Exception):
+    """Raised when the inference queue is full and EMOTION_OVERLOAD_POLICY is 'reject'."""
+
+
+# --- Worker side ---
+# Preprocess workers only detect faces and forward workers only run the network, so each
+# lazily loads just its own part (thread-local: a cv2.dnn.Net must not be shared between threads).
+_worker = threading.local()
+
+
+def _load_detector() -> FaceDetector:
+    if getattr(_worker, "detector", None) is None:
+        _worker.detector = create_detector()
+        logger.info("Emotion preprocess worker ready", extra={
+            "pid": os.getpid(),
+            "worker": threading.current_thread().name,
+            "detector": _worker.detector.name
+        })
+    return _worker.detector
+
+
+def _load_net():
+    if getattr(_worker, "net", None) is None:
+        import cv2
+        _worker.net = cv2.dnn.readNetFromONNX(MODEL_PATH)
+        logger.info("Emotion forward worker model loaded", extra={
+            "pid": os.getpid(),
+            "worker": threading.current_thread().name
+        })
+    return _worker.net
+
+
+def _detect_scaled(detector: FaceDetector, gray, min_size: int, scale: float) -> List[Box]:
+    """Run the detector on a copy downscaled by `scale` and map boxes back to `gray` pixels"""
+    if scale >= 1.0:
+        return detector.detect(gray, min_size)
+
+    import cv2
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    boxes = detector.detect(small, max(1, int(min_size * scale)))
+    return [tuple(int(round(v / scale)) for v in box) for box in boxes]
+
+
+def _detect_face(detector: FaceDetector, gray, hint_box: Optional[Box]) -> Tuple[Optional[Box], bool]:
+    """
+    Largest face in the frame as (box, found_in_roi).
+    With a hint box from the session's tracker, only a padded region around it is
+    scanned first; the full frame is scanned when there is no hint or the face left the region.
+    Frames wider than EMOTION_DETECT_WIDTH are detected on a downscaled copy; the
+    box is mapped back so the crop still comes from the full-resolution frame.
+    """
+    target = settings.EMOTION_DETECT_WIDTH
+    scale = target / gray.shape[1] if target and gray.shape[1] > target else 1.0
+
+    if hint_box is not None:
+        x, y, w, h = hint_box
+        pad_x, pad_y = int(w * settings.EMOTION_TRACK_PADDING), int(h * settings.EMOTION_TRACK_PADDING)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        # The face barely moves between frames, so skip scales far below the last size
+        min_side = max(30, int(min(w, h) * 0.5))
+        faces = _detect_scaled(detector, gray[y0:y1, x0:x1], min_side, scale)
+        if len(faces) > 0:
+            (fx, fy, fw, fh) = max(faces, key=lambda face: face[2] * face[3])
+            return (fx + x0, fy + y0, fw, fh), True
+
+    faces = _detect_scaled(detector, gray, 30, scale)
+    if len(faces) > 0:
+        # Use the largest face detected
+        return max(faces, key=lambda face: face[2] * face[3]), False
+    return None, False
+
+
+def _preprocess_frame(image: Union[str, bytes], hint_box: Optional[Box] = None):
+    """
+    Decode a frame (base64 / data-URL string, or raw encoded bytes) and return
+    (1x1x64x64 face blob, face box, found_in_roi); the blob is None if it can't be decoded.
+    """
+    import cv2
+    import numpy as np
+
+    detector = _load_detector()
+
+    # Decode image
+    if isinstance(image, str):
+        if "," in image:
+            image = image.split(",")[1]
+        image = base64.b64decode(image)
+
+    # Raw bytes are wrapped without copying
+    nparr = np.frombuffer(image, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+    if img is None:
+        return None, None, False
+
+    # Preprocessing for ONNX:
+    # 1. Convert to Grayscale
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # 2. Detect Face and Crop (NEW - Improves accuracy!)
+    box, from_roi = _detect_face(detector, gray, hint_box)
+
+    if box is not None:
+        (x, y, w, h) = box
+        face_roi = gray[y:y+h, x:x+w]
+    else:
+        # No face detected, use entire image (fallback)
+        face_roi = gray
+
+    # 3. Resize to 64x64
+    # 4. Create Blob (This handles resizing and scaling)
+    # Input is 64x64 grayscale (1 channel)
+    blob = cv2.dnn.blobFromImage(face_roi, 1.0, (64, 64), (0, 0, 0), swapRB=False, crop=False)
+    return blob, box, from_roi
+
+
+def _forward_batch(blob):
+    """
+    Forward pass for an NCHW stack of face blobs; returns softmax probabilities (N x 8).
+    Models exported with a fixed batch of 1 are detected once per worker and fed per sample.
+    """
+    import numpy as np
+
+    net = _load_net()
+    n = blob.shape[0]
+
+    scores = None
+    if n > 1 and getattr(_worker, "batchable", True):
+        try:
+            net.setInput(blob)
+            scores = net.forward()
+            if scores.shape[0] != n:
+                scores = None
+        except Exception:
+            scores = None
+        if scores is None:
+            _worker.batchable = False
+            logger.info("ONNX model does not accept batched input, falling back to per-sample forward")
+    if scores is None:
+        rows = []
+        for i in range(n):
+            net.setInput(blob[i:i+1])
+            rows.append(net.forward()[0])
+        scores = np.stack(rows)
+
+    # 5. Softmax
+    scores = scores.reshape(n, -1)
+    exp_scores = np.exp(scores - np.max(scores, axis=1, keepdims=True))
+    return exp_scores / np.sum(exp_scores, axis=1, keepdims=True)
+
+
+def _to_result(probs) -> Dict:
+    import numpy as np
+
+    # 6. Get best class
+    best_idx = int(np.argmax(probs))
+    raw_emotion = EMOTIONS[best_idx]
+    confidence = float(probs[best_idx])
+
+    # Normalize emotion names to match common usage
+    if raw_emotion == 'happiness':
+        emotion = 'happy'
+    elif raw_emotion == 'sadness':
+        emotion = 'sad'
+    else:
+        emotion = raw_emotion
+
+    return {
+        "emotion": emotion,
+        "confidence": confidence,
+        "raw_emotion": raw_emotion
+    }
+
+
+def _run_preprocess(image: Union[str, bytes], submitted_at: float,
+                    hint_box: Optional[Box] = None) -> Tuple[Optional[object], Optional[Box], bool, float]:
+    """Pool entry point for stage 1; returns (face blob or None, face box, found_in_roi, queue wait seconds)"""
+    started = time.time()
+    try:
+        return (*_preprocess_frame(image, hint_box), started - submitted_at)
+    except Exception as e:
+        logger.warning("Prediction Error: %s", e)
+        return None, None, False, started - submitted_at
+
+
+def _run_forward(blob) -> Tuple[object, float]:
+    """Pool entry point for stage 2; returns (probabilities, inference seconds)"""
+    started = time.time()
+    return _forward_batch(blob), time.time() - started
+
+
+class _MicroBatcher:
+    """
+    Collects face blobs from concurrent requests and runs them through the network
+    as one NCHW batch, once EMOTION_BATCH_MAX_SIZE blobs are queued or
+    EMOTION_BATCH_WINDOW_MS after the first one arrived, whichever comes first.
+    """
+
+    def __init__(self, service: "EmotionService", max_size: int, window: float):
+        self.service = service
+        self.max_size = max(1, max_size)
+        self.window = window
+        self._items: List[Tuple[object, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, blob):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._items.append((blob, future))
+        if len(self._items) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._items = self._items, []
+        if items:
+            asyncio.get_running_loop().create_task(self._run(items))
+
+    async def _run(self, items: List[Tuple[object, asyncio.Future]]):
+        import numpy as np
+
+        loop = asyncio.get_running_loop()
+        try:
+            blob = np.concatenate([b for b, _ in items], axis=0)
+            probs, inference = await loop.run_in_executor(self.service._get_forward_executor(), _run_forward, blob)
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.service._record_batch(len(items), inference)
+        for (_, future), row in zip(items, probs):
+            if not future.done():
+                future.set_result(row)
+
+
+# --- Event loop side ---
 class EmotionService:
     def __init__(self):
         self.net = None
-        self.emotions = ['neutral', 'happy', 'surprise', 'sadness', 'anger', 'disgust', 'fear', 'contempt']
-        
+        self.emotions = EMOTIONS
+        self.workers = settings.EMOTION_WORKERS
+        self.capacity = settings.EMOTION_WORKERS + settings.EMOTION_QUEUE_SIZE
+        self._executor: Optional[Executor] = None
+        self._forward_executor: Optional[Executor] = None
+        self._pending = 0
+        # Last result per session, served as a "stale" answer under backpressure
+        self._last_results: "OrderedDict[str, Dict]" = OrderedDict()
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "stale": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+            "inference_total": 0.0,
+            "batches": 0,
+            "batched_frames": 0,
+        }
+        self.tracker = FaceTracker(
+            max_sessions=settings.EMOTION_TRACK_MAX_SESSIONS,
+            ttl=settings.EMOTION_TRACK_TTL_SECONDS,
+            redetect_every=settings.EMOTION_TRACK_REDETECT_EVERY,
+        )
+        self.state = EmotionStateStore(
+            EMOTIONS,
+            window=settings.EMOTION_SMOOTHING_WINDOW,
+            ttl=settings.EMOTION_STATE_TTL_SECONDS,
+            max_sessions=settings.EMOTION_STATE_MAX_SESSIONS,
+        )
+        self._batcher = _MicroBatcher(self, settings.EMOTION_BATCH_MAX_SIZE, settings.EMOTION_BATCH_WINDOW_MS / 1000)
+
         # Load ONNX model (Opset 12)
-        model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ml_models", "emotion-ferplus-12.onnx")
         try:
-            if not os.path.exists(model_path):
-                print(f"ONNX Model not found at: {model_path}")
+            if not os.path.exists(MODEL_PATH):
+                logger.warning("ONNX Model not found at: %s", MODEL_PATH)
             else:
                 import cv2
-                self.net = cv2.dnn.readNetFromONNX(model_path)
-                print(f"Local Emotion AI (ONNX Opset 12) Loaded! Path: {model_path}")
-                
-                # Load Haar Cascade for face detection
-                self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-                print(f"Face Detection Cascade Loaded!")
+                # Only validates the model here; the forward worker loads its own copy
+                self.net = cv2.dnn.readNetFromONNX(MODEL_PATH)
+                logger.info("Local Emotion AI (ONNX Opset 12) Loaded! Path: %s", MODEL_PATH)
         except Exception as e:
-            print(f"Failed to load ONNX model: {e}")
+            logger.error("Failed to load ONNX model: %s", e)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if settings.EMOTION_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="emotion")
+            logger.info("Emotion inference pool started", extra={
+                "executor": settings.EMOTION_EXECUTOR,
+                "workers": self.workers,
+                "capacity": self.capacity
+            })
+        return self._executor
+
+    def _get_forward_executor(self) -> Executor:
+        # A single dedicated worker runs the batched forward passes, so crops keep
+        # accumulating into the next batch while one is in flight (cv2.dnn already
+        # parallelizes a single forward internally).
+        if self._forward_executor is None:
+            if settings.EMOTION_EXECUTOR == "process":
+                self._forward_executor = ProcessPoolExecutor(max_workers=1)
+            else:
+                self._forward_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="emotion-forward")
+        return self._forward_executor
 
-    async def predict(self, base64_image: str) -> Dict[str, float]:
+    def _remember(self, session_id: Optional[str], result: Dict):
+        if session_id is None:
+            return
+        self._last_results[session_id] = result
+        self._last_results.move_to_end(session_id)
+        while len(self._last_results) > settings.EMOTION_STALE_CACHE_SIZE:
+            self._last_results.popitem(last=False)
+
+    async def predict(self, image: Union[str, bytes], session_id: Optional[str] = None) -> Dict[str, float]:
         """
-        Predict emotion from base64 image using local ONNX model (OpenCV DNN).
+        Predict emotion from a base64 image or raw encoded bytes on the inference pool.
+        When more than EMOTION_WORKERS + EMOTION_QUEUE_SIZE frames are in flight, either
+        raises EmotionServiceOverloaded or returns the session's previous result with "stale": True.
         """
         if not self.net:
-            return {"emotion": "neutral", "confidence": 0.0}
+            return dict(NEUTRAL_RESULT)
+
+        if self._pending >= self.capacity:
+            if settings.EMOTION_OVERLOAD_POLICY == "reject":
+                self._stats["rejected"] += 1
+                raise EmotionServiceOverloaded()
+            self._stats["stale"] += 1
+            return {**self._last_results.get(session_id, NEUTRAL_RESULT), "stale": True}
 
+        self._pending += 1
         try:
-            import cv2
-            import numpy as np
-
-            # Decode image
-            if "," in base64_image:
-                base64_image = base64_image.split(",")[1]
-            
-            image_data = base64.b64decode(base64_image)
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            if img is None:
-                return {"emotion": "neutral", "confidence": 0.0}
-
-            # Preprocessing for ONNX:
-            # 1. Convert to Grayscale
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # 2. Detect Face and Crop (NEW - Improves accuracy!)
-            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-            
-            if len(faces) > 0:
-                # Use the largest face detected
-                (x, y, w, h) = max(faces, key=lambda face: face[2] * face[3])
-                face_roi = gray[y:y+h, x:x+w]
+            loop = asyncio.get_running_loop()
+            hint_box = self.tracker.hint(session_id) if settings.EMOTION_TRACKING else None
+            blob, box, from_roi, wait = await loop.run_in_executor(
+                self._get_executor(), _run_preprocess, image, time.time(), hint_box
+            )
+            if settings.EMOTION_TRACKING and blob is not None:
+                self.tracker.update(session_id, box, from_roi)
+            if blob is None:
+                result = dict(NEUTRAL_RESULT)
             else:
-                # No face detected, use entire image (fallback)
-                face_roi = gray
-            
-            # 3. Resize to 64x64
-            # 4. Create Blob (This handles resizing and scaling)
-            # Input is 64x64 grayscale (1 channel)
-            blob = cv2.dnn.blobFromImage(face_roi, 1.0, (64, 64), (0, 0, 0), swapRB=False, crop=False)
-            
-            # 4. Forward Pass
-            self.net.setInput(blob)
-            scores = self.net.forward()
-            
-            # 5. Softmax
-            scores = scores[0] # Get first sample
-            exp_scores = np.exp(scores - np.max(scores))
-            probs = exp_scores / np.sum(exp_scores)
-            
-            # 6. Get best class
-            best_idx = np.argmax(probs)
-            raw_emotion = self.emotions[best_idx]
-            confidence = float(probs[best_idx])
-            
-            # Normalize emotion names to match common usage
-            if raw_emotion == 'happiness': 
-                emotion = 'happy'
-            elif raw_emotion == 'sadness': 
-                emotion = 'sad'
-            else:
-                emotion = raw_emotion
-            
-            return {
-                "emotion": emotion,
-                "confidence": confidence,
-                "raw_emotion": raw_emotion
-            }
-
+                probs = await self._batcher.submit(blob)
+                result = _to_result(probs)
+                if session_id is not None:
+                    self.state.update(session_id, probs)
         except Exception as e:
-            print(f"Prediction Error: {e}")
-            return {"emotion": "neutral", "confidence": 0.0}
+            logger.warning("Prediction Error: %s", e)
+            return dict(NEUTRAL_RESULT)
+        finally:
+            self._pending -= 1
+
+        self._stats["completed"] += 1
+        self._stats["wait_total"] += wait
+        self._stats["wait_max"] = max(self._stats["wait_max"], wait)
+        self._remember(session_id, result)
+        return result
+
+    def _record_batch(self, size: int, inference: float):
+        self._stats["batches"] += 1
+        self._stats["batched_frames"] += size
+        self._stats["inference_total"] += inference
+
+    def metrics(self) -> Dict:
+        completed = self._stats["completed"] or 1
+        batches = self._stats["batches"] or 1
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self._pending,
+            "queue_depth": max(0, self._pending - self.workers),
+            "completed": self._stats["completed"],
+            "rejected": self._stats["rejected"],
+            "stale": self._stats["stale"],
+            "avg_wait_ms": round(self._stats["wait_total"] / completed * 1000, 2),
+            "max_wait_ms": round(self._stats["wait_max"] * 1000, 2),
+            "batches": self._stats["batches"],
+            "avg_batch_size": round(self._stats["batched_frames"] / batches, 2),
+            "avg_batch_inference_ms": round(self._stats["inference_total"] / batches * 1000, 2),
+            "face_tracking": self.tracker.metrics(),
+            "emotion_state": self.state.metrics(),
+        }
+
+    def shutdown(self):
+        for executor in (self._executor, self._forward_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._forward_executor = None
 
 emotion_service = EmotionService()
@@ -0,0 +1,77 @@
+
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Raw model classes -> names used by the fuzzy system and EmotionLog
+EMOTION_ALIASES = {'happiness': 'happy', 'sadness': 'sad'}
+
+
+class EmotionStateStore:
+    """
+    In-process emotion state per learning session.
+
+    Keeps an exponentially smoothed copy of the full softmax vector, updated on
+    every predicted frame, so readers (submit-answer, monitor) get a less noisy
+    emotion without a database round-trip. `window` is the EMA span in frames
+    (alpha = 2 / (window + 1)). Idle sessions expire after `ttl` seconds and the
+    least recently updated ones are dropped beyond `max_sessions`.
+    """
+
+    def __init__(self, classes: List[str], window: int, ttl: float, max_sessions: int):
+        self.classes = classes
+        self.alpha = 2.0 / (max(1, window) + 1)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session_id -> (smoothed probabilities, frames seen, last update)
+        self._states: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+    def update(self, session_id, probs) -> Dict:
+        key = str(session_id)
+        probs = np.asarray(probs, dtype=float)
+        state = self._states.get(key)
+        if state is None or time.monotonic() - state[2] > self.ttl:
+            smoothed, frames = probs, 1
+        else:
+            smoothed = self.alpha * probs + (1 - self.alpha) * state[0]
+            frames = state[1] + 1
+        self._states[key] = (smoothed, frames, time.monotonic())
+        self._states.move_to_end(key)
+        self._evict()
+        return self._describe(smoothed, frames)
+
+    def get(self, session_id) -> Optional[Dict]:
+        """Smoothed state for the session, or None if unknown / expired"""
+        key = str(session_id)
+        state = self._states.get(key)
+        if state is None or time.monotonic() - state[2] > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return self._describe(state[0], state[1])
+
+    def _describe(self, smoothed: np.ndarray, frames: int) -> Dict:
+        best_idx = int(np.argmax(smoothed))
+        raw_emotion = self.classes[best_idx]
+        return {
+            "emotion": EMOTION_ALIASES.get(raw_emotion, raw_emotion),
+            "confidence": float(smoothed[best_idx]),
+            "probabilities": {c: round(float(p), 4) for c, p in zip(self.classes, smoothed)},
+            "frames": frames,
+        }
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._states:
+            _, (_, _, last_seen) = next(iter(self._states.items()))
+            if len(self._states) > self.max_sessions or now - last_seen > self.ttl:
+                self._states.popitem(last=False)
+                self.stats["evicted"] += 1
+            else:
+                break
+
+    def metrics(self) -> Dict:
+        return {"sessions": len(self._states), **self.stats}
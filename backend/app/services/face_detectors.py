@@ -0,0 +1,98 @@
+
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.services.face_tracker import Box
+
+logger = get_logger(__name__)
+
+ML_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ml_models")
+
+
+class FaceDetector(ABC):
+    """Common interface: find faces in a grayscale frame, boxes in that frame's pixels."""
+
+    name = "base"
+
+    @abstractmethod
+    def detect(self, gray, min_size: int) -> List[Box]:
+        """Face boxes (x, y, w, h) at least `min_size` pixels wide"""
+
+
+class CascadeDetector(FaceDetector):
+    """OpenCV cascade classifier (Haar or LBP, depending on the XML file)."""
+
+    def __init__(self, name: str, path: str):
+        import cv2
+        self.name = name
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade: {path}")
+
+    def detect(self, gray, min_size: int) -> List[Box]:
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size))
+        return [tuple(int(v) for v in face) for face in faces]
+
+
+class DnnFaceDetector(FaceDetector):
+    """OpenCV DNN ResNet-10 SSD face detector (res10_300x300 Caffe model)."""
+
+    name = "dnn"
+
+    def __init__(self, prototxt: str, model: str, confidence: float):
+        import cv2
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+
+    def detect(self, gray, min_size: int) -> List[Box]:
+        import cv2
+
+        h, w = gray.shape[:2]
+        bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+
+        boxes = []
+        for _, _, score, x0, y0, x1, y1 in detections:
+            if score < self.confidence:
+                continue
+            x0, y0 = max(0, int(x0 * w)), max(0, int(y0 * h))
+            x1, y1 = min(w, int(x1 * w)), min(h, int(y1 * h))
+            if x1 - x0 >= min_size and y1 - y0 >= min_size:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+
+def _model_path(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(ML_MODELS_DIR, path)
+
+
+def create_detector(name: Optional[str] = None) -> FaceDetector:
+    """
+    Build the detector selected by EMOTION_DETECTOR ("haar", "lbp" or "dnn").
+    LBP and DNN need local model files in app/ml_models; when those are missing
+    the bundled Haar cascade is used instead.
+    """
+    import cv2
+
+    name = name or settings.EMOTION_DETECTOR
+    try:
+        if name == "lbp":
+            path = _model_path(settings.EMOTION_LBP_CASCADE)
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return CascadeDetector("lbp", path)
+        if name == "dnn":
+            prototxt = _model_path(settings.EMOTION_DNN_FACE_PROTOTXT)
+            model = _model_path(settings.EMOTION_DNN_FACE_MODEL)
+            if not (os.path.exists(prototxt) and os.path.exists(model)):
+                raise FileNotFoundError(f"{prototxt} / {model}")
+            return DnnFaceDetector(prototxt, model, settings.EMOTION_DNN_FACE_CONFIDENCE)
+    except Exception as e:
+        logger.warning("Face detector '%s' unavailable (%s), falling back to haar", name, e)
+
+    return CascadeDetector("haar", cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
@@ -0,0 +1,68 @@
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+Box = Tuple[int, int, int, int]  # x, y, w, h in full-frame pixels
+
+
+class FaceTracker:
+    """
+    Remembers the last face bounding box per learning session.
+
+    Lives on the event-loop side of EmotionService so it works the same for thread
+    and process pools: the box is passed into the worker as a hint, and the worker
+    reports back where it found the face. Sessions are evicted LRU once
+    `max_sessions` is reached, or after `ttl` seconds without a frame.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float, redetect_every: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.redetect_every = redetect_every
+        # session_id -> (box, frames since last full-frame detection, last seen)
+        self._tracks: "OrderedDict[str, Tuple[Box, int, float]]" = OrderedDict()
+        self.stats = {"roi_hits": 0, "full_detections": 0, "evicted": 0}
+
+    def hint(self, session_id: Optional[str]) -> Optional[Box]:
+        """Box to search around for this frame, or None to force full-frame detection"""
+        if session_id is None:
+            return None
+        track = self._tracks.get(session_id)
+        if track is None:
+            return None
+        box, frames, last_seen = track
+        if time.monotonic() - last_seen > self.ttl or frames >= self.redetect_every:
+            return None
+        return box
+
+    def update(self, session_id: Optional[str], box: Optional[Box], from_roi: bool):
+        if from_roi:
+            self.stats["roi_hits"] += 1
+        else:
+            self.stats["full_detections"] += 1
+        if session_id is None:
+            return
+
+        if box is None:
+            # Face lost: next frame goes back to full-frame detection
+            self._tracks.pop(session_id, None)
+            return
+
+        frames = self._tracks[session_id][1] + 1 if (from_roi and session_id in self._tracks) else 0
+        self._tracks[session_id] = (box, frames, time.monotonic())
+        self._tracks.move_to_end(session_id)
+        self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._tracks:
+            session_id, (_, _, last_seen) = next(iter(self._tracks.items()))
+            if len(self._tracks) > self.max_sessions or now - last_seen > self.ttl:
+                self._tracks.popitem(last=False)
+                self.stats["evicted"] += 1
+            else:
+                break
+
+    def metrics(self) -> Dict:
+        return {"tracked_sessions": len(self._tracks), **self.stats}
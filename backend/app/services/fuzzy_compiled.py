@@ -0,0 +1,235 @@
+
+import numpy as np
+from bisect import bisect_right
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+
+from app.core.logger import get_logger
+from app.services.fuzzy_logic import FuzzyAdaptiveSystem
+from app.services.fuzzy_rulebase import RuleBase
+
+logger = get_logger(__name__)
+
+# Default grid spacing per continuous input. Every membership breakpoint is always
+# added to the grid as well, so the table is exact on the knees of the fuzzy sets.
+DEFAULT_GRID_STEPS = {
+    'screen_time': 1.0,
+    'accuracy': 0.05,
+    'response_time': 0.5,
+    'hints': 1.0,
+}
+# Continuous inputs of evaluate_rule_outputs, in argument order
+INPUTS = ('screen_time', 'accuracy', 'response_time', 'hints')
+# Total rule activation under which a lookup runs the exact rule pass (see the class docstring)
+EXACT_BELOW_ACTIVATION = 0.05
+
+
+class CompiledFuzzyAdaptiveSystem(FuzzyAdaptiveSystem):
+    """
+    Lookup-table variant of FuzzyAdaptiveSystem.
+
+    At startup the rule outputs (one strength per action) are precomputed on a grid
+    covering the bounded input domain, using the vectorized batch path. Only the inputs
+    the rules reference become table axes (accuracy and response time with the shipped
+    spec). Serving then costs a scalar multilinear interpolation of the table (bisect on
+    plain lists, no numpy per call) instead of fuzzification + rule pass;
+    defuzzification and the expert intervention layer still run exactly.
+
+    Accuracy: rule outputs are piecewise linear in each input and every breakpoint and
+    min() kink is a grid node, but the exact path rounds memberships and strengths to
+    3 decimals, which the interpolation cannot reproduce. When the total rule activation
+    is near zero the centre of gravity of a few 0.001 strengths is dominated by that
+    rounding, and the two paths can disagree by a whole level. Lookups whose total
+    interpolated activation is below `exact_below` therefore run the exact rule pass.
+    `self.error_bound` is the largest |adjustment| deviation measured at the midpoint of
+    every grid cell for the lookups the table serves: a measured maximum, not a proven
+    bound. benchmarks/fuzzy_engines.py compares both paths on random inputs (deviation,
+    level changes and time per call).
+
+    Inputs outside the compiled domain, or `enabled = False`, fall back to the exact path.
+    The table belongs to the rule base it was compiled from; a new rule spec means a new system.
+    """
+
+    def __init__(self, grid_steps: Optional[Dict[str, float]] = None, enabled: bool = True,
+                 rule_base: Optional[RuleBase] = None, exact_below: float = EXACT_BELOW_ACTIVATION):
+        super().__init__(rule_base)
+        self.enabled = enabled
+        self.exact_below = exact_below
+        self.grid_steps = {**DEFAULT_GRID_STEPS, **(grid_steps or {})}
+        self.emotions = list(self.rule_base.emotion_membership)
+        self._emotion_index = {emotion: i for i, emotion in enumerate(self.emotions)}
+        self._default_emotion_idx = self._emotion_index[self.rule_base.default_emotion]
+        self.actions = self.rule_base.actions
+        self.error_bound = 0.0
+        self._compile()
+        logger.info("Fuzzy lookup table compiled", extra={
+            "axes": self.axes,
+            "shape": self.table.shape,
+            "error_bound": round(self.error_bound, 4)
+        })
+
+    # --- Compilation ---
+    @staticmethod
+    def _level_crossings(kind: str, params: tuple, levels: List[float]) -> List[float]:
+        """Inputs where a membership function's slopes reach the given levels (min() kinks)"""
+        if kind == 'trap':
+            a, b, c, d = params
+        else:
+            a, b, d = params
+            c = b
+        points = []
+        for level in levels:
+            if b > a:
+                points.append(a + level * (b - a))
+            if d > c:
+                points.append(d - level * (d - c))
+        return points
+
+    def _build_grid(self, variable: str) -> np.ndarray:
+        functions = self.rule_base.membership_functions[variable].values()
+        breakpoints = sorted({p for _, params in functions for p in params})
+        # Rules clip memberships with min() against emotion degrees, which puts
+        # extra kinks inside the fuzzy set slopes; keep those on the grid too.
+        levels = sorted({v for degrees in self.rule_base.emotion_membership.values() for v in degrees.values() if 0 < v < 1})
+        kinks = [p for kind, params in functions for p in self._level_crossings(kind, params, levels)]
+        low, high = breakpoints[0], breakpoints[-1]
+        # Inputs added by the rule spec without a configured step get ~100 cells
+        step = self.grid_steps.get(variable) or (high - low) / 100 or 1.0
+        regular = np.arange(low, high + step / 2, step)
+        return np.unique(np.clip(np.concatenate([regular, breakpoints, kinks]), low, high).astype(float))
+
+    def _evaluate_grid(self, points: Dict[str, np.ndarray]) -> np.ndarray:
+        """Exact rule outputs for every emotion x point; returns (n_emotions, n_points, n_actions)"""
+        n_points = len(next(iter(points.values()))) if points else 1
+        shape = (len(self.emotions) * n_points,)
+        emotion = np.repeat(np.array(self.emotions), n_points)
+        fuzzified = {'emotion': self._fuzzify_emotion_array(emotion)}
+        for variable in self.rule_base.membership_functions:
+            values = np.tile(points[variable], len(self.emotions)) if variable in points else np.zeros(shape)
+            fuzzified[variable] = self._fuzzify_array(variable, values)
+        rule_outputs = self._apply_rules_array(fuzzified, shape)
+        stacked = np.stack([rule_outputs[action] for action in self.actions], axis=-1)
+        return stacked.reshape(len(self.emotions), n_points, len(self.actions))
+
+    def _compile(self):
+        # Only inputs the rule base actually references become table axes
+        used = {variable for rule in self.rules for variable, _ in rule['antecedents']}
+        self.axes: List[str] = [variable for variable in self.rule_base.membership_functions if variable in used]
+        self.grids = {variable: self._build_grid(variable) for variable in self.axes}
+        self.domain = {variable: (grid[0], grid[-1]) for variable, grid in self.grids.items()}
+        self._domain_bounds = [(float(low), float(high)) for low, high in (self.domain[a] for a in self.axes)]
+        # Position of each axis in evaluate_rule_outputs' continuous inputs
+        self._axis_inputs = [INPUTS.index(a) for a in self.axes]
+
+        mesh = np.meshgrid(*[self.grids[a] for a in self.axes], indexing='ij')
+        points = {a: m.ravel() for a, m in zip(self.axes, mesh)}
+        table = self._evaluate_grid(points)
+        self.table = table.reshape(len(self.emotions), *[len(self.grids[a]) for a in self.axes], len(self.actions))
+
+        # Plain-Python copies for the per-call lookup: grids as lists for bisect, the table
+        # as one flat list of action tuples addressed by strides
+        self._grid_lists = [self.grids[a].tolist() for a in self.axes]
+        sizes = [len(grid) for grid in self._grid_lists]
+        self._strides = [int(np.prod(sizes[axis + 1:])) for axis in range(len(sizes))]
+        self._emotion_stride = int(np.prod(sizes))
+        self._cells = [tuple(row) for row in self.table.reshape(-1, len(self.actions)).tolist()]
+        self._corners = [
+            (sum(stride for stride, upper in zip(self._strides, bits) if upper), bits)
+            for bits in product((0, 1), repeat=len(self.axes))
+        ]
+
+        # Measure the interpolation error at cell midpoints, for the lookups the table serves
+        midpoints = [(g[:-1] + g[1:]) / 2 for g in (self.grids[a] for a in self.axes)]
+        mesh = np.meshgrid(*midpoints, indexing='ij')
+        points = {a: m.ravel() for a, m in zip(self.axes, mesh)}
+        exact = self._evaluate_grid(points)
+        coords = np.stack([points[a] for a in self.axes], axis=-1) if self.axes else np.zeros((1, 0))
+        worst = 0.0
+        for emotion_idx in range(len(self.emotions)):
+            approx = np.round(self._interpolate(emotion_idx, coords), 3)
+            served = approx.sum(axis=-1) >= self.exact_below
+            if served.any():
+                deviation = np.abs(self._defuzzify_array(approx) - self._defuzzify_array(exact[emotion_idx]))
+                worst = max(worst, float(np.max(deviation[served])))
+        self.error_bound = worst
+
+    # --- Lookup ---
+    def _bilinear(self, emotion_idx: int, x: float, y: float) -> List[float]:
+        """_lookup for the two-axis table of the shipped rule spec, unrolled"""
+        grid_x, grid_y = self._grid_lists
+        i = min(bisect_right(grid_x, x) - 1, len(grid_x) - 2)
+        j = min(bisect_right(grid_y, y) - 1, len(grid_y) - 2)
+        fx = (x - grid_x[i]) / (grid_x[i + 1] - grid_x[i])
+        fy = (y - grid_y[j]) / (grid_y[j + 1] - grid_y[j])
+        stride = self._strides[0]
+        base = emotion_idx * self._emotion_stride + i * stride + j
+        cells = self._cells
+        w00, w01, w10, w11 = (1 - fx) * (1 - fy), (1 - fx) * fy, fx * (1 - fy), fx * fy
+        return [
+            w00 * c00 + w01 * c01 + w10 * c10 + w11 * c11
+            for c00, c01, c10, c11 in zip(cells[base], cells[base + 1], cells[base + stride], cells[base + stride + 1])
+        ]
+
+    def _lookup(self, emotion_idx: int, values: Sequence[float]) -> List[float]:
+        """Multilinear interpolation of one in-domain point (one value per axis); returns a strength per action"""
+        if len(values) == 2:
+            return self._bilinear(emotion_idx, *values)
+        base = emotion_idx * self._emotion_stride
+        fracs = []
+        for grid, stride, x in zip(self._grid_lists, self._strides, values):
+            i = min(bisect_right(grid, x) - 1, len(grid) - 2)
+            base += i * stride
+            fracs.append((x - grid[i]) / (grid[i + 1] - grid[i]))
+
+        result = [0.0] * len(self.actions)
+        for offset, bits in self._corners:
+            weight = 1.0
+            for frac, upper in zip(fracs, bits):
+                weight *= frac if upper else 1.0 - frac
+            if weight:
+                result = [r + weight * v for r, v in zip(result, self._cells[base + offset])]
+        return result
+
+    def _interpolate(self, emotion_idx: int, coords: np.ndarray) -> np.ndarray:
+        """Vectorized twin of _lookup for compile-time checks; coords is (n, n_axes), returns (n, n_actions)"""
+        table = self.table[emotion_idx]
+        lower, frac = [], []
+        for axis, variable in enumerate(self.axes):
+            grid = self.grids[variable]
+            idx = np.clip(np.searchsorted(grid, coords[:, axis], side='right') - 1, 0, len(grid) - 2)
+            lower.append(idx)
+            frac.append((coords[:, axis] - grid[idx]) / (grid[idx + 1] - grid[idx]))
+
+        result = np.zeros((coords.shape[0], len(self.actions)))
+        for corner in range(2 ** len(self.axes)):
+            weight = np.ones(coords.shape[0])
+            index = []
+            for axis in range(len(self.axes)):
+                upper = (corner >> axis) & 1
+                weight = weight * (frac[axis] if upper else 1.0 - frac[axis])
+                index.append(lower[axis] + upper)
+            result += weight[:, None] * table[tuple(index)]
+        return result
+
+    def _defuzzify_array(self, outputs: np.ndarray) -> np.ndarray:
+        centers = self.rule_base.centers
+        strengths = np.where(outputs > 0, outputs, 0.0)
+        denominator = strengths.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator == 0, 0.0, (strengths * centers).sum(axis=-1) / denominator)
+
+    def in_domain(self, **inputs: float) -> bool:
+        return all(self.domain[v][0] <= inputs[v] <= self.domain[v][1] for v in self.axes)
+
+    def evaluate_rule_outputs(self, screen_time: float, accuracy: float, response_time: float,
+                              emotion: str, hints_used: int) -> Dict[str, float]:
+        """Table lookup when enabled, in-domain and clearly activated, exact rule pass otherwise"""
+        if self.enabled:
+            inputs = (screen_time, accuracy, response_time, hints_used)
+            values = [inputs[k] for k in self._axis_inputs]
+            if all(low <= x <= high for (low, high), x in zip(self._domain_bounds, values)):
+                emotion_idx = self._emotion_index.get(emotion, self._default_emotion_idx)
+                outputs = [round(value, 3) for value in self._lookup(emotion_idx, values)]
+                if sum(outputs) >= self.exact_below:
+                    return dict(zip(self.actions, outputs))
+        return super().evaluate_rule_outputs(screen_time, accuracy, response_time, emotion, hints_used)
@@ -1,225 +1,110 @@
 
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence, Union
+
+from app.core.logger import get_logger, should_trace
+from app.services.fuzzy_rulebase import RuleBase, rules_path
+from app.services.intervention_rules import HINT_EMOTIONS, VISUAL_EMOTIONS, intervention_engine
+
+logger = get_logger(__name__)
+
+# Expert system layer emotion groups (the intervention rules live in intervention_rules.py)
+STRESS_EMOTIONS = ["fear", "disgust"]
+
+# A session's proficiency (decimal level) accumulates every adjustment within these bounds;
+# its integer part is the level served
+PROFICIENCY_MIN = 1.0
+PROFICIENCY_MAX = 5.9
+
+ArrayLike = Union[Sequence, np.ndarray]
+
+
+def accumulate_proficiency(proficiency: float, adjustment: float,
+                           low: float = PROFICIENCY_MIN, high: float = PROFICIENCY_MAX) -> float:
+    """Proficiency after one answer (submit_answer, and the offline replay in services/replay.py)"""
+    return max(low, min(high, proficiency + adjustment))
+
 
 class FuzzyAdaptiveSystem:
-    def __init__(self):
-        self.rules = self._initialize_rules()
-        print("Fuzzy Adaptive System initialized")
+    """
+    Mamdani fuzzy controller for the difficulty level.
+    Membership functions, rules and output centres come from the rule spec
+    (FUZZY_RULES_PATH, see services/fuzzy_rulebase.py); a system is bound to one
+    compiled RuleBase for its lifetime.
+    """
+
+    def __init__(self, rule_base: Optional[RuleBase] = None):
+        self.rule_base = rule_base or RuleBase.from_file(rules_path())
+        logger.info("Fuzzy Adaptive System initialized", extra={
+            "rules": len(self.rules), "revision": self.rule_base.revision
+        })
+
+    @property
+    def rules(self) -> List[Dict]:
+        return self.rule_base.rules
     
     # 1. FUZZIFICATION FUNCTIONS
+    def _fuzzify(self, variable: str, x: float) -> Dict[str, float]:
+        """Fuzzify a crisp value against the rule base's membership table"""
+        result = {}
+        for term, (kind, params) in self.rule_base.membership_functions[variable].items():
+            value = self._trapmf(x, *params) if kind == 'trap' else self._trimf(x, *params)
+            result[term] = round(value, 3)
+        return result
+
     def fuzzify_screen_time(self, seconds: float) -> Dict[str, float]:
         """Fuzzify screen reading time"""
-        short = self._trapmf(seconds, 0, 0, 20, 40)
-        normal = self._trimf(seconds, 20, 50, 80)
-        long = self._trapmf(seconds, 60, 90, 300, 300)
-        
-        return {
-            'short': round(short, 3),
-            'normal': round(normal, 3),
-            'long': round(long, 3)
-        }
+        return self._fuzzify('screen_time', seconds)
     
     def fuzzify_accuracy(self, score: float) -> Dict[str, float]:
         """Fuzzify accuracy score (0-1)"""
-        low = self._trapmf(score, 0, 0, 0.3, 0.5)
-        medium = self._trimf(score, 0.3, 0.6, 0.8)
-        high = self._trapmf(score, 0.7, 0.9, 1, 1)
-        
-        return {
-            'low': round(low, 3),
-            'medium': round(medium, 3),
-            'high': round(high, 3)
-        }
+        return self._fuzzify('accuracy', score)
     
     def fuzzify_response_time(self, seconds: float) -> Dict[str, float]:
         """Fuzzify response time for questions"""
-        fast = self._trapmf(seconds, 0, 0, 15, 25)
-        medium = self._trimf(seconds, 15, 35, 55)
-        slow = self._trapmf(seconds, 45, 65, 120, 120)
-        
-        return {
-            'fast': round(fast, 3),
-            'medium': round(medium, 3),
-            'slow': round(slow, 3)
-        }
+        return self._fuzzify('response_time', seconds)
     
     def fuzzify_emotion(self, emotion: str) -> Dict[str, float]:
         """Fuzzify emotion state"""
-        emotion_values = {
-            'frustrated': {'negative': 0.9, 'neutral': 0.1, 'positive': 0.0},
-            'anxious': {'negative': 0.8, 'neutral': 0.2, 'positive': 0.0}, # New mapped key
-            'fear': {'negative': 0.8, 'neutral': 0.2, 'positive': 0.0},
-            'confused': {'negative': 0.7, 'neutral': 0.3, 'positive': 0.0}, # New mapped key
-            'confuse': {'negative': 0.7, 'neutral': 0.3, 'positive': 0.0},
-            'bored': {'negative': 0.2, 'neutral': 0.7, 'positive': 0.1}, # New mapped key
-            'neutral': {'negative': 0.1, 'neutral': 0.8, 'positive': 0.1},
-            'surprise': {'negative': 0.1, 'neutral': 0.3, 'positive': 0.6},
-            'happy': {'negative': 0.0, 'neutral': 0.2, 'positive': 0.8}
-        }
-        return emotion_values.get(emotion, emotion_values['neutral'])
+        membership = self.rule_base.emotion_membership
+        return membership.get(emotion, membership[self.rule_base.default_emotion])
     
     def fuzzify_hints_used(self, count: int) -> Dict[str, float]:
         """Fuzzify number of hints used"""
-        few = self._trapmf(count, 0, 0, 1, 2)
-        some = self._trimf(count, 1, 2, 3)
-        many = self._trapmf(count, 2, 3, 5, 5)
-        
-        return {
-            'few': round(few, 3),
-            'some': round(some, 3),
-            'many': round(many, 3)
-        }
+        return self._fuzzify('hints', count)
     
-    # 2. FUZZY RULES
-    def _initialize_rules(self) -> List[Dict]:
-        """Initialize fuzzy inference rules"""
-        # EMOTION-FIRST FUZZY RULES
-        # Emotion is PRIMARY, Correctness & Speed are AMPLIFIERS
-        
-        return [
-            # === POSITIVE EMOTION (Happy) ===
-            # Happy + Correct + Fast = Maximum boost
-            {
-                'name': 'happy_correct_fast',
-                'conditions': lambda f: min(
-                    f['emotion']['positive'],   # Happy (REQUIRED)
-                    f['accuracy']['high'],      # Correct
-                    f['response_time']['fast']  # Fast
-                ),
-                'action': 'increase_much',  # +2 levels
-                'weight': 1.0  # Highest priority
-            },
-            # Happy + Correct + Medium/Slow = Good boost
-            {
-                'name': 'happy_correct',
-                'conditions': lambda f: min(
-                    f['emotion']['positive'],   # Happy (REQUIRED)
-                    f['accuracy']['high']       # Correct
-                ),
-                'action': 'increase',  # +1 level
-                'weight': 0.9
-            },
-            # Happy + Wrong = Stay (enjoying learning, but wrong answer)
-            {
-                'name': 'happy_wrong',
-                'conditions': lambda f: min(
-                    f['emotion']['positive'],   # Happy (REQUIRED)
-                    f['accuracy']['low']        # Wrong answer
-                ),
-                'action': 'stay',  # 0 (maintain level - happy but wrong)
-                'weight': 0.6
-            },
-            
-            # === NEUTRAL EMOTION ===
-            # Neutral + Correct + Fast = Small boost
-            {
-                'name': 'neutral_correct_fast',
-                'conditions': lambda f: min(
-                    f['emotion']['neutral'],    # Neutral (REQUIRED)
-                    f['accuracy']['high'],      # Correct
-                    f['response_time']['fast']  # Fast
-                ),
-                'action': 'slight_increase',  # +0.5 level
-                'weight': 0.7
-            },
-            # Neutral + Correct = Stay (focused but not excited)
-            {
-                'name': 'neutral_correct',
-                'conditions': lambda f: min(
-                    f['emotion']['neutral'],    # Neutral (REQUIRED)
-                    f['accuracy']['high']       # Correct
-                ),
-                'action': 'stay',  # 0 (maintain level)
-                'weight': 0.6
-            },
-            # Neutral + Wrong = Slight decrease
-            {
-                'name': 'neutral_wrong',
-                'conditions': lambda f: min(
-                    f['emotion']['neutral'],    # Neutral (REQUIRED)
-                    f['accuracy']['low']        # Wrong answer
-                ),
-                'action': 'slight_decrease',  # -0.5 level
-                'weight': 0.7
-            },
-            
-            # === NEGATIVE EMOTION (Fear, Disgust, Angry, Sad) ===
-            # Negative + Wrong = Maximum penalty
-            {
-                'name': 'negative_wrong',
-                'conditions': lambda f: min(
-                    f['emotion']['negative'],   # Negative (REQUIRED)
-                    f['accuracy']['low']        # Wrong answer
-                ),
-                'action': 'decrease_much',  # -2 levels
-                'weight': 1.0  # Highest priority
-            },
-            # Negative + Correct + Fast = Still decrease (stressed)
-            {
-                'name': 'negative_correct_fast',
-                'conditions': lambda f: min(
-                    f['emotion']['negative'],   # Negative (REQUIRED)
-                    f['accuracy']['high'],      # Correct but stressed
-                    f['response_time']['fast']  # Fast
-                ),
-                'action': 'slight_decrease',  # -0.5 level
-                'weight': 0.8
-            },
-            # Negative + Correct + Slow = Slight boost (at least correct!)
-            {
-                'name': 'negative_correct_slow',
-                'conditions': lambda f: min(
-                    f['emotion']['negative'],   # Negative (REQUIRED)
-                    f['accuracy']['high'],      # Correct - deserves reward
-                    f['response_time']['slow']  # Slow = thinking hard
-                ),
-                'action': 'slight_increase',  # +0.5 level (at least correct!)
-                'weight': 0.7
-            }
-        ]
-    
-    # 3. FUZZY INFERENCE
+    # 2-3. FUZZY RULES AND INFERENCE
     def apply_rules(self, fuzzified_inputs: Dict) -> Dict[str, float]:
-        """Apply fuzzy rules using Mamdani inference"""
-        rule_outputs = {
-            'decrease_much': 0.0,
-            'decrease': 0.0,
-            'slight_decrease': 0.0,
-            'stay': 0.0,
-            'slight_increase': 0.0,
-            'increase': 0.0,
-            'increase_much': 0.0
-        }
-        
-        print(f"\n=== FUZZY RULES EVALUATION ===")
-        for rule in self.rules:
-            strength = rule['conditions'](fuzzified_inputs)
-            weighted_strength = strength * rule['weight']
-            
-            if weighted_strength > 0.01:  # Only log significant activations
-                print(f"Rule '{rule['name']}': strength={strength:.3f}, weighted={weighted_strength:.3f}, action={rule['action']}")
-            
-            if weighted_strength > rule_outputs[rule['action']]:
-                rule_outputs[rule['action']] = round(weighted_strength, 3)
+        """Apply fuzzy rules using Mamdani inference (min over antecedents, max per action)"""
+        rule_base = self.rule_base
+        outputs = rule_base.evaluate_one(fuzzified_inputs)
+        rule_outputs = {action: round(value, 3) for action, value in zip(rule_base.actions, outputs)}
         
-        print(f"Final rule outputs: {rule_outputs}")
-        print(f"==============================\n")
+        # Rule activation traces are sampled debug records (see LOG_TRACE_SAMPLE_RATE)
+        if should_trace(logger):
+            activations = []
+            for rule, strength in zip(rule_base.rules, rule_base.strengths_one(fuzzified_inputs)):
+                weighted_strength = strength * rule['weight']
+                if weighted_strength > 0.01:  # Only log significant activations
+                    activations.append({
+                        'rule': rule['name'],
+                        'strength': round(strength, 3),
+                        'weighted': round(weighted_strength, 3),
+                        'action': rule['action']
+                    })
+            logger.debug("fuzzy rule trace", extra={
+                'fuzzified': fuzzified_inputs,
+                'activations': activations,
+                'rule_outputs': rule_outputs,
+                'revision': rule_base.revision
+            })
         
         return rule_outputs
     
     # 4. DEFUZZIFICATION
     def defuzzify(self, rule_outputs: Dict[str, float]) -> float:
         """Defuzzify using Center of Gravity method"""
-        centers = {
-            'decrease_much': -2.0,
-            'decrease': -1.0,
-            'slight_decrease': -0.5,
-            'stay': 0.0,
-            'slight_increase': 0.5,
-            'increase': 1.0,
-            'increase_much': 2.0
-        }
+        centers = self.rule_base.action_centers
         
         numerator = 0.0
         denominator = 0.0
@@ -250,9 +135,9 @@ class FuzzyAdaptiveSystem:
         elif c < x <= d: return (d - x) / (d - c) if d > c else 1.0
         return 0.0
 
-    def process_feedback(self, screen_time: float, accuracy: float, response_time: float, 
-                        emotion: str, hints_used: int, current_level: int) -> Dict:
-        """Main entry point for processing student feedback"""
+    def evaluate_rule_outputs(self, screen_time: float, accuracy: float, response_time: float,
+                              emotion: str, hints_used: int) -> Dict[str, float]:
+        """Fuzzify the crisp inputs and run the rule base (steps 1-3)"""
         fuzzified = {
             'screen_time': self.fuzzify_screen_time(screen_time),
             'accuracy': self.fuzzify_accuracy(accuracy),
@@ -261,13 +146,12 @@ class FuzzyAdaptiveSystem:
             'hints': self.fuzzify_hints_used(hints_used)
         }
         
-        print(f"\n=== FUZZIFIED VALUES ===")
-        print(f"Accuracy ({accuracy:.2f}): {fuzzified['accuracy']}")
-        print(f"Response Time ({response_time:.2f}s): {fuzzified['response_time']}")
-        print(f"Emotion ({emotion}): {fuzzified['emotion']}")
-        print(f"========================\n")
-        
-        rule_outputs = self.apply_rules(fuzzified)
+        return self.apply_rules(fuzzified)
+
+    def process_feedback(self, screen_time: float, accuracy: float, response_time: float, 
+                        emotion: str, hints_used: int, current_level: int) -> Dict:
+        """Main entry point for processing student feedback"""
+        rule_outputs = self.evaluate_rule_outputs(screen_time, accuracy, response_time, emotion, hints_used)
         adjustment = self.defuzzify(rule_outputs)
         
         
@@ -279,21 +163,12 @@ class FuzzyAdaptiveSystem:
         
         # --- GeoMorph Specific Intervention Rules (Expert System Layer) ---
         # Updated to work with raw FER+ emotions
-        intervention = "none"
-        
-        # Rule 1: IF (Any Negative Emotion) AND Screen Time Long (>10s) -> Hint
-        # All negative emotions indicate struggle/confusion - show hint to help
-        if (emotion in ["anger", "fear", "disgust", "frustrated", "anxious", "confused"]) and screen_time > 10:
-            intervention = "show_hint"
-            
-        # Rule 2: IF (Neutral/Sad) AND Screen Time Long (>40s) -> Change Visual
-        # Neutral/Sad for too long = Bored
-        elif (emotion in ["sad"]) and screen_time > 10:
-            intervention = "change_visual"
+        # Rules 1-2: hint / visual change (see intervention_rules.py)
+        intervention, _ = intervention_engine.evaluate(emotion, screen_time)
             
         # Rule 3: IF (Fear/Disgust) -> Decrease Difficulty
         # Fear/Disgust = Anxious/Stressed
-        elif emotion in ["fear", "disgust"]:
+        if intervention == "none" and emotion in STRESS_EMOTIONS:
              # Force at least a slight decrease if not already decreasing
              if adjustment >= 0:
                  adjustment = -0.5
@@ -310,7 +185,8 @@ class FuzzyAdaptiveSystem:
         #      print(f"FLOW STATE TRIGGERED! Emotion: {emotion}, Time: {screen_time}s, Accuracy: {accuracy}, Level: {current_level} -> {new_level}")
 
 
-        print(f"Fuzzy Result: Emotion={emotion}, Time={screen_time}s, Acc={accuracy}, Level {current_level} -> {new_level} (adj={adjustment})")
+        logger.debug("Fuzzy result: emotion=%s time=%ss acc=%s level %s -> %s (adj=%s)",
+                     emotion, screen_time, accuracy, current_level, new_level, adjustment)
 
         return {
             'current_level': current_level,
@@ -321,3 +197,123 @@ class FuzzyAdaptiveSystem:
             'intervention': intervention, # New Output
             'fuzzy_outputs': rule_outputs
         }
+
+    # 5. BATCH INFERENCE
+    # Vectorized twin of process_feedback for offline replay / simulations.
+    # Uses the same rule base and rounding so every row matches the scalar path.
+    @staticmethod
+    def _round3(values: np.ndarray) -> np.ndarray:
+        """round(x, 3) with Python semantics (np.round can differ on exact .0005 ties)"""
+        rounded = np.round(values, 3)
+        scaled = values * 1000.0
+        ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6  # floor instead of %, which is much slower
+        if ties.any():
+            rounded[ties] = [round(float(v), 3) for v in values[ties]]
+        return rounded
+
+    @staticmethod
+    def _trimf_array(x: np.ndarray, a: float, b: float, c: float) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.select(
+                [(x <= a) | (x >= c), (a < x) & (x <= b), (b < x) & (x < c)],
+                [0.0, (x - a) / (b - a), (c - x) / (c - b)],
+                default=0.0
+            )
+
+    @staticmethod
+    def _trapmf_array(x: np.ndarray, a: float, b: float, c: float, d: float) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rising = (x - a) / (b - a) if b > a else np.ones_like(x)
+            falling = (d - x) / (d - c) if d > c else np.ones_like(x)
+            return np.select(
+                [(x < a) | (x > d), (a <= x) & (x < b), (b <= x) & (x <= c), (c < x) & (x <= d)],
+                [0.0, rising, 1.0, falling],
+                default=0.0
+            )
+
+    def _fuzzify_array(self, variable: str, x: np.ndarray) -> Dict[str, np.ndarray]:
+        result = {}
+        for term, (kind, params) in self.rule_base.membership_functions[variable].items():
+            if kind == 'trap':
+                value = self._trapmf_array(x, *params)
+            else:
+                value = self._trimf_array(x, *params)
+            result[term] = self._round3(value)
+        return result
+
+    def _fuzzify_emotion_array(self, emotions: np.ndarray) -> Dict[str, np.ndarray]:
+        labels, inverse = np.unique(emotions, return_inverse=True)
+        table = [self.fuzzify_emotion(str(label)) for label in labels]
+        return {
+            term: np.array([row[term] for row in table], dtype=float)[inverse]
+            for term in self.rule_base.emotion_membership[self.rule_base.default_emotion]
+        }
+
+    def _apply_rules_array(self, fuzzified: Dict[str, Dict[str, np.ndarray]], shape: tuple) -> Dict[str, np.ndarray]:
+        """Rule evaluation: same min/max-aggregation and rounding as apply_rules"""
+        rule_base = self.rule_base
+        outputs = self._round3(rule_base.evaluate(rule_base.memberships(fuzzified)))
+        return {action: outputs[k].reshape(shape) for k, action in enumerate(rule_base.actions)}
+
+    def process_feedback_batch(self, screen_time: ArrayLike, accuracy: ArrayLike,
+                               response_time: ArrayLike, emotion: ArrayLike,
+                               hints_used: ArrayLike, current_level: ArrayLike) -> Dict:
+        """
+        Batch entry point: evaluates N students at once.
+        All inputs are broadcast to a common 1-D shape; returns a dict of arrays
+        with the same keys as process_feedback (fuzzy_outputs maps action -> array).
+        """
+        screen_time, accuracy, response_time, emotion, hints_used, current_level = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(screen_time, dtype=float)),
+            np.atleast_1d(np.asarray(accuracy, dtype=float)),
+            np.atleast_1d(np.asarray(response_time, dtype=float)),
+            np.atleast_1d(np.asarray(emotion, dtype=str)),
+            np.atleast_1d(np.asarray(hints_used, dtype=float)),
+            np.atleast_1d(np.asarray(current_level, dtype=int)),
+        )
+
+        fuzzified = {
+            'screen_time': self._fuzzify_array('screen_time', screen_time),
+            'accuracy': self._fuzzify_array('accuracy', accuracy),
+            'response_time': self._fuzzify_array('response_time', response_time),
+            'emotion': self._fuzzify_emotion_array(emotion),
+            'hints': self._fuzzify_array('hints', hints_used)
+        }
+
+        rule_outputs = self._apply_rules_array(fuzzified, screen_time.shape)
+
+        # Center of Gravity defuzzification
+        numerator = np.zeros(screen_time.shape)
+        denominator = np.zeros(screen_time.shape)
+        centers = self.rule_base.action_centers
+        for action, strength in rule_outputs.items():
+            active = strength > 0
+            numerator = np.where(active, numerator + strength * centers[action], numerator)
+            denominator = np.where(active, denominator + strength, denominator)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            adjustment = np.where(denominator == 0, 0.0, self._round3(numerator / denominator))
+
+        new_level = np.clip(np.rint(current_level + adjustment), 1, 5).astype(int)
+
+        actions = self.rule_base.actions
+        stacked = np.stack([rule_outputs[action] for action in actions])
+        best = np.argmax(stacked, axis=0)
+        action = np.array(actions)[best]
+        confidence = np.take_along_axis(stacked, best[None, :], axis=0)[0]
+
+        # Expert system layer (same precedence as process_feedback)
+        intervention = intervention_engine.evaluate_batch(emotion, screen_time)
+
+        force_decrease = (intervention == "none") & np.isin(emotion, STRESS_EMOTIONS) & (adjustment >= 0)
+        adjustment = np.where(force_decrease, -0.5, adjustment)
+        new_level = np.where(force_decrease, np.maximum(1, current_level - 1), new_level)
+
+        return {
+            'current_level': current_level,
+            'new_level': new_level,
+            'adjustment': adjustment,
+            'action': action,
+            'confidence': confidence,
+            'intervention': intervention,
+            'fuzzy_outputs': rule_outputs
+        }
@@ -0,0 +1,193 @@
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.data_files import data_path, source_signature
+
+SPEC_VERSION = 1  # Format version of the rule spec files this module reads
+MEMBERSHIP_KINDS = {'tri': 3, 'trap': 4}  # Membership function kind -> number of breakpoints
+
+
+def _check(condition: bool, message: str):
+    if not condition:
+        raise ValueError(f"Invalid fuzzy rule spec: {message}")
+
+
+def validate_rule_spec(spec: Dict):
+    """Raise ValueError on anything the rule base could not be compiled from"""
+    _check(spec.get("version") == SPEC_VERSION, f"version must be {SPEC_VERSION}, got {spec.get('version')!r}")
+
+    membership_functions = spec.get("membership_functions")
+    _check(isinstance(membership_functions, dict) and bool(membership_functions), "membership_functions is empty")
+    _check("emotion" not in membership_functions, "'emotion' is defined by emotion_membership")
+    for variable, terms in membership_functions.items():
+        _check(isinstance(terms, dict) and bool(terms), f"{variable} has no terms")
+        for term, (kind, params) in terms.items():
+            _check(kind in MEMBERSHIP_KINDS, f"{variable}.{term}: unknown kind {kind!r}")
+            _check(len(params) == MEMBERSHIP_KINDS[kind], f"{variable}.{term}: {kind} takes {MEMBERSHIP_KINDS[kind]} breakpoints")
+            _check(list(params) == sorted(params), f"{variable}.{term}: breakpoints must be non-decreasing")
+
+    emotions = spec.get("emotion_membership")
+    _check(isinstance(emotions, dict) and bool(emotions), "emotion_membership is empty")
+    emotion_terms = list(next(iter(emotions.values())))
+    for emotion, degrees in emotions.items():
+        _check(list(degrees) == emotion_terms, f"emotion {emotion} must define the terms {emotion_terms}")
+        _check(all(0.0 <= v <= 1.0 for v in degrees.values()), f"emotion {emotion}: degrees must be in [0, 1]")
+    _check(spec.get("default_emotion", "neutral") in emotions, "default_emotion is not in emotion_membership")
+
+    actions = spec.get("action_centers")
+    _check(isinstance(actions, dict) and bool(actions), "action_centers is empty")
+
+    rules = spec.get("rules")
+    _check(isinstance(rules, list) and bool(rules), "rules is empty")
+    names = set()
+    for rule in rules:
+        name = rule.get("name")
+        _check(bool(name) and name not in names, f"rule names must be unique and non-empty ({name!r})")
+        names.add(name)
+        _check(bool(rule.get("antecedents")), f"rule {name} has no antecedents")
+        for variable, term in rule["antecedents"]:
+            known = emotion_terms if variable == "emotion" else membership_functions.get(variable, {})
+            _check(term in known, f"rule {name}: unknown term {variable}.{term}")
+        _check(rule.get("action") in actions, f"rule {name}: unknown action {rule.get('action')!r}")
+        _check(0.0 <= rule.get("weight", 1.0) <= 1.0, f"rule {name}: weight must be in [0, 1]")
+
+
+class RuleBase:
+    """
+    Fuzzy rule base compiled from a declarative spec (app/data/fuzzy_rules.json).
+
+    Every fuzzy term of every input, emotion included, gets a slot in one membership
+    vector, plus a trailing constant 1.0 slot (`memberships`). The rules then flatten into arrays:
+      - `antecedents`: (rules, max antecedents) term indices, short rules padded with the 1.0 slot
+      - `weights`: rule weights
+      - `centers`: output singleton per action
+    with the rules sorted by action, so that `evaluate` over a batch is a row gather + min
+    per antecedent column, a multiply by the weights and a max per action
+    (np.maximum.reduceat). Memberships are term-major, (terms + 1, N), so every gather
+    copies contiguous rows. `evaluate_one` walks the same tables for a single input.
+
+    Instances are immutable: a new spec means a new RuleBase, swapped in whole.
+    """
+
+    def __init__(self, spec: Dict, signature: str = ""):
+        validate_rule_spec(spec)
+        self.version = spec["version"]
+        self.revision = str(spec.get("revision", ""))
+        self.signature = signature
+        self.membership_functions: Dict[str, Dict[str, Tuple[str, tuple]]] = {
+            variable: {term: (kind, tuple(float(p) for p in params)) for term, (kind, params) in terms.items()}
+            for variable, terms in spec["membership_functions"].items()
+        }
+        self.emotion_membership: Dict[str, Dict[str, float]] = {
+            emotion: {term: float(v) for term, v in degrees.items()}
+            for emotion, degrees in spec["emotion_membership"].items()
+        }
+        self.default_emotion = spec.get("default_emotion", "neutral")
+        self.action_centers: Dict[str, float] = {a: float(c) for a, c in spec["action_centers"].items()}
+        self.rules: List[Dict] = [
+            {
+                'name': rule["name"],
+                'description': rule.get("description", ""),
+                'antecedents': [tuple(a) for a in rule["antecedents"]],
+                'action': rule["action"],
+                'weight': float(rule.get("weight", 1.0)),
+            }
+            for rule in spec["rules"]
+        ]
+
+        # Membership vector layout: (variable, term) -> slot
+        terms = [(variable, term) for variable, fns in self.membership_functions.items() for term in fns]
+        terms += [('emotion', term) for term in self.emotion_membership[self.default_emotion]]
+        self.terms: List[Tuple[str, str]] = terms
+        self.term_index = {key: i for i, key in enumerate(terms)}
+        self.one = len(terms)  # Constant 1.0 slot (neutral element of min)
+
+        self.actions = list(self.action_centers)
+        self.centers = np.array([self.action_centers[a] for a in self.actions])
+        action_index = {a: i for i, a in enumerate(self.actions)}
+        order = sorted(range(len(self.rules)), key=lambda i: action_index[self.rules[i]['action']])
+        self.rule_order = order  # Array position -> index into self.rules
+        width = max(len(rule['antecedents']) for rule in self.rules)
+        self.antecedents = np.full((len(order), width), self.one, dtype=np.intp)
+        for row, i in enumerate(order):
+            for col, key in enumerate(self.rules[i]['antecedents']):
+                self.antecedents[row, col] = self.term_index[key]
+        self.weights = np.array([self.rules[i]['weight'] for i in order])
+        rule_actions = np.array([action_index[self.rules[i]['action']] for i in order])
+        # First rule of every action that has rules, for the per-action max
+        self._present, self._starts = np.unique(rule_actions, return_index=True)
+        # The same tables as Python tuples, for single inputs
+        self._flat_rules = [
+            (tuple(int(t) for t in row if t != self.one), float(weight), int(action))
+            for row, weight, action in zip(self.antecedents, self.weights, rule_actions)
+        ]
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleBase":
+        signature = source_signature(path)
+        with open(path, "r") as f:
+            return cls(json.load(f), signature=signature)
+
+    def is_stale(self, path: str) -> bool:
+        """Whether the spec file changed since this rule base was loaded"""
+        try:
+            return self.signature != source_signature(path)
+        except FileNotFoundError:
+            return False
+
+    def memberships(self, fuzzified: Dict[str, Dict]) -> np.ndarray:
+        """
+        Term-major membership matrix (terms + 1, N) from {variable: {term: degree array}},
+        the last row being the constant 1.0 slot.
+        """
+        columns = [np.asarray(fuzzified[variable][term], dtype=float) for variable, term in self.terms]
+        return np.stack(columns + [np.ones(columns[0].shape)])
+
+    def strengths(self, memberships: np.ndarray) -> np.ndarray:
+        """Firing strength (min over antecedents, unweighted) of every rule, in `rule_order`: (rules, N)"""
+        strengths = memberships[self.antecedents[:, 0]]
+        for j in range(1, self.antecedents.shape[1]):
+            np.minimum(strengths, memberships[self.antecedents[:, j]], out=strengths)
+        return strengths
+
+    def evaluate(self, memberships: np.ndarray) -> np.ndarray:
+        """Max-aggregated (unrounded) output strength per action: (terms + 1, N) -> (actions, N)"""
+        weighted = self.strengths(memberships) * self.weights[:, None]
+        outputs = np.zeros((len(self.actions),) + weighted.shape[1:])
+        outputs[self._present] = np.maximum(np.maximum.reduceat(weighted, self._starts, axis=0), 0.0)
+        return outputs
+
+    def evaluate_one(self, fuzzified: Dict[str, Dict[str, float]]) -> List[float]:
+        """
+        `evaluate` for a single input. Same flat tables, walked in plain Python:
+        with a handful of rules that is cheaper than numpy's per-call overhead.
+        """
+        memberships = [fuzzified[variable][term] for variable, term in self.terms]
+        memberships.append(1.0)
+        outputs = [0.0] * len(self.actions)
+        for indices, weight, action in self._flat_rules:
+            weighted = min([memberships[i] for i in indices]) * weight
+            if weighted > outputs[action]:
+                outputs[action] = weighted
+        return outputs
+
+    def strengths_one(self, fuzzified: Dict[str, Dict[str, float]]) -> List[float]:
+        """Unweighted firing strength of every rule, in spec order (for traces)"""
+        return [min(fuzzified[variable][term] for variable, term in rule['antecedents']) for rule in self.rules]
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "revision": self.revision,
+            "rules": len(self.rules),
+            "terms": len(self.terms),
+            "actions": self.actions,
+        }
+
+
+def rules_path() -> str:
+    """Spec file of this deployment (FUZZY_RULES_PATH, relative paths resolve in app/data)"""
+    return data_path(settings.FUZZY_RULES_PATH)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.services.fuzzy_compiled import CompiledFuzzyAdaptiveSystem
+from app.services.fuzzy_logic import FuzzyAdaptiveSystem
+from app.services.fuzzy_rulebase import RuleBase, rules_path
+
+logger = get_logger(__name__)
+
+
+def build_system(rule_base: RuleBase) -> FuzzyAdaptiveSystem:
+    """Fuzzy system of the configured FUZZY_ENGINE for a rule base"""
+    if settings.FUZZY_ENGINE == "compiled":
+        return CompiledFuzzyAdaptiveSystem(grid_steps=settings.FUZZY_GRID_STEPS, rule_base=rule_base)
+    return FuzzyAdaptiveSystem(rule_base)
+
+
+class FuzzyService:
+    """
+    The serving fuzzy system, rebuilt when the rule spec (FUZZY_RULES_PATH) changes.
+
+    Requests check at most every FUZZY_RULES_RELOAD_INTERVAL_SECONDS whether the spec file
+    changed. The new system (rule base, plus the lookup table for the compiled engine) is
+    built in a thread and swapped in with one assignment: requests never see a half-built
+    rule base, and a spec that fails to load keeps the current one serving.
+    """
+
+    def __init__(self):
+        self.path = rules_path()
+        self.system = build_system(RuleBase.from_file(self.path))
+        self._reload_lock = asyncio.Lock()
+        self._next_check = time.monotonic() + settings.FUZZY_RULES_RELOAD_INTERVAL_SECONDS
+        self.stats = {"reloads": 0, "failed_reloads": 0}
+
+    @property
+    def rule_base(self) -> RuleBase:
+        return self.system.rule_base
+
+    def _load(self, force: bool) -> Optional[FuzzyAdaptiveSystem]:
+        if not force and not self.rule_base.is_stale(self.path):
+            return None
+        return build_system(RuleBase.from_file(self.path))
+
+    async def reload(self, force: bool = False) -> bool:
+        """Swap in a system built from the current spec if it changed (always with `force`)"""
+        async with self._reload_lock:
+            self._next_check = time.monotonic() + settings.FUZZY_RULES_RELOAD_INTERVAL_SECONDS
+            system = await asyncio.to_thread(self._load, force)
+            if system is None:
+                return False
+            self.system = system
+            self.stats["reloads"] += 1
+            logger.info("Fuzzy rules reloaded", extra={"revision": system.rule_base.revision, "path": self.path})
+            return True
+
+    async def _maybe_reload(self):
+        if settings.FUZZY_RULES_RELOAD_INTERVAL_SECONDS <= 0 or self._reload_lock.locked():
+            return
+        if time.monotonic() < self._next_check:
+            return
+        try:
+            await self.reload()
+        except Exception as e:
+            # Keep serving the rules we have
+            self.stats["failed_reloads"] += 1
+            logger.warning("Fuzzy rules reload failed: %s", e)
+
+    async def process_feedback(self, **inputs) -> Dict:
+        """FuzzyAdaptiveSystem.process_feedback on the current rule base"""
+        await self._maybe_reload()
+        return self.system.process_feedback(**inputs)
+
+    def metrics(self) -> Dict:
+        return {"engine": settings.FUZZY_ENGINE, **self.rule_base.describe(), **self.stats}
+
+
+fuzzy_service = FuzzyService()
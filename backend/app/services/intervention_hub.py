@@ -0,0 +1,140 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+from app.core.config import settings
+from app.services.intervention_rules import intervention_engine
+
+# Events queued per connection before the slowest ones start losing events
+CONNECTION_QUEUE_SIZE = 16
+
+
+class _Watch:
+    """Intervention state of one learning session, shared by all its connections"""
+    __slots__ = ("queues", "emotion", "question_started", "paused", "last", "timer")
+
+    def __init__(self, emotion: str, now: float):
+        self.queues: Set[asyncio.Queue] = set()
+        self.emotion = emotion
+        self.question_started = now
+        self.paused = False
+        self.last = "none"
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class InterventionHub:
+    """
+    Server-pushed interventions (show_hint / change_visual) per learning session.
+
+    Instead of clients polling /monitor, the intervention rules are evaluated only when
+    something they depend on changes: the session's emotion (on_emotion), a new question
+    (start_question), or the question's screen time crossing the next threshold at which the
+    decision changes (from the intervention engine), which is an event-loop timer rather
+    than a poll. An event is pushed only when the intervention
+    changes. Idle connections cost a queue and no work, so a worker can hold thousands.
+    All of this is per process: the emotion frames of a session must reach the same worker
+    as its connection (or the client reports its emotion itself).
+    """
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._watches: Dict[str, _Watch] = {}
+        self._connections = 0
+        self.stats = {"evaluations": 0, "pushed": 0, "dropped": 0, "rejected": 0}
+
+    def watching(self, session_id) -> bool:
+        return str(session_id) in self._watches
+
+    def connect(self, session_id, emotion: str) -> Optional[asyncio.Queue]:
+        """Queue of events for a new connection, or None when the worker is at capacity"""
+        if self._connections >= self.max_connections:
+            self.stats["rejected"] += 1
+            return None
+        key = str(session_id)
+        watch = self._watches.get(key)
+        if watch is None:
+            watch = self._watches[key] = _Watch(emotion, asyncio.get_running_loop().time())
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CONNECTION_QUEUE_SIZE)
+        watch.queues.add(queue)
+        self._connections += 1
+        self._evaluate(watch)
+        return queue
+
+    def disconnect(self, session_id, queue: asyncio.Queue):
+        key = str(session_id)
+        watch = self._watches.get(key)
+        if watch is None or queue not in watch.queues:
+            return
+        watch.queues.discard(queue)
+        self._connections -= 1
+        if not watch.queues:
+            self._cancel_timer(watch)
+            del self._watches[key]
+
+    def start_question(self, session_id):
+        """A new question is on screen: screen time restarts"""
+        watch = self._watches.get(str(session_id))
+        if watch is None:
+            return
+        watch.question_started = asyncio.get_running_loop().time()
+        watch.paused = False
+        watch.last = "none"
+        self._evaluate(watch)
+
+    def set_paused(self, session_id, paused: bool):
+        """No interventions while paused (answer submitted, next question loading)"""
+        watch = self._watches.get(str(session_id))
+        if watch is None or watch.paused == paused:
+            return
+        watch.paused = paused
+        if paused:
+            self._cancel_timer(watch)
+        else:
+            self._evaluate(watch)
+
+    def on_emotion(self, session_id, emotion: str):
+        watch = self._watches.get(str(session_id))
+        if watch is None or watch.emotion == emotion:
+            return
+        watch.emotion = emotion
+        self._evaluate(watch)
+
+    def _evaluate(self, watch: _Watch):
+        self._cancel_timer(watch)
+        if watch.paused:
+            return
+        self.stats["evaluations"] += 1
+        loop = asyncio.get_running_loop()
+        screen_time = loop.time() - watch.question_started
+        intervention, next_threshold = intervention_engine.evaluate(watch.emotion, screen_time)
+        if intervention != watch.last:
+            watch.last = intervention
+            if intervention != "none":
+                self._push(watch, {
+                    "type": "intervention",
+                    "intervention": intervention,
+                    "emotion": watch.emotion,
+                    "screen_time": round(screen_time, 1),
+                })
+        if next_threshold is not None:
+            # Re-check just after the decision changes
+            watch.timer = loop.call_later(next_threshold - screen_time + 0.01, self._evaluate, watch)
+
+    def _push(self, watch: _Watch, event: Dict):
+        for queue in watch.queues:
+            try:
+                queue.put_nowait(event)
+                self.stats["pushed"] += 1
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+
+    @staticmethod
+    def _cancel_timer(watch: _Watch):
+        if watch.timer is not None:
+            watch.timer.cancel()
+            watch.timer = None
+
+    def metrics(self) -> Dict:
+        return {"connections": self._connections, "sessions": len(self._watches), **self.stats}
+
+
+intervention_hub = InterventionHub(max_connections=settings.INTERVENTION_MAX_CONNECTIONS)
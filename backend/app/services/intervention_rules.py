@@ -0,0 +1,97 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+# Expert system emotion groups (raw FER+ emotions plus the mapped names)
+HINT_EMOTIONS = ["anger", "fear", "disgust", "frustrated", "anxious", "confused"]
+VISUAL_EMOTIONS = ["sad"]
+INTERVENTION_SCREEN_TIME = 10  # Seconds on a question before the hint / visual rules fire
+
+# GeoMorph intervention rules, in priority order: the first rule whose emotion set contains
+# the emotion and whose screen-time threshold is exceeded (strictly) decides.
+INTERVENTION_RULES = [
+    {
+        # Rule 1: IF (Any Negative Emotion) AND Screen Time Long (>10s) -> Hint
+        # All negative emotions indicate struggle/confusion - show hint to help
+        'name': 'negative_long_screen_time',
+        'emotions': HINT_EMOTIONS,
+        'min_screen_time': INTERVENTION_SCREEN_TIME,
+        'intervention': 'show_hint',
+    },
+    {
+        # Rule 2: IF (Neutral/Sad) AND Screen Time Long (>40s) -> Change Visual
+        # Neutral/Sad for too long = Bored
+        'name': 'sad_long_screen_time',
+        'emotions': VISUAL_EMOTIONS,
+        'min_screen_time': INTERVENTION_SCREEN_TIME,
+        'intervention': 'change_visual',
+    },
+]
+
+NO_INTERVENTION = "none"
+
+
+class InterventionEngine:
+    """
+    Expert-layer intervention rules, separate from the fuzzy level controller.
+
+    The rules only look at the emotion and the time on the question, so they are compiled
+    into a per-emotion step function of screen time: sorted breakpoints plus the decision
+    on each segment. Evaluating is a dict lookup and a bisect, and also yields the next
+    screen time at which the decision changes, so callers can schedule one re-check
+    instead of polling.
+    """
+
+    def __init__(self, rules: Sequence[Dict]):
+        self.rules = list(rules)
+        # emotion -> (breakpoints, decisions); decisions[k] holds while
+        # breakpoints[k-1] < screen_time <= breakpoints[k]
+        self._index: Dict[str, Tuple[List[float], List[str]]] = {}
+        emotions = {emotion for rule in self.rules for emotion in rule['emotions']}
+        for emotion in emotions:
+            self._index[emotion] = self._compile(emotion)
+
+    def _compile(self, emotion: str) -> Tuple[List[float], List[str]]:
+        rules = [rule for rule in self.rules if emotion in rule['emotions']]
+        thresholds = sorted({float(rule['min_screen_time']) for rule in rules})
+        breakpoints, decisions = [], [self._decide(rules, float("-inf"))]
+        for threshold in thresholds:
+            # Just past the threshold (the rules use a strict ">")
+            decision = self._decide(rules, np.nextafter(threshold, np.inf))
+            if decision != decisions[-1]:
+                breakpoints.append(threshold)
+                decisions.append(decision)
+        return breakpoints, decisions
+
+    @staticmethod
+    def _decide(rules: List[Dict], screen_time: float) -> str:
+        for rule in rules:
+            if screen_time > rule['min_screen_time']:
+                return rule['intervention']
+        return NO_INTERVENTION
+
+    def evaluate(self, emotion: str, screen_time: float) -> Tuple[str, Optional[float]]:
+        """(intervention, screen time after which it changes, or None if it never does)"""
+        entry = self._index.get(emotion)
+        if entry is None:
+            return NO_INTERVENTION, None
+        breakpoints, decisions = entry
+        k = bisect_left(breakpoints, screen_time)
+        return decisions[k], breakpoints[k] if k < len(breakpoints) else None
+
+    def evaluate_batch(self, emotion: ArrayLike, screen_time: ArrayLike) -> np.ndarray:
+        """Vectorized `evaluate` (interventions only) for offline replay / simulations"""
+        emotion = np.asarray(emotion)
+        screen_time = np.asarray(screen_time, dtype=float)
+        intervention = np.full(screen_time.shape, NO_INTERVENTION, dtype=object)
+        for name, (breakpoints, decisions) in self._index.items():
+            rows = emotion == name
+            if rows.any():
+                segment = np.searchsorted(breakpoints, screen_time[rows], side="left")
+                intervention[rows] = np.asarray(decisions, dtype=object)[segment]
+        return intervention.astype(str)
+
+
+intervention_engine = InterventionEngine(INTERVENTION_RULES)
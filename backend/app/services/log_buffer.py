@@ -0,0 +1,154 @@
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.db.session import write_session
+from app.models.interaction import EmotionLog
+from app.services import analytics_rollup
+
+logger = get_logger(__name__)
+
+
+class EmotionLogBuffer:
+    """
+    Write-behind buffer for EmotionLog rows.
+
+    Predict endpoints hand rows over with `add()` and return straight away; rows
+    are written with one bulk INSERT (single transaction) once `flush_size` rows
+    are pending or `flush_interval` seconds after the first one arrived. At most
+    `max_pending` rows are held: beyond that the oldest are dropped and counted,
+    so a stalled database cannot grow memory without bound. Call `close()` on
+    shutdown to write whatever is still pending.
+
+    Rows whose session no longer exists (deleted by a reset, or an invalid id
+    from the client) are dropped at flush time instead of failing the INSERT for
+    everyone. A failed flush keeps its rows and is retried by a single timer
+    with exponential backoff (up to `retry_max` seconds); new rows only queue
+    up until that retry succeeds.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float, max_pending: int, retry_max: float):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.flush_size, max_pending)
+        self.retry_max = max(flush_interval, retry_max)
+        # (row values, enqueue time) in arrival order
+        self._pending: "deque[tuple]" = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+        self._failures = 0  # Consecutive failed flushes; while > 0 the retry timer owns flushing
+        self.stats = {
+            "queued": 0, "written": 0, "dropped": 0, "unknown_session": 0, "flushes": 0, "failed_flushes": 0,
+        }
+        self._last_flush_lag = 0.0
+        self._max_flush_lag = 0.0
+
+    def add(self, session_id, detected_emotion: str, confidence: float, source: str = "face"):
+        row = {
+            "session_id": session_id,
+            "detected_emotion": detected_emotion,
+            "confidence": confidence,
+            "source": source,
+            "timestamp": datetime.utcnow(),
+        }
+        self._pending.append((row, time.monotonic()))
+        self.stats["queued"] += 1
+        self._trim()
+
+        if self._failures:
+            return
+        # A flush in flight keeps going until the queue is empty, so one task at a time is enough
+        if len(self._pending) >= self.flush_size and not self._tasks:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._schedule_flush)
+
+    def _trim(self):
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft()
+            self.stats["dropped"] += 1
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule_flush(self):
+        self._cancel_timer()
+        task = asyncio.get_running_loop().create_task(self.flush())
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule_retry(self):
+        self._failures += 1
+        delay = min(self.flush_interval * 2 ** (self._failures - 1), self.retry_max)
+        self._cancel_timer()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._schedule_flush)
+
+    async def flush(self):
+        """Write every pending row, one bulk INSERT per `flush_size` chunk"""
+        async with self._lock:
+            while self._pending:
+                chunk = [self._pending.popleft() for _ in range(min(self.flush_size, len(self._pending)))]
+                rows: List[Dict[str, Any]] = [row for row, _ in chunk]
+                try:
+                    async with write_session() as db:
+                        owners = await analytics_rollup.session_owners(db, (row["session_id"] for row in rows))
+                        known = [row for row in rows if row["session_id"] in owners]
+                        if known:
+                            await db.execute(insert(EmotionLog), known)
+                            await analytics_rollup.record_emotions(db, known, owners)
+                        await db.commit()
+                except Exception as e:
+                    # Put the rows back in front and leave them to the retry timer
+                    self.stats["failed_flushes"] += 1
+                    self._pending.extendleft(reversed(chunk))
+                    self._trim()
+                    self._schedule_retry()
+                    logger.warning("Emotion log flush failed (%d rows pending): %s", len(self._pending), e)
+                    return
+
+                self._failures = 0
+                self.stats["unknown_session"] += len(rows) - len(known)
+                lag = time.monotonic() - chunk[0][1]
+                self._last_flush_lag = lag
+                self._max_flush_lag = max(self._max_flush_lag, lag)
+                self.stats["written"] += len(known)
+                self.stats["flushes"] += 1
+
+    async def close(self):
+        self._cancel_timer()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+        self._cancel_timer()
+        if self._pending:
+            logger.error("Emotion log buffer closed with %d unwritten rows", len(self._pending))
+
+    def metrics(self) -> Dict:
+        oldest = time.monotonic() - self._pending[0][1] if self._pending else 0.0
+        return {
+            "pending": len(self._pending),
+            "lag_seconds": round(oldest, 3),  # Age of the oldest unwritten row
+            "last_flush_lag_seconds": round(self._last_flush_lag, 3),
+            "max_flush_lag_seconds": round(self._max_flush_lag, 3),
+            "retrying": self._failures > 0,
+            **self.stats,
+        }
+
+
+emotion_log_buffer = EmotionLogBuffer(
+    flush_size=settings.EMOTION_LOG_FLUSH_SIZE,
+    flush_interval=settings.EMOTION_LOG_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.EMOTION_LOG_MAX_PENDING,
+    retry_max=settings.EMOTION_LOG_RETRY_MAX_SECONDS,
+)
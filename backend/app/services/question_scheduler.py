@@ -0,0 +1,282 @@
+import base64
+import heapq
+import json
+import math
+import random
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.models.session import LearningSession
+from app.services.intervention_rules import HINT_EMOTIONS, VISUAL_EMOTIONS
+from app.services.question_store import QuestionStore
+
+logger = get_logger(__name__)
+
+# Missed questions are not re-surfaced while the learner shows these
+STRUGGLING_EMOTIONS = frozenset(HINT_EMOTIONS + VISUAL_EMOTIONS)
+
+SNAPSHOT_VERSION = 1
+# Ids below this are tracked in the `seen` bitset (at most 8 KiB per session); larger ids in a
+# set, so a sparse id space in the bank can't inflate every session's bitset
+SEEN_BITSET_IDS = 1 << 16
+
+
+class SessionSchedule:
+    """
+    Question order for one learning session.
+
+    - `seen`: bitset over question ids (`seen_sparse` for ids beyond SEEN_BITSET_IDS), so
+      nothing repeats until its pool is used up.
+    - `review`: min-heap of missed questions keyed by the turn they are due again; the
+      gap grows with every miss (QUESTION_REVIEW_GAPS) and a correct answer retires it.
+    - `topics`: per-topic correct/total, used to steer towards the weakest topic (or the
+      strongest one while the learner is struggling).
+    - `cursors`: position in a per-session permutation of each candidate pool, so fresh
+      questions are found without shuffling or scanning the pool.
+
+    Picking is O(log n) per review entry looked at (the due ones that don't fit the request,
+    then the one served) plus amortized O(1) for a fresh question.
+    """
+
+    def __init__(self):
+        self.turn = 0
+        self.seen = bytearray()
+        self.seen_sparse: Set[int] = set()
+        # (due turn, question id, misses, topic, difficulty)
+        self.review: List[Tuple[int, int, int, str, int]] = []
+        self.missed: Dict[int, int] = {}  # question id -> misses, for lazy deletion from `review`
+        self.topics: Dict[str, List[int]] = {}  # topic -> [correct, total]
+        self.cursors: Dict[str, List[int]] = {}  # pool key -> [pool size, offset, stride, position, pass]
+        self.owner: Optional[UUID] = None  # User id of the session, checked by load_schedule (not snapshotted)
+
+    # --- seen bitset ---
+    def is_seen(self, question_id: int) -> bool:
+        if question_id >= SEEN_BITSET_IDS:
+            return question_id in self.seen_sparse
+        byte = question_id >> 3
+        return byte < len(self.seen) and bool(self.seen[byte] & (1 << (question_id & 7)))
+
+    def mark_seen(self, question_id: int):
+        if question_id >= SEEN_BITSET_IDS:
+            self.seen_sparse.add(question_id)
+            return
+        byte = question_id >> 3
+        if byte >= len(self.seen):
+            self.seen.extend(bytes(byte + 1 - len(self.seen)))
+        self.seen[byte] |= 1 << (question_id & 7)
+
+    # --- answers ---
+    def record_answer(self, question_id: int, is_correct: bool, topic: str, difficulty: Optional[int]):
+        stats = self.topics.setdefault(topic, [0, 0])
+        stats[0] += int(is_correct)
+        stats[1] += 1
+        if is_correct:
+            self.missed.pop(question_id, None)
+        elif difficulty is not None:
+            misses = self.missed.get(question_id, 0) + 1
+            self.missed[question_id] = misses
+            gaps = settings.QUESTION_REVIEW_GAPS
+            due = self.turn + gaps[min(misses, len(gaps)) - 1]
+            heapq.heappush(self.review, (due, question_id, misses, topic, difficulty))
+
+    def _mastery(self, topic: str) -> float:
+        correct, total = self.topics[topic]
+        return (correct + 1) / (total + 2)
+
+    # --- picking ---
+    def pick(self, store: QuestionStore, difficulty: int, topic: str, emotion: str) -> Optional[int]:
+        self.turn += 1
+        struggling = emotion in STRUGGLING_EMOTIONS
+        topic_filter = topic if topic in store.by_topic else None
+
+        if not struggling:
+            question_id = self._due_review(difficulty, topic_filter)
+            if question_id is not None:
+                return question_id
+
+        # Without an explicit topic, steer part of the questions to the weakest practiced topic
+        # (the strongest one while struggling, to rebuild confidence)
+        if topic_filter is None and random.random() < settings.QUESTION_FOCUS_SHARE:
+            practiced = [t for t in self.topics if t in store.by_topic]
+            if practiced:
+                focus = (max if struggling else min)(practiced, key=self._mastery)
+                question_id = self._fresh(store, focus, difficulty, allow_repeats=False)
+                if question_id is not None:
+                    return question_id
+
+        return self._fresh(store, topic_filter, difficulty)
+
+    def _due_review(self, difficulty: int, topic: Optional[str]) -> Optional[int]:
+        """Earliest due missed question that fits this request"""
+        found, waiting = None, []
+        while self.review:
+            entry = heapq.heappop(self.review)
+            due, question_id, misses, q_topic, q_difficulty = entry
+            if self.missed.get(question_id) != misses:
+                continue  # Answered correctly or missed again since
+            if due > self.turn:
+                waiting.append(entry)
+                break
+            # Only re-surface it where it fits this request; otherwise it waits for one that does
+            if abs(q_difficulty - difficulty) > 1 or (topic is not None and q_topic != topic):
+                waiting.append(entry)
+                continue
+            self.mark_seen(question_id)
+            found = question_id
+            break
+        for entry in waiting:
+            heapq.heappush(self.review, entry)
+        return found
+
+    def _fresh(self, store: QuestionStore, topic: Optional[str], difficulty: int,
+               allow_repeats: bool = True) -> Optional[int]:
+        """
+        Next unseen id of the pool. Once every question of the pool has been seen a new pass
+        starts, unless `allow_repeats` is off, in which case None is returned.
+        """
+        table = store.by_topic.get(topic) if topic is not None else store.by_difficulty
+        pool = table.get(difficulty) if table else None
+        if not pool:
+            return None
+        n = len(pool)
+        key = f"{topic or '*'}:{difficulty}"
+        cursor = self.cursors.get(key)
+        if cursor is None or cursor[0] != n:
+            cursor = self.cursors[key] = self._new_pass(n, 0)
+
+        while True:
+            if cursor[3] >= n:
+                if not allow_repeats:
+                    return None
+                # Pool used up: repeats are allowed from here, in a new order each pass
+                cursor[:] = self._new_pass(n, cursor[4] + 1)
+            question_id = pool[(cursor[1] + cursor[2] * cursor[3]) % n]
+            cursor[3] += 1
+            # Only the first pass skips questions already served from other pools
+            if cursor[4] > 0 or not self.is_seen(question_id):
+                self.mark_seen(question_id)
+                return question_id
+
+    @staticmethod
+    def _new_pass(n: int, number: int) -> List[int]:
+        # offset + stride * i (mod n) visits every index once when gcd(stride, n) == 1
+        stride = random.randrange(1, n) if n > 1 else 1
+        while math.gcd(stride, n) != 1:
+            stride = random.randrange(1, n)
+        return [n, random.randrange(n), stride, 0, number]
+
+    # --- persistence ---
+    def snapshot(self) -> str:
+        review = [entry for entry in self.review if self.missed.get(entry[1]) == entry[2]]
+        return json.dumps({
+            "v": SNAPSHOT_VERSION,
+            "turn": self.turn,
+            "seen": base64.b64encode(zlib.compress(bytes(self.seen))).decode("ascii"),
+            "seen_sparse": sorted(self.seen_sparse),
+            "review": review,
+            "topics": self.topics,
+            "cursors": self.cursors,
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_snapshot(cls, snapshot: str) -> "SessionSchedule":
+        data = json.loads(snapshot)
+        schedule = cls()
+        if data.get("v") != SNAPSHOT_VERSION:
+            return schedule
+        schedule.turn = data["turn"]
+        schedule.seen = bytearray(zlib.decompress(base64.b64decode(data["seen"])))
+        schedule.seen_sparse = set(data.get("seen_sparse", ()))
+        schedule.review = [tuple(entry) for entry in data["review"]]
+        heapq.heapify(schedule.review)
+        schedule.missed = {entry[1]: entry[2] for entry in schedule.review}
+        schedule.topics = data["topics"]
+        schedule.cursors = data["cursors"]
+        return schedule
+
+
+class QuestionScheduler:
+    """
+    In-process `SessionSchedule` per learning session.
+
+    Idle sessions expire after `ttl` seconds and the least recently used ones are dropped
+    beyond `max_sessions`. The schedule is snapshotted onto LearningSession.scheduler_state
+    with every answer, so after a restart or eviction it is restored from that one column.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session_id -> (schedule, last used)
+        self._schedules: "OrderedDict[str, Tuple[SessionSchedule, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "restored": 0, "evicted": 0}
+
+    def get(self, session_id) -> Optional[SessionSchedule]:
+        key = str(session_id)
+        entry = self._schedules.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._touch(key, entry[0])
+        return entry[0]
+
+    def restore(self, session_id, snapshot: Optional[str], owner: Optional[UUID] = None) -> SessionSchedule:
+        """Schedule from a persisted snapshot (a new one if there is none or it is unreadable)"""
+        schedule = None
+        if snapshot:
+            try:
+                schedule = SessionSchedule.from_snapshot(snapshot)
+                self.stats["restored"] += 1
+            except (ValueError, KeyError, TypeError, zlib.error) as e:
+                logger.warning("Discarding unreadable scheduler snapshot for session %s: %s", session_id, e)
+        schedule = schedule or SessionSchedule()
+        schedule.owner = owner
+        self._touch(str(session_id), schedule)
+        return schedule
+
+    def _touch(self, key: str, schedule: SessionSchedule):
+        self._schedules[key] = (schedule, time.monotonic())
+        self._schedules.move_to_end(key)
+        while len(self._schedules) > self.max_sessions:
+            self._schedules.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def metrics(self) -> Dict:
+        return {"sessions": len(self._schedules), **self.stats}
+
+
+question_scheduler = QuestionScheduler(
+    ttl=settings.QUESTION_SCHEDULER_TTL_SECONDS,
+    max_sessions=settings.QUESTION_SCHEDULER_MAX_SESSIONS,
+)
+
+
+async def load_schedule(db: AsyncSession, session_id: UUID, user_id: UUID) -> Optional[SessionSchedule]:
+    """
+    Schedule of the session if it belongs to `user_id`, else None.
+    Served from the cache when its owner is known, else one primary-key read that checks
+    the owner and restores the schedule from its snapshot.
+    """
+    schedule = question_scheduler.get(session_id)
+    if schedule is not None and schedule.owner == user_id:
+        return schedule
+    result = await db.execute(
+        select(LearningSession.user_id, LearningSession.scheduler_state).where(LearningSession.id == session_id)
+    )
+    row = result.one_or_none()
+    if row is None or row.user_id != user_id:
+        return None
+    if schedule is not None:
+        schedule.owner = row.user_id
+        return schedule
+    snapshot = row.scheduler_state if settings.QUESTION_SCHEDULER_PERSIST else None
+    return question_scheduler.restore(session_id, snapshot, owner=row.user_id)
@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import time
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.data_files import source_signature
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5  # Highest difficulty in the question bank
+
+SCHEMA = """
+CREATE TABLE questions (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+"""
+# Covering index: opening the store reads (topic, difficulty, id) without touching payload pages
+INDEX = "CREATE INDEX ix_questions_topic_difficulty ON questions (topic, difficulty, id)"
+
+# Question fields kept in the JSON payload column (the rest are columns)
+PAYLOAD_FIELDS = ("question", "options", "correct_answer", "hint")
+
+
+def compile_store(source_path: str, store_path: str) -> int:
+    """
+    Compile the JSON question bank into a read-only SQLite file.
+    The file is written next to the target and moved into place with os.replace, so
+    readers either see the old store or the complete new one. Returns the question count.
+    """
+    with open(source_path, "r") as f:
+        questions = json.load(f)
+
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+        conn.executemany(
+            "INSERT INTO questions (id, topic, difficulty, payload) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    int(q["id"]),
+                    q.get("topic", "general"),
+                    int(q["difficulty"]),
+                    json.dumps({k: q[k] for k in PAYLOAD_FIELDS}, ensure_ascii=False, separators=(",", ":")),
+                )
+                for q in questions
+            ),
+        )
+        conn.execute(INDEX)
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("source_signature", source_signature(source_path)),
+            ("question_count", str(len(questions))),
+            ("compiled_at", str(time.time())),
+        ])
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(questions)
+
+
+def _candidates_by_difficulty(rows: List[Tuple[int, int]]) -> Dict[int, array]:
+    """
+    Candidate question ids for every difficulty level, with the fallbacks resolved up front:
+    exact difficulty, else within +/-1 level, else any question of the pool.
+    """
+    by_level: Dict[int, array] = defaultdict(lambda: array("q"))
+    for question_id, difficulty in rows:
+        by_level[difficulty].append(question_id)
+    everything = array("q", (question_id for question_id, _ in rows))
+    table = {}
+    for level in range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1):
+        candidates = by_level.get(level)
+        if not candidates:
+            candidates = array("q", (i for i, d in rows if abs(d - level) <= 1))
+        table[level] = candidates or everything
+    return table
+
+
+class QuestionStore:
+    """
+    Read-only view of a compiled question store.
+
+    The file is opened immutable and memory-mapped, so every worker process reads the
+    same page-cache pages instead of holding its own parsed copy of the bank. Only the
+    candidate id arrays live in process memory; payloads are read by primary key on demand.
+    A replaced store file (new inode) is picked up by opening a new QuestionStore; this
+    one keeps reading the old file until it is dropped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        st = os.stat(path)
+        self.file_id = (st.st_ino, st.st_mtime_ns)
+        self._conn = sqlite3.connect(
+            Path(path).resolve().as_uri() + "?mode=ro&immutable=1", uri=True, check_same_thread=False
+        )
+        self._conn.execute(f"PRAGMA mmap_size={settings.QUESTION_STORE_MMAP_SIZE}")
+        self.meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+
+        by_topic: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        rows = []
+        for topic, difficulty, question_id in self._conn.execute(
+            "SELECT topic, difficulty, id FROM questions ORDER BY topic, difficulty, id"
+        ):
+            by_topic[topic].append((question_id, difficulty))
+            rows.append((question_id, difficulty))
+        self.count = len(rows)
+        # difficulty -> candidate ids, and topic -> difficulty -> candidate ids
+        self.by_difficulty = _candidates_by_difficulty(rows)
+        self.by_topic = {topic: _candidates_by_difficulty(r) for topic, r in by_topic.items()}
+
+    def get(self, question_id) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT id, topic, difficulty, payload FROM questions WHERE id = ?", (question_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        question_id, topic, difficulty, payload = row
+        return {**json.loads(payload), "id": question_id, "difficulty": difficulty, "topic": topic}
+
+    def get_topic(self, question_id) -> Optional[str]:
+        row = self._conn.execute("SELECT topic FROM questions WHERE id = ?", (question_id,)).fetchone()
+        return row[0] if row else None
+
+    def describe(self, question_id) -> Optional[Tuple[str, int]]:
+        """(topic, difficulty) of a question, without its payload"""
+        return self._conn.execute("SELECT topic, difficulty FROM questions WHERE id = ?", (question_id,)).fetchone()
+
+    def topics_by_id(self) -> Iterator[Tuple[int, str]]:
+        return iter(self._conn.execute("SELECT id, topic FROM questions ORDER BY id").fetchall())
+
+    def is_stale(self, source_path: str) -> bool:
+        """Whether the JSON source changed since this store was compiled"""
+        try:
+            return self.meta.get("source_signature") != source_signature(source_path)
+        except FileNotFoundError:
+            return False
+
+    def close(self):
+        self._conn.close()
+
+
+def open_store(source_path: str, store_path: str, current: Optional[QuestionStore] = None,
+               force: bool = False) -> Optional[QuestionStore]:
+    """
+    Open the compiled store, (re)compiling it first when it is missing, `force`d or older
+    than the JSON source. Returns None when `current` is still up to date.
+    """
+    store_exists = os.path.exists(store_path)
+    if current is not None and not force and store_exists:
+        st = os.stat(store_path)
+        if (st.st_ino, st.st_mtime_ns) == current.file_id and not current.is_stale(source_path):
+            return None
+
+    store = QuestionStore(store_path) if store_exists and not force else None
+    if store is None or store.is_stale(source_path):
+        if store is not None:
+            store.close()
+        count = compile_store(source_path, store_path)
+        logger.info("Question store compiled", extra={"questions": count, "path": store_path})
+        store = QuestionStore(store_path)
+    return store
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import String, type_coerce
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlmodel import select
+
+from app.models.interaction import EmotionLog, InteractionLog
+from app.models.session import LearningSession
+from app.services.fuzzy_logic import PROFICIENCY_MAX, PROFICIENCY_MIN, FuzzyAdaptiveSystem
+from app.services.fuzzy_rulebase import RuleBase, rules_path
+
+RECORDED = "recorded"  # Trajectory of the adjustments logged at the time (InteractionLog.ai_difficulty_adj)
+START_PROFICIENCY = 1.0  # LearningSession.proficiency default
+DEFAULT_EMOTION = "neutral"  # submit_answer's fallback when a session has no emotion log yet
+MAX_LEVEL = 9  # Levels are single digits; bounds the final-level histograms
+
+# Controller under test: {"name", "rules" (spec path), "min", "max" (proficiency clamp)}
+Controller = Dict
+
+# Set once per worker process by _init_worker: (name, system, proficiency min, proficiency max)
+_controllers: List[Tuple[str, FuzzyAdaptiveSystem, float, float]] = []
+
+
+def controller_spec(name: str, rules: Optional[str] = None,
+                    low: float = PROFICIENCY_MIN, high: float = PROFICIENCY_MAX) -> Controller:
+    """Validated controller definition (rules default to FUZZY_RULES_PATH)"""
+    if not name or name == RECORDED:
+        raise ValueError(f"Invalid controller name {name!r}")
+    if not 0 <= low <= high < MAX_LEVEL + 1:
+        raise ValueError(f"Controller {name}: proficiency range must satisfy 0 <= min <= max < {MAX_LEVEL + 1}")
+    path = rules or rules_path()
+    RuleBase.from_file(path)  # Fail fast, before any worker starts
+    return {"name": name, "rules": path, "min": float(low), "max": float(high)}
+
+
+# --- Reading: session timelines streamed in session order ---
+def _session_filter(statement, column, since: Optional[datetime], until: Optional[datetime]):
+    if since is None and until is None:
+        return statement
+    sessions = select(LearningSession.id)
+    if since is not None:
+        sessions = sessions.where(LearningSession.start_time >= since)
+    if until is not None:
+        sessions = sessions.where(LearningSession.start_time < until)
+    return statement.where(column.in_(sessions))
+
+
+async def _by_session(conn: AsyncConnection, statement, batch_rows: int) -> AsyncIterator[Tuple[object, List]]:
+    """Rows of a (session_id, ...) query ordered by session, grouped per session"""
+    result = await conn.stream(statement.execution_options(yield_per=batch_rows))
+    session_id, rows = None, []
+    async for partition in result.partitions():
+        for row in partition:
+            if row[0] != session_id:
+                if rows:
+                    yield session_id, rows
+                session_id, rows = row[0], []
+            rows.append(row)
+    if rows:
+        yield session_id, rows
+
+
+async def iter_timelines(engine: AsyncEngine, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         batch_rows: int = 10000) -> AsyncIterator[Tuple[object, List]]:
+    """
+    (session_id, answers) per session that has answers, in session order. Each answer is
+    (time_taken, is_correct, hints_used, recorded adjustment, emotion), the emotion being
+    the session's latest EmotionLog at the time of the answer, as submit_answer reads it.
+
+    Interactions and emotions are two ordered streams (one connection each) merge-joined
+    on session_id, so memory holds one session's rows plus a fetch batch per stream.
+    """
+    # session_id and timestamp are only compared with each other: keep the driver's raw
+    # values (no UUID / datetime conversion per row), ordered the same way the database sorts them
+    interactions = _session_filter(
+        select(type_coerce(InteractionLog.session_id, String), type_coerce(InteractionLog.timestamp, String),
+               InteractionLog.time_taken, InteractionLog.is_correct, InteractionLog.hints_used_count,
+               InteractionLog.ai_difficulty_adj)
+        .order_by(InteractionLog.session_id, InteractionLog.timestamp, InteractionLog.id),
+        InteractionLog.session_id, since, until)
+    emotions = _session_filter(
+        select(type_coerce(EmotionLog.session_id, String), type_coerce(EmotionLog.timestamp, String),
+               EmotionLog.detected_emotion)
+        .order_by(EmotionLog.session_id, EmotionLog.timestamp, EmotionLog.id),
+        EmotionLog.session_id, since, until)
+
+    async with engine.connect() as interactions_conn, engine.connect() as emotions_conn:
+        emotion_groups = _by_session(emotions_conn, emotions, batch_rows)
+        emotion_group = await anext(emotion_groups, None)
+        async for session_id, rows in _by_session(interactions_conn, interactions, batch_rows):
+            # Sessions with emotions but no answers have nothing to replay
+            while emotion_group is not None and emotion_group[0] < session_id:
+                emotion_group = await anext(emotion_groups, None)
+            session_emotions = []
+            if emotion_group is not None and emotion_group[0] == session_id:
+                session_emotions = emotion_group[1]
+                emotion_group = await anext(emotion_groups, None)
+
+            answers, e, emotion = [], 0, DEFAULT_EMOTION
+            for _, timestamp, time_taken, is_correct, hints, adjustment in rows:
+                while e < len(session_emotions) and session_emotions[e][1] <= timestamp:
+                    emotion = session_emotions[e][2]
+                    e += 1
+                answers.append((time_taken, is_correct, hints, adjustment, emotion))
+            yield session_id, answers
+
+
+async def iter_chunks(engine: AsyncEngine, chunk_size: int, **kwargs) -> AsyncIterator[Dict]:
+    """Whole sessions packed into columnar chunks of about `chunk_size` answers"""
+    def pack(session_ids, lengths, answers):
+        time_taken, is_correct, hints, adjustment, emotion = zip(*answers)
+        return {
+            "session_ids": session_ids,
+            "offsets": np.concatenate([[0], np.cumsum(lengths)]),
+            "time_taken": np.array(time_taken, dtype=float),
+            "accuracy": np.array(is_correct, dtype=float),
+            "hints": np.array(hints, dtype=float),
+            "recorded": np.array(adjustment, dtype=float),
+            "emotion": np.array(emotion, dtype=str),
+        }
+
+    session_ids, lengths, answers = [], [], []
+    async for session_id, session_answers in iter_timelines(engine, **kwargs):
+        session_ids.append(str(session_id))
+        lengths.append(len(session_answers))
+        answers.extend(session_answers)
+        if len(answers) >= chunk_size:
+            yield pack(session_ids, lengths, answers)
+            session_ids, lengths, answers = [], [], []
+    if answers:
+        yield pack(session_ids, lengths, answers)
+
+
+# --- Replaying (runs in the worker processes) ---
+def _init_worker(controllers: List[Controller]):
+    _controllers.clear()
+    for c in controllers:
+        system = FuzzyAdaptiveSystem(RuleBase.from_file(c["rules"]))
+        _controllers.append((c["name"], system, c["min"], c["max"]))
+
+
+def _replay(chunk: Dict, adjust, low: float, high: float) -> np.ndarray:
+    """
+    Level after every answer of the chunk. Sessions advance in lockstep, longest first,
+    so step k is one batch call over the k-th answer of every session that has one.
+    """
+    offsets = chunk["offsets"]
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind="stable")
+    starts, lengths = offsets[:-1][order], lengths[order]
+    proficiency = np.full(len(order), START_PROFICIENCY)
+    levels = np.empty(offsets[-1], dtype=np.int8)
+    for step in range(int(lengths[0]) if len(lengths) else 0):
+        active = int(np.count_nonzero(lengths > step))
+        rows = starts[:active] + step
+        # submit_answer: the client's current level is the level of the previous answer
+        adjustment = adjust(rows, proficiency[:active].astype(int))
+        proficiency[:active] = np.clip(proficiency[:active] + adjustment, low, high)
+        levels[rows] = proficiency[:active].astype(int)
+    return levels
+
+
+def _controller_adjust(system: FuzzyAdaptiveSystem, chunk: Dict):
+    def adjust(rows, current_level):
+        # The learn page sends the time on the question as both screen_time and time_taken
+        return system.process_feedback_batch(
+            screen_time=chunk["time_taken"][rows],
+            accuracy=chunk["accuracy"][rows],
+            response_time=chunk["time_taken"][rows],
+            emotion=chunk["emotion"][rows],
+            hints_used=chunk["hints"][rows],
+            current_level=current_level,
+        )["adjustment"]
+    return adjust
+
+
+def _trajectory_stats(levels: np.ndarray, offsets: np.ndarray, baseline: np.ndarray, max_steps: int) -> Dict:
+    first, last = offsets[:-1], offsets[1:] - 1
+    lengths = np.diff(offsets)
+    step = np.arange(len(levels)) - np.repeat(first, lengths)
+    previous = np.empty_like(levels)
+    previous[1:] = levels[:-1]
+    previous[first] = int(START_PROFICIENCY)
+    kept = step < max_steps
+    diverged = levels != baseline
+    return {
+        "level_changes": int(np.count_nonzero(levels != previous)),
+        "final_levels": np.bincount(levels[last], minlength=MAX_LEVEL + 1),
+        "level_sum_by_step": np.bincount(step[kept], weights=levels[kept], minlength=max_steps),
+        "count_by_step": np.bincount(step[kept], minlength=max_steps),
+        "diverged_answers": int(np.count_nonzero(diverged)),
+        "diverged_sessions": int(np.count_nonzero(np.add.reduceat(diverged, first))),
+        "abs_level_diff": int(np.abs(levels.astype(int) - baseline).sum()),
+        "final_level_diff": int((levels[last].astype(int) - baseline[last]).sum()),
+    }
+
+
+def replay_chunk(chunk: Dict, baseline: str, max_steps: int, keep_levels: bool) -> Dict:
+    """Replay one chunk through the recorded adjustments and every controller; returns partial stats"""
+    started = time.perf_counter()
+    trajectories = {RECORDED: _replay(chunk, lambda rows, _: chunk["recorded"][rows], PROFICIENCY_MIN, PROFICIENCY_MAX)}
+    for name, system, low, high in _controllers:
+        trajectories[name] = _replay(chunk, _controller_adjust(system, chunk), low, high)
+    base = trajectories[baseline].astype(int)
+    return {
+        "sessions": len(chunk["session_ids"]),
+        "answers": int(chunk["offsets"][-1]),
+        "cpu_seconds": time.perf_counter() - started,
+        "stats": {name: _trajectory_stats(levels, chunk["offsets"], base, max_steps) for name, levels in trajectories.items()},
+        "levels": trajectories if keep_levels else None,
+    }
+
+
+# --- Driver ---
+class ReplayReport:
+    """Partial results of the chunks summed into one report"""
+
+    def __init__(self, names: List[str], baseline: str, max_steps: int):
+        self.baseline = baseline
+        self.max_steps = max_steps
+        self.sessions = 0
+        self.answers = 0
+        self.cpu_seconds = 0.0
+        self.stats: Dict[str, Dict] = {name: {} for name in names}
+
+    def add(self, result: Dict):
+        self.sessions += result["sessions"]
+        self.answers += result["answers"]
+        self.cpu_seconds += result["cpu_seconds"]
+        for name, stats in result["stats"].items():
+            totals = self.stats[name]
+            for key, value in stats.items():
+                totals[key] = totals[key] + value if key in totals else value
+
+    def summary(self, elapsed: float, workers: int) -> Dict:
+        trajectories = {}
+        for name, totals in self.stats.items():
+            if not self.sessions:
+                break
+            final_levels = totals["final_levels"]
+            counts = totals["count_by_step"]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                by_step = np.where(counts > 0, totals["level_sum_by_step"] / counts, np.nan)
+            trajectories[name] = {
+                "mean_final_level": float((final_levels * np.arange(len(final_levels))).sum() / self.sessions),
+                "final_levels": {level: int(n) for level, n in enumerate(final_levels) if n},
+                "level_changes_per_session": totals["level_changes"] / self.sessions,
+                "mean_level_by_answer": [round(float(v), 3) for v in by_step[counts > 0]],
+                "divergence": {
+                    "answers": totals["diverged_answers"] / self.answers,
+                    "sessions": totals["diverged_sessions"] / self.sessions,
+                    "mean_abs_level_diff": totals["abs_level_diff"] / self.answers,
+                    "mean_final_level_diff": totals["final_level_diff"] / self.sessions,
+                },
+            }
+        return {
+            "sessions": self.sessions,
+            "answers": self.answers,
+            "elapsed_seconds": round(elapsed, 3),
+            "answers_per_second": round(self.answers / elapsed, 1) if elapsed else 0.0,
+            "replay_cpu_seconds": round(self.cpu_seconds, 3),
+            "workers": workers,
+            "baseline": self.baseline,
+            "trajectories": trajectories,
+        }
+
+
+def _write_levels(f, result: Dict, chunk_session_ids: List[str], offsets: np.ndarray):
+    for i, session_id in enumerate(chunk_session_ids):
+        start, end = offsets[i], offsets[i + 1]
+        f.write(json.dumps({
+            "session_id": session_id,
+            "levels": {name: levels[start:end].tolist() for name, levels in result["levels"].items()},
+        }) + "\n")
+
+
+async def replay(engine: AsyncEngine, controllers: List[Controller], workers: int = 0, chunk_size: int = 20000,
+                 baseline: str = RECORDED, max_steps: int = 100, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, trajectories_path: Optional[str] = None) -> Dict:
+    """
+    Replay every session with answers through the recorded adjustments and `controllers`.
+
+    The main process streams and packs chunks; `workers` processes replay them (0 runs them
+    in-process). At most 2 * workers chunks are in flight, so memory stays bounded however
+    many interactions there are. With `trajectories_path`, per-session levels are written as
+    JSON lines while the chunks complete.
+    """
+    names = [RECORDED] + [c["name"] for c in controllers]
+    if len(set(names)) != len(names):
+        raise ValueError("Controller names must be unique")
+    if baseline not in names:
+        raise ValueError(f"Unknown baseline {baseline!r} (one of {', '.join(names)})")
+    report = ReplayReport(names, baseline, max_steps)
+    keep_levels = trajectories_path is not None
+    out = open(trajectories_path, "w") if keep_levels else None
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(controllers,)) if workers > 0 else None
+    if pool is None:
+        _init_worker(controllers)
+    loop = asyncio.get_running_loop()
+    pending: Dict[asyncio.Future, Dict] = {}
+
+    def collect(result: Dict, chunk: Dict):
+        report.add(result)
+        if out is not None:
+            _write_levels(out, result, chunk["session_ids"], chunk["offsets"])
+
+    started = time.perf_counter()
+    try:
+        async for chunk in iter_chunks(engine, chunk_size, since=since, until=until):
+            if pool is None:
+                collect(replay_chunk(chunk, baseline, max_steps, keep_levels), chunk)
+                continue
+            pending[loop.run_in_executor(pool, replay_chunk, chunk, baseline, max_steps, keep_levels)] = chunk
+            if len(pending) >= 2 * workers:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    collect(future.result(), pending.pop(future))
+        for future, chunk in list(pending.items()):
+            collect(await future, chunk)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if out is not None:
+            out.close()
+    return report.summary(time.perf_counter() - started, workers)
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 2) - 1)  # One core stays with the reader
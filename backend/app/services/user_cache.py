@@ -0,0 +1,141 @@
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.models.user import User
+
+
+class UserCache:
+    """
+    Resolved `User` per access token, plus the revocations that signed tokens need.
+
+    Entries expire after `ttl` seconds (or when the token does) and the least
+    recently used ones are dropped beyond `max_entries`. Cached users are detached
+    copies, never bound to a DB session.
+
+    JWTs stay valid until they expire, so logout revokes the token's jti and a
+    User update/delete (ORM events below, e.g. deactivation or a role change)
+    revokes every token of that user issued up to that moment. Revocations are
+    kept for `token_lifetime` seconds, after which the tokens have expired anyway.
+    Bulk UPDATE statements bypass the ORM events. All of this is per process.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, token_lifetime: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.token_lifetime = token_lifetime
+        # token -> (user, expires at)
+        self._entries: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self._tokens_by_user: Dict[UUID, Set[str]] = {}
+        # jti -> token expiry; user id -> revoked at (wall clock, like JWT iat/exp)
+        self._revoked_tokens: Dict[str, float] = {}
+        self._revoked_users: Dict[UUID, float] = {}
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0, "invalidated": 0, "revoked": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                self._remove(token)
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(token)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+            if ttl <= 0:
+                return
+        self._remove(token)
+        self._entries[token] = (User.model_validate(user), time.monotonic() + ttl)
+        self._tokens_by_user.setdefault(user.id, set()).add(token)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evicted"] += 1
+
+    def invalidate_token(self, token: str):
+        if self._remove(token):
+            self.stats["invalidated"] += 1
+
+    def invalidate_user(self, user_id: UUID):
+        """Drop every cached token of the user (profile change, deactivation, deletion)"""
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self.invalidate_token(token)
+
+    def revoke_token(self, token: str, jti: str, expires_at: float):
+        """Logout: reject this token from now on, until it would have expired"""
+        self.invalidate_token(token)
+        self._revoked_tokens[jti] = expires_at
+        self.stats["revoked"] += 1
+        self._prune_revocations()
+
+    def revoke_user(self, user_id: UUID):
+        """Reject every token of the user issued up to now"""
+        self.invalidate_user(user_id)
+        self._revoked_users[user_id] = time.time()
+        self.stats["revoked"] += 1
+        self._prune_revocations()
+
+    def is_revoked(self, claims: Dict) -> bool:
+        if claims.get("jti") in self._revoked_tokens:
+            return True
+        revoked_at = self._revoked_users.get(UUID(claims["sub"]))
+        # iat has whole-second resolution: a token issued in the revocation second is rejected too
+        return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+    def _prune_revocations(self):
+        now = time.time()
+        for jti, expires_at in list(self._revoked_tokens.items()):
+            if expires_at < now:
+                del self._revoked_tokens[jti]
+        for user_id, revoked_at in list(self._revoked_users.items()):
+            if revoked_at + self.token_lifetime < now:
+                del self._revoked_users[user_id]
+
+    def _remove(self, token: str) -> bool:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return False
+        tokens = self._tokens_by_user.get(entry[0].id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].id]
+        return True
+
+    def metrics(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "revoked_tokens": len(self._revoked_tokens),
+            "revoked_users": len(self._revoked_users),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            **self.stats,
+        }
+
+
+user_cache = UserCache(
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    token_lifetime=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _revoke_changed_user(mapper, connection, target: User):
+    user_cache.revoke_user(target.id)
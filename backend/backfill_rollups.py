@@ -0,0 +1,36 @@
+"""
+Rebuild the analytics rollup tables from the raw session / interaction / emotion logs.
+Run this after `alembic upgrade head` when the rollup migration is first applied,
+or any time the rollups need to be recomputed. Safe to re-run.
+"""
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.services import analytics_rollup
+
+async def backfill_rollups():
+    """Recompute every rollup table in one transaction."""
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=False,
+        future=True,
+    )
+
+    async_session = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async with async_session() as session:
+        counts = await analytics_rollup.rebuild(session)
+        await session.commit()
+
+    print("✓ Analytics rollups rebuilt:")
+    for table, rows in counts.items():
+        print(f"  - {table}: {rows} rows")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_rollups())
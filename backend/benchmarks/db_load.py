@@ -0,0 +1,176 @@
+"""
+Load benchmark for the database profiles (DB_PROFILE in app/core/config.py).
+
+Drives concurrent submit-answer and predict-emotion traffic through the ASGI app
+(in-process, no network) against a scratch database, once per profile, and
+reports throughput and latency per endpoint. Each profile runs in its own
+process because the engine is built from settings at import time.
+
+Profiles compared:
+    legacy  previous defaults: echo on, driver-default SQLite settings
+    none    echo off, driver-default settings
+    sqlite  echo off, WAL + synchronous=NORMAL + busy_timeout + mmap/cache pragmas
+    postgres  pooled asyncpg engine (only with --postgres-url)
+
+Usage (from backend/):
+    python -m benchmarks.db_load --clients 32 --requests 40
+    python -m benchmarks.db_load --postgres-url postgresql+asyncpg://user:pw@localhost/bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "legacy": {"DB_PROFILE": "none", "DB_ECHO": "true"},
+    "none": {"DB_PROFILE": "none", "DB_ECHO": "false"},
+    "sqlite": {"DB_PROFILE": "sqlite", "DB_ECHO": "false"},
+    "postgres": {"DB_PROFILE": "postgres", "DB_ECHO": "false"},
+}
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000 if ordered else 0.0
+
+
+async def run_load(clients: int, requests: int, emotion_ratio: float) -> dict:
+    """Runs inside the per-profile worker process, after the environment is set."""
+    import base64
+
+    import cv2
+    import httpx
+    import numpy as np
+    from sqlmodel import SQLModel
+
+    from main import app
+    from app.api.deps import get_current_active_user
+    from app.db.session import async_session, engine
+    from app.models.session import LearningSession
+    from app.models.user import User
+    from app.services.log_buffer import emotion_log_buffer
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    users = [User(email=f"bench{i}@example.com", hashed_password="x") for i in range(clients)]
+    sessions = [LearningSession(user_id=user.id) for user in users]
+    async with async_session() as db:
+        db.add_all(users)
+        await db.flush()
+        db.add_all(sessions)
+        await db.commit()
+    app.dependency_overrides[get_current_active_user] = lambda: users[0]
+
+    # Small frame: keeps face detection cheap so the run measures the database, not inference
+    frame = (np.random.default_rng(0).random((48, 64, 3)) * 255).astype("uint8")
+    frame_b64 = base64.b64encode(cv2.imencode(".jpg", frame)[1].tobytes()).decode()
+
+    latencies = {"submit-answer": [], "predict-emotion": []}
+    errors = 0
+
+    async def client(index: int, http: httpx.AsyncClient):
+        nonlocal errors
+        rng = random.Random(index)
+        session_id = str(sessions[index].id)
+        level = 1
+        for _ in range(requests):
+            start = time.perf_counter()
+            if rng.random() < emotion_ratio:
+                name = "predict-emotion"
+                response = await http.post("/api/v1/learning/predict-emotion", json={
+                    "session_id": session_id, "image_base64": frame_b64,
+                })
+            else:
+                name = "submit-answer"
+                correct = rng.random() < 0.7
+                response = await http.post("/api/v1/learning/submit-answer", json={
+                    "session_id": session_id, "question_id": str(rng.randint(1, 48)),
+                    "answer": "a" if correct else "b", "correct_answer": "a",
+                    "time_taken": rng.uniform(3, 40), "hints_used": rng.randint(0, 2),
+                    "current_level": level, "screen_time": rng.uniform(0, 30),
+                })
+                if response.status_code == 200:
+                    level = response.json()["fuzzy_feedback"]["new_level"]
+            latencies[name].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    # Errors (e.g. "database is locked") come back as 500s and are counted, not raised
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i, http) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+    await emotion_log_buffer.close()
+    await engine.dispose()
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        "errors": errors,
+        "endpoints": {
+            name: {"count": len(v), "p50_ms": percentile(v, 0.5), "p95_ms": percentile(v, 0.95)}
+            for name, v in latencies.items()
+        },
+    }
+
+
+def run_profile(profile: str, url: str, args) -> dict:
+    # The auth dependency is overridden, so a throwaway signing key will do
+    env = {**os.environ, **PROFILES[profile], "DATABASE_URL": url, "LOG_LEVEL": "WARNING", "DEV_MODE": "true"}
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.db_load", "--worker", out.name,
+             "--clients", str(args.clients), "--requests", str(args.requests),
+             "--emotion-ratio", str(args.emotion_ratio)],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        with open(out.name) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent learners")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per learner")
+    parser.add_argument("--emotion-ratio", type=float, default=0.75, help="Share of predict-emotion requests")
+    parser.add_argument("--profiles", default="legacy,none,sqlite", help="Comma-separated SQLite profiles to run")
+    parser.add_argument("--postgres-url", help="Also run the postgres profile against this (scratch!) database")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(run_load(args.clients, args.requests, args.emotion_ratio))
+        with open(args.worker, "w") as f:
+            json.dump(result, f)
+        return
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles.split(","):
+            url = f"sqlite+aiosqlite:///{os.path.join(tmp, profile + '.db')}"
+            runs.append((profile, run_profile(profile, url, args)))
+    if args.postgres_url:
+        runs.append(("postgres", run_profile("postgres", args.postgres_url, args)))
+
+    print(f"{args.clients} clients x {args.requests} requests, {args.emotion_ratio:.0%} predict-emotion")
+    print(f"{'profile':<10}{'req/s':>8}{'errors':>8}  {'submit p50/p95 ms':>20}  {'predict p50/p95 ms':>20}")
+    for profile, result in runs:
+        submit = result["endpoints"]["submit-answer"]
+        predict = result["endpoints"]["predict-emotion"]
+        print(
+            f"{profile:<10}{result['throughput']:>8.1f}{result['errors']:>8}  "
+            f"{submit['p50_ms']:>9.1f} / {submit['p95_ms']:<8.1f}  {predict['p50_ms']:>9.1f} / {predict['p95_ms']:<8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the face detector backends used by EmotionService.
+
+Runs every available detector (haar, lbp, dnn) at full resolution and on the
+downscaled copy EmotionService uses (EMOTION_DETECT_WIDTH), and reports mean
+latency per frame plus how often each one finds a face.
+
+Usage (from backend/):
+    python -m benchmarks.face_detectors path/to/frames/*.jpg
+    python -m benchmarks.face_detectors --synthetic 50
+"""
+import argparse
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+from app.services.emotion_service import _detect_scaled
+from app.services.face_detectors import create_detector
+
+
+def load_frames(paths, synthetic: int):
+    frames = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)):
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                frames.append(img)
+    if not frames:
+        # No samples given: webcam-sized noise frames still measure the scan cost
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (480, 640), dtype=np.uint8) for _ in range(synthetic)]
+    return frames
+
+
+def run(detector, frames, scale: float):
+    found = 0
+    start = time.perf_counter()
+    for gray in frames:
+        if _detect_scaled(detector, gray, 30, scale):
+            found += 1
+    elapsed = time.perf_counter() - start
+    return elapsed / len(frames) * 1000, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files or glob patterns")
+    parser.add_argument("--synthetic", type=int, default=30, help="Noise frames to use when no images are given")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.synthetic)
+    print(f"{len(frames)} frames, detect width {settings.EMOTION_DETECT_WIDTH}px")
+    print(f"{'detector':<10}{'resolution':<14}{'ms/frame':>10}{'faces':>8}")
+
+    for name in ("haar", "lbp", "dnn"):
+        detector = create_detector(name)
+        if detector.name != name:
+            print(f"{name:<10}{'(model files missing, skipped)'}")
+            continue
+        for label, width in (("full", 0), ("downscaled", settings.EMOTION_DETECT_WIDTH)):
+            scale = width / frames[0].shape[1] if width and frames[0].shape[1] > width else 1.0
+            ms, found = run(detector, frames, scale)
+            print(f"{name:<10}{label:<14}{ms:>10.2f}{found:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the compiled fuzzy engine (lookup table) against the exact rule pass.
+
+Evaluates the same random inputs with both FuzzyAdaptiveSystem and
+CompiledFuzzyAdaptiveSystem for the rule spec in FUZZY_RULES_PATH, and reports
+time per process_feedback call, the largest |adjustment| deviation and how many
+inputs end on a different level. Accuracy is drawn either as 0/1 (what
+submit-answer sends) or uniformly in [0, 1].
+
+Usage (from backend/):
+    python -m benchmarks.fuzzy_engines
+    python -m benchmarks.fuzzy_engines --samples 100000 --seed 1
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.fuzzy_compiled import CompiledFuzzyAdaptiveSystem
+from app.services.fuzzy_logic import FuzzyAdaptiveSystem
+from app.services.fuzzy_rulebase import RuleBase, rules_path
+
+
+def make_inputs(rng, samples: int, emotions, binary_accuracy: bool):
+    accuracy = rng.integers(0, 2, samples) if binary_accuracy else rng.uniform(0, 1, samples)
+    return list(zip(
+        rng.uniform(0, 300, samples).tolist(),
+        accuracy.astype(float).tolist(),
+        rng.uniform(0, 120, samples).tolist(),
+        rng.choice(emotions, samples).tolist(),
+        rng.integers(0, 6, samples).tolist(),
+        rng.integers(1, 6, samples).tolist(),
+    ))
+
+
+def run(system, inputs):
+    start = time.perf_counter()
+    results = [system.process_feedback(*args) for args in inputs]
+    return (time.perf_counter() - start) / len(inputs) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=50000, help="Random inputs per accuracy mode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rule_base = RuleBase.from_file(rules_path())
+    exact = FuzzyAdaptiveSystem(rule_base)
+    start = time.perf_counter()
+    compiled = CompiledFuzzyAdaptiveSystem(grid_steps=settings.FUZZY_GRID_STEPS, rule_base=rule_base)
+    print(f"rule spec {rule_base.revision}, table {compiled.table.shape} over {compiled.axes}, "
+          f"compiled in {time.perf_counter() - start:.2f} s, midpoint error {compiled.error_bound:.3f}")
+    print(f"{'accuracy':<10}{'exact us':>10}{'compiled us':>13}{'speedup':>9}{'max |dev|':>11}{'levels differ':>15}")
+
+    rng = np.random.default_rng(args.seed)
+    for label, binary in (("0/1", True), ("uniform", False)):
+        inputs = make_inputs(rng, args.samples, compiled.emotions, binary)
+        exact_us, expected = run(exact, inputs)
+        compiled_us, actual = run(compiled, inputs)
+        deviation = max(abs(a["adjustment"] - e["adjustment"]) for a, e in zip(actual, expected))
+        levels = sum(a["new_level"] != e["new_level"] for a, e in zip(actual, expected))
+        print(f"{label:<10}{exact_us:>10.1f}{compiled_us:>13.1f}{exact_us / compiled_us:>8.1f}x"
+              f"{deviation:>11.3f}{levels:>15}")
+
+
+if __name__ == "__main__":
+    main()
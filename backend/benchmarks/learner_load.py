@@ -0,0 +1,428 @@
+"""
+End-to-end load benchmark: synthetic learners against a running server.
+
+Starts the API under uvicorn (a real server, over HTTP) against a scratch database, a
+temporary SQLite file or --database-url (e.g. a local Postgres), migrated to the alembic
+head, and has N learners
+follow the learn page flow (frontend/src/app/learn/page.tsx, EmotionCapture.tsx):
+
+    GET  /session/current              once, on mount
+    POST /content/next                 per question
+    POST /learning/submit-answer       after the think time, then 1.5 s of feedback
+    POST /learning/predict-emotion     a webcam frame every 5 s, independent of the questions
+    interventions                      ws: the /learning/ws/interventions push channel (the page)
+                                       poll: POST /learning/monitor every --monitor-interval s
+
+Waits are divided by --speed so a run covers more learner time than wall time; the
+time_taken / screen_time sent stay in learner time (the WebSocket's server-side screen
+time runs in wall time). Reports count, errors, p50/p95/p99 latency and throughput per
+endpoint, and saves them as JSON (--output) for comparing commits (--compare).
+
+Usage (from backend/):
+    python -m benchmarks.learner_load --learners 50 --duration 60
+    python -m benchmarks.learner_load --output before.json
+    python -m benchmarks.learner_load --output after.json --compare before.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks.db_load import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = "/api/v1"
+EMOTION_INTERVAL = 5.0  # EmotionCapture.tsx capture interval
+FEEDBACK_DELAY = 1.5  # learn page: feedback shown before the next question is fetched
+ENDPOINTS = ("session/current", "content/next", "submit-answer", "predict-emotion", "monitor", "ws-connect")
+MIN_SAMPLES = 20  # --max-regression ignores endpoints with fewer requests than this (p95 is noise)
+# Server-side counters saved with the results (per worker: with --server-workers > 1, one worker's)
+SERVER_METRICS = ("/learning/emotion-metrics", "/content/scheduler-metrics")
+
+
+class Recorder:
+    """Latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.interventions = defaultdict(int)
+
+    def record(self, name: str, elapsed: float, status):
+        self.latencies[name].append(elapsed)
+        self.status[name][str(status)] += 1
+        if status != 200:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name in ENDPOINTS:
+            values = self.latencies.get(name)
+            if not values:
+                continue
+            endpoints[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "throughput": len(values) / elapsed,
+                "p50_ms": percentile(values, 0.5),
+                "p95_ms": percentile(values, 0.95),
+                "p99_ms": percentile(values, 0.99),
+                "max_ms": max(values) * 1000,
+                "status": dict(self.status[name]),
+            }
+        total = sum(e["count"] for e in endpoints.values())
+        return {
+            "elapsed": elapsed,
+            "requests": total,
+            "throughput": total / elapsed,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "interventions": dict(self.interventions),
+            "endpoints": endpoints,
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_frames(paths, size) -> list:
+    """Base64 JPEGs as the page sends them (data URL prefix stripped); synthetic noise without --frames"""
+    if paths:
+        frames = []
+        for path in paths:
+            with open(path, "rb") as f:
+                frames.append(base64.b64encode(f.read()).decode())
+        return frames
+
+    import cv2
+    import numpy as np
+
+    width, height = size
+    frame = (np.random.default_rng(0).random((height, width, 3)) * 255).astype("uint8")
+    return [base64.b64encode(cv2.imencode(".jpg", frame)[1].tobytes()).decode()]
+
+
+def migrate(url: str):
+    """Schema as deployed (alembic head), indexes included"""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+async def create_learners(url: str, learners: int) -> tuple:
+    """One user per learner, plus an admin for the server metrics (new ones every run); returns their bearer tokens"""
+    from uuid import uuid4
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from app.core.security import create_access_token
+    from app.models.user import User, UserRole
+
+    run_id = uuid4().hex[:8]
+    users = [User(email=f"learner{i}-{run_id}@example.com", hashed_password="x", full_name=f"Learner {i}") for i in range(learners)]
+    admin = User(email=f"admin-{run_id}@example.com", hashed_password="x", full_name="Admin", role=UserRole.ADMIN)
+    engine = create_async_engine(url)
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add_all([*users, admin])
+        await db.commit()
+    await engine.dispose()
+    return [create_access_token(user) for user in users], create_access_token(admin)
+
+
+def start_server(url: str, port: int, args) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": url, "LOG_LEVEL": "WARNING"}
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--workers", str(args.server_workers),
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+
+
+async def wait_ready(http, server: subprocess.Popen, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            if (await http.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("Server did not become ready")
+
+
+async def learner(index: int, token: str, http, base_url: str, frames: list, recorder: Recorder, args, deadline: float):
+    import httpx
+
+    rng = random.Random(index)
+    speed = args.speed
+    loop = asyncio.get_running_loop()
+    state = {"emotion": "neutral", "question_started": None, "hint": False}
+
+    async def call(name: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, API + path, **kwargs)
+        except httpx.HTTPError:
+            recorder.record(name, time.perf_counter() - start, "error")
+            return None
+        recorder.record(name, time.perf_counter() - start, response.status_code)
+        return response.json() if response.status_code == 200 else None
+
+    def on_intervention(intervention: str):
+        recorder.interventions[intervention] += 1
+        if intervention == "show_hint":
+            state["hint"] = True
+
+    # Staggered start, as learners don't all open the page at once
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    auth = {"Authorization": f"Bearer {token}"}
+    session = await call("session/current", "GET", "/session/current", headers=auth)
+    if session is None:
+        return
+    session_id, level = session["session_id"], session["current_level"]
+    socket_queue: asyncio.Queue = asyncio.Queue()
+
+    async def emotions():
+        await asyncio.sleep(rng.uniform(0, EMOTION_INTERVAL) / speed)
+        while loop.time() < deadline:
+            result = await call("predict-emotion", "POST", "/learning/predict-emotion", json={
+                "session_id": session_id, "image_base64": rng.choice(frames),
+            })
+            if result is not None and result.get("emotion") != state["emotion"]:
+                state["emotion"] = result["emotion"]
+                socket_queue.put_nowait({"type": "emotion", "emotion": state["emotion"]})
+            await asyncio.sleep(EMOTION_INTERVAL / speed)
+
+    async def monitor_poll():
+        while loop.time() < deadline:
+            await asyncio.sleep(args.monitor_interval / speed)
+            started = state["question_started"]
+            if started is None:
+                continue
+            result = await call("monitor", "POST", "/learning/monitor", json={
+                "emotion": state["emotion"], "screen_time": (loop.time() - started) * speed, "session_id": session_id,
+            })
+            if result is not None and result["intervention"] != "none":
+                on_intervention(result["intervention"])
+
+    async def monitor_socket():
+        import websockets
+
+        start = time.perf_counter()
+        try:
+            connection = await websockets.connect(f"{base_url.replace('http', 'ws', 1)}{API}/learning/ws/interventions/{session_id}")
+        except Exception:
+            recorder.record("ws-connect", time.perf_counter() - start, "error")
+            return
+        recorder.record("ws-connect", time.perf_counter() - start, 200)
+
+        async def receive():
+            async for message in connection:
+                event = json.loads(message)
+                if event.get("type") == "intervention":
+                    on_intervention(event["intervention"])
+
+        receiver = asyncio.create_task(receive())
+        try:
+            while True:
+                await connection.send(json.dumps(await socket_queue.get()))
+        except Exception:
+            pass
+        finally:
+            receiver.cancel()
+            await connection.close()
+
+    background = [asyncio.create_task(emotions())]
+    if args.interventions == "ws":
+        background.append(asyncio.create_task(monitor_socket()))
+    else:
+        background.append(asyncio.create_task(monitor_poll()))
+
+    try:
+        while loop.time() < deadline:
+            question = await call("content/next", "POST", "/content/next", headers=auth, json={
+                "difficulty": level, "emotion": state["emotion"], "topic": "geometry", "session_id": session_id,
+            })
+            if question is None:
+                await asyncio.sleep(1.0 / speed)
+                continue
+            state["question_started"], state["hint"] = loop.time(), False
+            socket_queue.put_nowait({"type": "question"})
+
+            # Think time grows with difficulty; a hint shown by an intervention helps
+            think = rng.uniform(args.think_min, args.think_max) * (1 + 0.05 * (level - 1))
+            await asyncio.sleep(think / speed)
+            elapsed = (loop.time() - state["question_started"]) * speed
+            state["question_started"] = None
+            socket_queue.put_nowait({"type": "pause"})
+
+            correct = rng.random() < min(0.95, args.accuracy + (0.1 if state["hint"] else 0.0))
+            result = await call("submit-answer", "POST", "/learning/submit-answer", json={
+                "session_id": session_id, "question_id": str(question["id"]),
+                "answer": question["correct_answer"] if correct else "__wrong__",
+                "correct_answer": question["correct_answer"], "time_taken": elapsed,
+                "hints_used": int(state["hint"]), "current_level": level, "screen_time": elapsed,
+            })
+            if result is not None and result.get("fuzzy_feedback", {}).get("new_level"):
+                level = result["fuzzy_feedback"]["new_level"]
+            await asyncio.sleep(FEEDBACK_DELAY / speed)
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+
+async def run(url: str, args) -> dict:
+    import httpx
+
+    frames = load_frames(args.frames, args.frame_size)
+    tokens, admin_token = await create_learners(url, args.learners)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(url, port, args)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as http:
+            await wait_ready(http, server)
+            recorder = Recorder()
+            start = time.perf_counter()
+            deadline = asyncio.get_running_loop().time() + args.duration
+            await asyncio.gather(*(
+                learner(i, token, http, base_url, frames, recorder, args, deadline) for i, token in enumerate(tokens)
+            ))
+            elapsed = time.perf_counter() - start
+            server_metrics = {}
+            for path in SERVER_METRICS:
+                response = await http.get(API + path, headers={"Authorization": f"Bearer {admin_token}"})
+                if response.status_code == 200:
+                    server_metrics[path] = response.json()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    result = recorder.summary(elapsed)
+    result["server_metrics"] = server_metrics
+    return result
+
+
+def git_revision() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"), "dirty": bool(status)}
+
+
+def print_results(result: dict):
+    print(f"{'endpoint':<18}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, e in result["endpoints"].items():
+        print(
+            f"{name:<18}{e['count']:>8}{e['errors']:>8}{e['throughput']:>9.1f}"
+            f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}"
+        )
+    print(f"{'total':<18}{result['requests']:>8}{result['errors']:>8}{result['throughput']:>9.1f}")
+    if result["interventions"]:
+        print("interventions: " + ", ".join(f"{k} {v}" for k, v in sorted(result["interventions"].items())))
+
+
+def compare(result: dict, baseline: dict, max_regression) -> bool:
+    """Print latency/throughput changes against a previous run; False if any p95 regressed past the limit"""
+    ok = True
+    print(f"\nvs {baseline['meta']['git'].get('commit') or '?'} ({baseline['meta']['started']})")
+    print(f"{'endpoint':<18}{'req/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+
+    def change(new, old):
+        return (new - old) / old if old else 0.0
+
+    for name, e in result["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if old is None:
+            continue
+        deltas = [change(e[k], old[k]) for k in ("throughput", "p50_ms", "p95_ms", "p99_ms")]
+        flag = ""
+        if max_regression is not None and deltas[2] > max_regression and min(e["count"], old["count"]) >= MIN_SAMPLES:
+            ok, flag = False, "  REGRESSION"
+        print(f"{name:<18}" + "".join(f"{d:>+10.1%}" for d in deltas) + flag)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--learners", type=int, default=50, help="Concurrent learners")
+    parser.add_argument("--duration", type=float, default=60.0, help="Wall-clock seconds of load")
+    parser.add_argument("--speed", type=float, default=1.0, help="Learner time per wall-clock second (waits are divided by it)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Learners start spread over this many seconds")
+    parser.add_argument("--think-min", type=float, default=8.0, help="Shortest think time per question (learner seconds)")
+    parser.add_argument("--think-max", type=float, default=45.0, help="Longest think time per question (learner seconds)")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="Chance of a correct answer")
+    parser.add_argument("--interventions", choices=("ws", "poll"), default="ws",
+                        help="ws: push channel as the page uses it; poll: POST /monitor")
+    parser.add_argument("--monitor-interval", type=float, default=2.0, help="Seconds between /monitor polls (poll mode)")
+    parser.add_argument("--frames", nargs="*", help="JPEG files to send to predict-emotion (default: synthetic noise)")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(640, 480), metavar=("W", "H"),
+                        help="Synthetic frame size (the page captures 640x480)")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="Database to use instead of a temporary SQLite file (migrated to head; learners are added to it)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (seconds)")
+    parser.add_argument("--output", help="Write the results as JSON here")
+    parser.add_argument("--compare", help="Results JSON of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float,
+                        help="With --compare: exit 1 if any endpoint's p95 grew by more than this fraction")
+    args = parser.parse_args()
+
+    # Tokens are minted here and verified by the server: both need the same key
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    started = datetime.utcnow().isoformat(timespec="seconds")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'learners.db')}"
+        migrate(url)
+        result = asyncio.run(run(url, args))
+    result["meta"] = {
+        "started": started,
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "max_regression")},
+    }
+
+    print(f"{args.learners} learners, {result['elapsed']:.0f} s at {args.speed:g}x, interventions via {args.interventions}")
+    print_results(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Query plan audit for the request-path queries.
+Migrates a scratch SQLite database to head, drives the app's endpoints (and the emotion
+log flush) through one learner's flow in-process, records every SELECT / UPDATE / DELETE
+they issue, then runs EXPLAIN QUERY PLAN on each and exits non-zero if any of them falls
+back to a full table scan. The statements are captured, not hand-written, so the check
+follows the endpoints as they change. Offline jobs (rollup rebuild, replay) read whole
+tables by design and are not covered.
+Run it after adding a migration or changing a request-path query:
+
+    python check_query_plans.py
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from uuid import UUID
+
+from alembic import command
+from alembic.config import Config
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+
+def migrate(path: str):
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{path}")
+    command.upgrade(config, "head")
+
+
+def full_scans(plan):
+    """Plan lines that read a whole table (index SEARCHes and temp b-trees are fine)"""
+    return [detail for *_, detail in plan if detail.startswith("SCAN ") and "CONSTANT ROW" not in detail]
+
+
+async def capture_queries():
+    """{sql: (first step that issued it, its parameters)} for one learner's flow through the app"""
+    import httpx
+    from sqlalchemy import event
+
+    from main import app
+    from app.db.session import engine
+    from app.services.log_buffer import emotion_log_buffer
+
+    queries = {}
+    step = "startup"
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINED) and statement not in queries:
+            queries[statement] = (step, parameters[0] if executemany else parameters)
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://plans") as http:
+        async def call(name, method, path, **kwargs):
+            nonlocal step
+            step = name
+            response = await http.request(method, "/api/v1" + path, **kwargs)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+            return response
+
+        credentials = {"email": "plans@example.com", "password": "plans-check", "full_name": "Plans"}
+        await call("auth/register", "POST", "/auth/register", json=credentials)
+        token = (await call("auth/token", "POST", "/auth/token", data={
+            "username": credentials["email"], "password": credentials["password"],
+        })).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        await call("auth/me", "GET", "/auth/me", headers=auth)
+
+        await call("session/current (create)", "GET", "/session/current", headers=auth)
+        session_id = (await call("session/current", "GET", "/session/current", headers=auth)).json()["session_id"]
+
+        # What predict-emotion does after inference, without needing the model files
+        step = "emotion log flush"
+        for emotion in ("happy", "neutral", "confused"):
+            emotion_log_buffer.add(session_id=UUID(session_id), detected_emotion=emotion, confidence=0.9)
+        await emotion_log_buffer.flush()
+
+        level = 1
+        for answer in ("a", "b", "a"):
+            question = (await call("content/next", "POST", "/content/next", headers=auth, json={
+                "difficulty": level, "emotion": "neutral", "topic": "geometry", "session_id": session_id,
+            })).json()
+            level = (await call("learning/submit-answer", "POST", "/learning/submit-answer", json={
+                "session_id": session_id, "question_id": str(question["id"]),
+                "answer": question["correct_answer"] if answer == "a" else "?",
+                "correct_answer": question["correct_answer"], "time_taken": 12.0, "hints_used": 0,
+                "current_level": level, "screen_time": 12.0,
+            })).json()["fuzzy_feedback"]["new_level"]
+
+        await call("session/level", "PATCH", f"/session/{session_id}/level", json={"new_level": 2})
+        await call("session/progress", "PATCH", f"/session/{session_id}/progress",
+                   params={"is_correct": True, "new_level": 2})
+        await call("analytics/summary", "GET", "/analytics/summary", headers=auth)
+        await call("analytics/emotion-history", "GET", "/analytics/emotion-history", headers=auth)
+        await call("analytics/emotion-history (page)", "GET", "/analytics/emotion-history",
+                   params={"limit": 1}, headers=auth)
+        await call("analytics/emotion-history (ndjson)", "GET", "/analytics/emotion-history",
+                   params={"format": "ndjson"}, headers=auth)
+        await call("analytics/level-progression", "GET", "/analytics/level-progression", headers=auth)
+        await call("analytics/level-progression (session page)", "GET", "/analytics/level-progression",
+                   params={"session_id": session_id, "limit": 1}, headers=auth)
+        await call("analytics/level-progression (ndjson)", "GET", "/analytics/level-progression",
+                   params={"format": "ndjson"}, headers=auth)
+        await call("session/reset", "POST", "/session/reset", headers=auth)
+
+    await emotion_log_buffer.close()
+    await engine.dispose()
+    return queries
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        migrate(path)
+        # The app builds its engine from settings on import
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+        os.environ.setdefault("DEV_MODE", "true")
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        queries = asyncio.run(capture_queries())
+
+        conn = sqlite3.connect(path)
+        failures = 0
+        for sql, (step, parameters) in queries.items():
+            plan = conn.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            scans = full_scans(plan)
+            status = "FAIL" if scans else "ok"
+            print(f"[{status:>4}] {step}: {' '.join(sql.split())[:110]}")
+            for *_, detail in plan:
+                print(f"         {detail}")
+            failures += bool(scans)
+        conn.close()
+
+    print(f"\n{len(queries) - failures}/{len(queries)} request-path queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Compile app/data/questions.json into the read-only question store (app/data/questions.db).
+The API compiles the store on its own when it is missing or older than the JSON file,
+so this is only needed to build it ahead of a deploy or for a bank kept elsewhere.
+Running workers pick the new file up within QUESTION_STORE_RELOAD_INTERVAL_SECONDS.
+
+    python compile_questions.py [--source path/to/questions.json] [--output path/to/questions.db]
+"""
+import argparse
+
+from app.core.config import settings
+from app.core.data_files import data_path
+from app.services.question_store import compile_store
+
+def compile_questions():
+    parser = argparse.ArgumentParser(description="Compile the question bank into the question store")
+    parser.add_argument("--source", default=data_path(settings.QUESTION_BANK_PATH))
+    parser.add_argument("--output", default=data_path(settings.QUESTION_STORE_PATH))
+    args = parser.parse_args()
+
+    count = compile_store(args.source, args.output)
+    print(f"✓ Compiled {count} questions into {args.output}")
+
+if __name__ == "__main__":
+    compile_questions()
@@ -1,10 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.logger import setup_logging
+from app.core.security import check_secret_key
+
+setup_logging()
+check_secret_key()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    from app.services.emotion_service import emotion_service
+    from app.services.log_buffer import emotion_log_buffer
+    await emotion_log_buffer.close()
+    emotion_service.shutdown()
+
 app = FastAPI(
     title="Emotion-Aware Adaptive Learning API",
     description="Backend API for AI-based adaptive learning system",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 from app.core.config import settings
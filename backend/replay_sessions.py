@@ -0,0 +1,113 @@
+"""
+Replay logged learning sessions through one or more fuzzy controller versions.
+
+Streams InteractionLog / EmotionLog out of DATABASE_URL in session order, rebuilds each
+session's timeline (answer, time on question, hints, the emotion submit_answer would have
+read) and replays it from proficiency 1.0 through the adjustments recorded at the time
+and through every --controller, in a process pool. Reports level trajectories,
+divergence from the baseline and throughput. Read-only; memory stays bounded by
+--chunk-size and the number of workers, not by the size of the logs.
+
+Each controller is a rule spec (app/data/fuzzy_rules.json format) plus the proficiency
+clamp of submit_answer, so changes to either can be compared before shipping them:
+
+    python replay_sessions.py
+    python replay_sessions.py --controller name=current \\
+        --controller name=tuned,rules=/path/to/tuned_rules.json,max=5.5 --baseline current
+    python replay_sessions.py --since 2024-09-01 --report replay.json --trajectories levels.jsonl
+
+Replay uses the exact batch inference path; the in-memory smoothed emotion that the live
+path prefers is not logged, so the latest logged emotion stands in for it.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.services.replay import RECORDED, controller_spec, default_workers, replay
+
+CHECKPOINTS = (1, 5, 10, 20, 50, 100)  # Answer numbers shown in the trajectory table
+
+
+def parse_controller(value: str) -> dict:
+    """name=NAME[,rules=PATH][,min=FLOAT][,max=FLOAT]"""
+    try:
+        options = dict(item.split("=", 1) for item in value.split(","))
+        unknown = set(options) - {"name", "rules", "min", "max"}
+        if unknown:
+            raise ValueError(f"unknown option(s) {', '.join(sorted(unknown))}")
+        kwargs = {"rules": options.get("rules")}
+        if "min" in options:
+            kwargs["low"] = float(options["min"])
+        if "max" in options:
+            kwargs["high"] = float(options["max"])
+        return controller_spec(options.get("name", ""), **kwargs)
+    except (ValueError, OSError) as e:
+        raise argparse.ArgumentTypeError(f"{value!r}: {e}")
+
+
+def print_report(report: dict):
+    print(
+        f"✓ Replayed {report['sessions']:,} sessions / {report['answers']:,} answers in {report['elapsed_seconds']:.1f}s "
+        f"({report['answers_per_second']:,.0f} answers/s, {report['workers']} workers)"
+    )
+    if not report["trajectories"]:
+        return
+    print(f"\nDivergence from '{report['baseline']}':")
+    print(f"{'trajectory':<14}{'final lvl':>10}{'chg/session':>12}{'answers':>10}{'sessions':>10}{'|Δlvl|':>9}{'final Δ':>9}")
+    for name, t in report["trajectories"].items():
+        d = t["divergence"]
+        print(
+            f"{name:<14}{t['mean_final_level']:>10.2f}{t['level_changes_per_session']:>12.2f}"
+            f"{d['answers']:>10.1%}{d['sessions']:>10.1%}{d['mean_abs_level_diff']:>9.3f}{d['mean_final_level_diff']:>+9.3f}"
+        )
+    print("\nMean level by answer #:")
+    print(f"{'trajectory':<14}" + "".join(f"{n:>7}" for n in CHECKPOINTS))
+    for name, t in report["trajectories"].items():
+        by_answer = t["mean_level_by_answer"]
+        print(f"{name:<14}" + "".join(
+            f"{by_answer[n - 1]:>7.2f}" if n <= len(by_answer) else f"{'-':>7}" for n in CHECKPOINTS
+        ))
+
+
+def replay_sessions():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--controller", action="append", type=parse_controller, dest="controllers",
+                        help="name=NAME[,rules=PATH][,min=FLOAT][,max=FLOAT]; repeatable (default: the current rules)")
+    parser.add_argument("--baseline", default=RECORDED, help="Trajectory the others are compared to")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Replay processes (0 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Answers per unit of work")
+    parser.add_argument("--max-steps", type=int, default=100, help="Answers per session in the mean-level trajectory")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only sessions started at or after this time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Only sessions started before this time")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--report", help="Write the full report as JSON")
+    parser.add_argument("--trajectories", help="Write per-session levels as JSON lines")
+    args = parser.parse_args()
+
+    controllers = args.controllers or [controller_spec("current")]
+    engine = create_async_engine(args.database_url, echo=False, future=True)
+
+    async def run():
+        try:
+            return await replay(
+                engine, controllers, workers=args.workers, chunk_size=args.chunk_size, baseline=args.baseline,
+                max_steps=args.max_steps, since=args.since, until=args.until, trajectories_path=args.trajectories,
+            )
+        finally:
+            await engine.dispose()
+
+    try:
+        report = asyncio.run(run())
+    except ValueError as e:
+        parser.error(str(e))
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    replay_sessions()
@@ -1,7 +1,7 @@
 
 "use client";
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle, CardFooter } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
@@ -86,41 +86,92 @@ export default function LearnPage() {
         setHintAlreadyShown(false); // reset hint flag for new question
     }, [question]);
 
-    // Polling for Intervention (Real-time Fuzzy Logic)
-    useEffect(() => {
-        const interval = setInterval(async () => {
-            if (submitted || loadingNext || !question) return;
-
-            const elapsed = (Date.now() - startTime) / 1000;
+    // Server-pushed interventions (Real-time Fuzzy Logic), replaces polling /monitor
+    const socketRef = useRef<WebSocket | null>(null);
+    const paused = submitted || loadingNext || !question;
+    const pausedRef = useRef(paused);
+    pausedRef.current = paused;
+
+    // Latest handler, so the socket doesn't reconnect whenever hint state changes
+    const handleInterventionRef = useRef<(intervention: string) => void>(() => {});
+    handleInterventionRef.current = (intervention: string) => {
+        if (intervention === "show_hint" && !hintAlreadyShown) {
+            setShowHints(true);
+            setHintAlreadyShown(true);
+            if (hintsUsed === 0) incrementHints();
+        } else if (intervention === "change_visual") {
+            setVisualMode("party");
+        }
+    };
 
-            try {
-                const res = await fetch("http://localhost:8000/api/v1/learning/monitor", {
-                    method: "POST",
-                    headers: { "Content-Type": "application/json" },
-                    body: JSON.stringify({
-                        emotion: emotion || "neutral",
-                        screen_time: elapsed
-                    })
-                });
+    const sendMonitor = (message: Record<string, string>) => {
+        const socket = socketRef.current;
+        if (socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify(message));
+        }
+    };
 
-                if (res.ok) {
-                    const data = await res.json();
-                        if (data.intervention === "show_hint" && !hintAlreadyShown) {
-                            setShowHints(true);
-                            setHintAlreadyShown(true);
-                            if (hintsUsed === 0) incrementHints();
-                        } else if (data.intervention === "change_visual") {
-                        setVisualMode("party");
-                    }
+    useEffect(() => {
+        if (!sessionId) return;
+        let socket: WebSocket | null = null;
+        let retryTimer: ReturnType<typeof setTimeout> | undefined;
+        let attempts = 0;
+        let unmounted = false;
+
+        const connect = () => {
+            const ws = new WebSocket(`ws://localhost:8000/api/v1/learning/ws/interventions/${sessionId}`);
+            socket = ws;
+            socketRef.current = ws;
+            ws.onopen = () => {
+                attempts = 0;
+                ws.send(JSON.stringify({ type: "question" }));
+                if (pausedRef.current) ws.send(JSON.stringify({ type: "pause" }));
+            };
+            ws.onmessage = (event) => {
+                try {
+                    const data = JSON.parse(event.data);
+                    if (data.type === "intervention") handleInterventionRef.current(data.intervention);
+                } catch {
+                    // Ignore malformed events
                 }
-            } catch {
-                // Ignore monitor errors
-            }
+            };
+            // onclose follows every error, the reconnect is scheduled there
+            ws.onerror = () => ws.close();
+            ws.onclose = () => {
+                if (socketRef.current === ws) socketRef.current = null;
+                if (unmounted) return;
+                // Backend restart or network drop: reconnect with jittered exponential backoff (1 s .. 30 s)
+                const delay = Math.min(1000 * 2 ** attempts, 30000) * (0.5 + Math.random() / 2);
+                attempts += 1;
+                retryTimer = setTimeout(connect, delay);
+            };
+        };
+        connect();
 
-        }, 3000); // Check every 3 seconds
+        return () => {
+            unmounted = true;
+            clearTimeout(retryTimer);
+            socketRef.current = null;
+            socket?.close();
+        };
+    }, [sessionId]);
 
-        return () => clearInterval(interval);
-    }, [emotion, startTime, submitted, loadingNext, question, hintsUsed, incrementHints, hintAlreadyShown]);
+    // Screen time restarts with every question
+    useEffect(() => {
+        sendMonitor({ type: "question" });
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [question]);
+
+    useEffect(() => {
+        sendMonitor({ type: paused ? "pause" : "resume" });
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [paused]);
+
+    // Only used by the server when it has no smoothed emotion of its own for the session
+    useEffect(() => {
+        if (emotion) sendMonitor({ type: "emotion", emotion });
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [emotion]);
 
     const toggleHint = () => {
         setShowHints((prev) => {
@@ -141,13 +192,18 @@ export default function LearnPage() {
     const fetchQuestion = async () => {
         setLoadingNext(true);
         try {
+            const token = localStorage.getItem("token");
             const res = await fetch("http://localhost:8000/api/v1/content/next", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: {
+                    "Content-Type": "application/json",
+                    "Authorization": `Bearer ${token}`
+                },
                 body: JSON.stringify({
                     difficulty: currentLevel,
                     emotion: emotion || "neutral",
-                    topic: "geometry"
+                    topic: "geometry",
+                    session_id: sessionId  // No repeats within the session
                 })
             });
 
@@ -44,6 +44,14 @@ export default function Sidebar() {
 
     const handleLogout = () => {
         if (typeof window !== 'undefined') {
+            const token = localStorage.getItem('token');
+            if (token) {
+                // Fire-and-forget: revokes the token server-side (it stays signed until it expires)
+                fetch("http://localhost:8000/api/v1/auth/logout", {
+                    method: "POST",
+                    headers: { Authorization: `Bearer ${token}` },
+                }).catch(() => {});
+            }
             localStorage.removeItem('token');
         }
         resetSession(); // Clear global state